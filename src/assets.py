@@ -0,0 +1,147 @@
+import errno
+import logging
+import os
+import shutil
+from concurrent.futures import ThreadPoolExecutor
+
+import stages
+from manifest import file_hash
+
+logger = logging.getLogger(__name__)
+
+
+# The stages that write files into docs/ next to the static ones, and the test for those files
+STAGE_OUTPUTS = (
+    ("search", "is_index_file"),
+    ("images", "is_variant"),
+    ("fingerprint", "is_fingerprinted"),
+    ("compress", "is_compressed"),
+)
+
+
+def is_stage_output(path):
+    # True for the files a stage that is on writes into docs/: the search index, the resized variants
+    # of images, fingerprinted copies of assets and precompressed siblings. path is relative to docs/.
+    # A stage that is off is not imported (see stages.py), and what it wrote in earlier builds goes.
+    return any(stages.active(name) and getattr(stages.module(name), test)(path) for name, test in STAGE_OUTPUTS)
+
+
+def is_generated(path):
+    # Pages written by generate_page live next to the static files in docs/, and so do the stages' files
+    return path.endswith('.html') or is_stage_output(path)
+
+
+def _copy_range(fsrc, fdst, size):
+    # Kernel-side copy; may raise OSError when unsupported for these files
+    if hasattr(os, "copy_file_range"):
+        copied = 0
+        while copied < size:
+            n = os.copy_file_range(fsrc.fileno(), fdst.fileno(), size - copied)
+            if n == 0:
+                break
+            copied += n
+        return copied
+    if hasattr(os, "sendfile"):
+        copied = 0
+        while copied < size:
+            n = os.sendfile(fdst.fileno(), fsrc.fileno(), copied, size - copied)
+            if n == 0:
+                break
+            copied += n
+        return copied
+    raise OSError(errno.ENOSYS, "no zero-copy primitive available")
+
+
+def copy_file(src, dest):
+    """
+    Copies src to dest using copy_file_range/sendfile where the platform
+    supports it, then carries over the timestamps so the next sync can
+    compare mtimes. The copy is made next to dest and renamed into place,
+    so dest is never seen half-written.
+    """
+    size = os.path.getsize(src)
+    tmp_path = dest + ".tmp"
+    try:
+        with open(src, 'rb') as fsrc, open(tmp_path, 'wb') as fdst:
+            try:
+                copied = _copy_range(fsrc, fdst, size)
+            except OSError:
+                copied = 0
+            if copied < size:
+                # Start over in user space (e.g. cross-device or unsupported fs)
+                fsrc.seek(0)
+                fdst.seek(0)
+                fdst.truncate()
+                shutil.copyfileobj(fsrc, fdst)
+        shutil.copystat(src, tmp_path)
+        os.replace(tmp_path, dest)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def needs_copy(src, dest, checksum=False):
+    try:
+        dest_stat = os.stat(dest)
+    except FileNotFoundError:
+        return True
+    src_stat = os.stat(src)
+    if src_stat.st_size != dest_stat.st_size:
+        return True
+    if checksum:
+        return file_hash(src) != file_hash(dest)
+    return src_stat.st_mtime_ns != dest_stat.st_mtime_ns
+
+
+def sync_directory(src, dest, checksum=False, workers=8, keep=is_generated, changes=None):
+    """
+    Makes dest mirror the files in src without starting from scratch:
+    - files that are new or differ (size and mtime, or content when checksum=True) are copied
+    - files in dest that no longer exist in src are removed, unless keep(path) says otherwise;
+      keep gets the path relative to dest
+    Copies and removals are recorded in `changes` (a publish.ChangeSet) if one is given.
+    Returns a tuple (copied, unchanged, removed).
+    """
+    wanted = set()
+    to_copy = []
+    for dir_path, dir_names, file_names in os.walk(src):
+        dir_names.sort()
+        rel_dir = os.path.relpath(dir_path, src)
+        os.makedirs(os.path.normpath(os.path.join(dest, rel_dir)), exist_ok=True)
+        for name in sorted(file_names):
+            rel_path = os.path.normpath(os.path.join(rel_dir, name))
+            wanted.add(rel_path)
+            src_path = os.path.join(src, rel_path)
+            dest_path = os.path.join(dest, rel_path)
+            if needs_copy(src_path, dest_path, checksum):
+                to_copy.append((src_path, dest_path))
+
+    for src_path, dest_path in to_copy:
+        logger.debug("copy file src=%s dest=%s", src_path, dest_path)
+        if changes is not None:
+            changes.wrote(dest_path)
+    if workers > 1 and len(to_copy) > 1:
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            # list() re-raises the first copy error, if any
+            list(pool.map(lambda pair: copy_file(*pair), to_copy))
+    else:
+        for src_path, dest_path in to_copy:
+            copy_file(src_path, dest_path)
+
+    removed = 0
+    for dir_path, _, file_names in os.walk(dest):
+        for name in file_names:
+            dest_path = os.path.join(dir_path, name)
+            rel_path = os.path.relpath(dest_path, dest)
+            if rel_path in wanted or keep(rel_path):
+                continue
+            logger.info("remove file dest=%s reason=source-deleted", dest_path)
+            os.remove(dest_path)
+            if changes is not None:
+                changes.remove(dest_path)
+            removed += 1
+
+    unchanged = len(wanted) - len(to_copy)
+    logger.info("static files copied=%d unchanged=%d removed=%d", len(to_copy), unchanged, removed)
+    return len(to_copy), unchanged, removed
@@ -0,0 +1,811 @@
+import argparse
+import gzip
+import json
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+import re
+
+from block import BlockType, block_to_block_type, generate_page, generate_pages_recursive, iter_blocks, \
+                  markdown_to_blocks, markdown_to_html_node
+from corpus import WORDS, make_page, make_paragraph, make_site
+from flattree import FlatTree
+import build
+import fragcache
+import minify
+import parsecache
+from manifest import file_hash
+from htmlnode import LeafNode, ParentNode, extract_markdown_urls, split_nodes_image, split_nodes_link, \
+                     text_to_textnodes
+from textnode import TextNode, TextType, split_nodes_delimiter
+
+
+def time_build(content, template, dest, jobs):
+    start = time.perf_counter()
+    generate_pages_recursive(content, template, dest, "/", jobs=jobs)
+    return time.perf_counter() - start
+
+
+def bench_jobs(pages=200, paragraphs=40, max_jobs=None):
+    # Full builds of the same site with 1, 2, 4, ... worker processes
+    max_jobs = max_jobs or os.cpu_count() or 1
+    counts = [1]
+    while counts[-1] * 2 <= max_jobs:
+        counts.append(counts[-1] * 2)
+    if counts[-1] != max_jobs:
+        counts.append(max_jobs)
+
+    results = []
+    with tempfile.TemporaryDirectory() as root:
+        content, template = make_site(root, pages, paragraphs)
+        for jobs in counts:
+            dest = os.path.join(root, f"docs-{jobs}")
+            results.append((jobs, time_build(content, template, dest, jobs)))
+    return results
+
+
+def chained_text_to_textnodes(text):
+    # The original five-pass pipeline, kept as the baseline for bench_inline
+    nodes = [TextNode(text, TextType.TEXT)]
+    nodes = split_nodes_delimiter(nodes, "**", TextType.BOLD)
+    nodes = split_nodes_delimiter(nodes, "_", TextType.ITALIC)
+    nodes = split_nodes_delimiter(nodes, "`", TextType.CODE)
+    nodes = split_nodes_image(nodes)
+    nodes = split_nodes_link(nodes)
+    return nodes
+
+
+def best_of(func, arg, repeat=5):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func(arg)
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def bench_inline(sizes=(100, 1000, 10000, 50000)):
+    # Single-pass tokenizer against the chained split_nodes_* pipeline
+    rng = random.Random(0)
+    results = []
+    for words in sizes:
+        text = make_paragraph(rng, words)
+        assert chained_text_to_textnodes(text) == text_to_textnodes(text)
+        results.append((words, best_of(chained_text_to_textnodes, text), best_of(text_to_textnodes, text)))
+    return results
+
+
+FINDALL_IMAGE_PATTERN = re.compile(r'!\[(.*?)\]\((.*?)\)')
+FINDALL_LINK_PATTERN = re.compile(r'\[(.*?)\]\((.*?)\)')
+
+
+def findall_split_nodes(old_nodes, pattern, text_type, prefix):
+    # The original split_nodes_image/split_nodes_link, kept as the baseline for
+    # bench_links: findall, then str.find for each match rebuilt as a string
+    new_nodes = []
+    for node in old_nodes:
+        if node.text_type != TextType.TEXT:
+            new_nodes.append(node)
+            continue
+        matches = pattern.findall(node.text)
+        if not matches:
+            new_nodes.append(node)
+            continue
+        last_index = 0
+        for text, url in matches:
+            markup = f"{prefix}[{text}]({url})"
+            start_index = node.text.find(markup, last_index)
+            if start_index != -1:
+                if start_index > last_index:
+                    new_nodes.append(TextNode(node.text[last_index:start_index], TextType.TEXT))
+                new_nodes.append(TextNode(text, text_type, url=url))
+                last_index = start_index + len(markup)
+        if last_index < len(node.text):
+            new_nodes.append(TextNode(node.text[last_index:], TextType.TEXT))
+    return new_nodes
+
+
+def findall_split_links_and_images(text):
+    nodes = findall_split_nodes([TextNode(text, TextType.TEXT)], FINDALL_IMAGE_PATTERN, TextType.IMAGE, "!")
+    return findall_split_nodes(nodes, FINDALL_LINK_PATTERN, TextType.LINK, "")
+
+
+def split_links_and_images(text):
+    return split_nodes_link(split_nodes_image([TextNode(text, TextType.TEXT)]))
+
+
+def findall_urls(text):
+    # How page references were collected: the link pattern also matches the bracket part of images
+    return [url for _, url in FINDALL_LINK_PATTERN.findall(text)]
+
+
+def make_reference_page(rng, links):
+    # A link-dense reference page: one line of links and images after another
+    lines = []
+    for n in range(links):
+        word = rng.choice(WORDS)
+        if n % 10 == 9:
+            lines.append(f"![{word}](/images/{word}.png)")
+        else:
+            lines.append(f"[{word}](/ref/{word}/{n}) {rng.choice(WORDS)}")
+    return " ".join(lines)
+
+
+def bench_links(sizes=(100, 1000, 10000)):
+    # Splitting link-dense text into link and image nodes, and collecting its urls:
+    # findall plus str.find against the combined finditer scanner
+    rng = random.Random(0)
+    results = []
+    for links in sizes:
+        text = make_reference_page(rng, links)
+        assert findall_split_links_and_images(text) == split_links_and_images(text)
+        assert findall_urls(text) == extract_markdown_urls(text)
+        # The two paths are close on split, so take more runs than usual to see past the noise
+        results.append((
+            links,
+            best_of(findall_split_links_and_images, text, repeat=20),
+            best_of(split_links_and_images, text, repeat=20),
+            best_of(findall_urls, text, repeat=20),
+            best_of(extract_markdown_urls, text, repeat=20),
+        ))
+    return results
+
+
+def regex_block_to_block_type(block):
+    # The original classifier, kept as the baseline for bench_blocks
+    if re.match(r'^(#{1}) .+$', block):
+        return BlockType.HEADING
+    elif re.match(r'^(#{2}) .+$', block):
+        return BlockType.HEADING2
+    elif re.match(r'^(#{3}) .+$', block):
+        return BlockType.HEADING3
+    elif re.match(r'^(#{4}) .+$', block):
+        return BlockType.HEADING4
+    elif re.match(r'^(#{5}) .+$', block):
+        return BlockType.HEADING5
+    elif re.match(r'^(#{6}) .+$', block):
+        return BlockType.HEADING6
+    elif re.match(r"^```[\s\S]*?```$", block):
+        return BlockType.CODE
+    elif re.match(r'^(?:> ?.*(?:\n|$))+$', block):
+        return BlockType.QUOTE
+    elif re.match(r"^(?:- .+(?:\n|$))+$", block):
+        return BlockType.UNORDERED_LIST
+    elif re.match(r'^(?:\d+\. .+(?:\n|$))+$', block):
+        return BlockType.ORDERED_LIST
+    else:
+        return BlockType.PARAGRAPH
+
+
+def make_blocks(rng, count):
+    blocks = []
+    for n in range(count):
+        kind = n % 8
+        if kind == 0:
+            blocks.append("#" * rng.randint(1, 6) + " " + rng.choice(WORDS))
+        elif kind == 1:
+            blocks.append("```\n" + "\n".join(rng.choice(WORDS) for _ in range(10)) + "\n```")
+        elif kind == 2:
+            blocks.append("\n".join(f"> {rng.choice(WORDS)}" for _ in range(4)))
+        elif kind == 3:
+            blocks.append("\n".join(f"- {rng.choice(WORDS)}" for _ in range(6)))
+        elif kind == 4:
+            blocks.append("\n".join(f"{i}. {rng.choice(WORDS)}" for i in range(1, 7)))
+        else:
+            blocks.append(" ".join(rng.choice(WORDS) for _ in range(50)))
+    return blocks
+
+
+def classify_all(classifier):
+    return lambda blocks: [classifier(block) for block in blocks]
+
+
+def bench_blocks(counts=(1000, 10000)):
+    # Per-block cost of the first-character classifier against the regex chain
+    rng = random.Random(0)
+    results = []
+    for count in counts:
+        blocks = make_blocks(rng, count)
+        assert classify_all(regex_block_to_block_type)(blocks) == classify_all(block_to_block_type)(blocks)
+        results.append((
+            count,
+            best_of(classify_all(regex_block_to_block_type), blocks),
+            best_of(classify_all(block_to_block_type), blocks),
+        ))
+    return results
+
+
+def peak_memory(func, arg):
+    tracemalloc.start()
+    try:
+        func(arg)
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def split_whole_file(path):
+    # The old approach: read everything, split it, then split again for the title
+    with open(path) as f:
+        markdown = f.read()
+    count = len(markdown_to_blocks(markdown))
+    markdown_to_blocks(markdown)
+    return count
+
+
+def split_streaming(path):
+    with open(path) as f:
+        return sum(1 for _ in iter_blocks(f))
+
+
+def bench_block_reader(sizes_mb=(1, 4, 16)):
+    # Peak traced memory of block splitting, whole-string vs streaming
+    rng = random.Random(0)
+    results = []
+    with tempfile.TemporaryDirectory() as root:
+        path = os.path.join(root, "big.md")
+        for size_mb in sizes_mb:
+            with open(path, 'w') as f:
+                written = 0
+                while written < size_mb * 1024 * 1024:
+                    written += f.write(make_page(rng, 20) + "\n\n")
+            assert split_whole_file(path) == split_streaming(path)
+            results.append((size_mb, peak_memory(split_whole_file, path), peak_memory(split_streaming, path)))
+    return results
+
+
+def recursive_to_html(node):
+    # The original ParentNode.to_html, kept as the baseline for bench_serializer
+    if isinstance(node, ParentNode):
+        return f"<{node.tag}{node.props_to_html()}>{''.join([recursive_to_html(child) for child in node.children])}</{node.tag}>\n"
+    return node.to_html()
+
+
+def make_deep_tree(depth):
+    node = LeafNode("b", "leaf")
+    for n in range(depth):
+        node = ParentNode("div", [LeafNode(None, f"level {n} "), node], props={"class": "nest"})
+    return node
+
+
+def make_wide_tree(width):
+    rows = [
+        ParentNode("p", [LeafNode(None, "row "), LeafNode("a", str(n), props={"href": f"/page/{n}"})])
+        for n in range(width)
+    ]
+    return ParentNode("div", rows)
+
+
+def serialize_to_string(node):
+    return node.to_html()
+
+
+def serialize_to_sink(node):
+    with open(os.devnull, 'w') as sink:
+        node.write_html(sink)
+
+
+def bench_serializer():
+    # Time and peak memory of recursive concatenation vs the streaming walk
+    trees = [("deep 400", make_deep_tree(400)), ("wide 100k", make_wide_tree(100000))]
+    results = []
+    for name, tree in trees:
+        assert recursive_to_html(tree) == tree.to_html()
+        results.append((
+            name,
+            best_of(recursive_to_html, tree, 3),
+            best_of(serialize_to_sink, tree, 3),
+            peak_memory(recursive_to_html, tree),
+            peak_memory(serialize_to_sink, tree),
+        ))
+    return results
+
+
+class DictNode:
+    # Stand-in for the pre-__slots__ node classes: same fields, stored in a __dict__
+    def __init__(self, tag, value, children, props):
+        self.tag = tag
+        self.value = value
+        self.children = children
+        self.props = props
+
+
+def rebuild(node, make):
+    # Copies a node tree bottom-up without recursion; make(node, children) builds each copy
+    pending = []
+    stack = [node]
+    while stack:
+        item = stack.pop()
+        pending.append(item)
+        if isinstance(item, ParentNode):
+            stack.extend(item.children)
+    built = {}
+    root = None
+    for item in reversed(pending):
+        children = None
+        if isinstance(item, ParentNode):
+            children = [built[id(child)] for child in item.children]
+        built[id(item)] = root = make(item, children)
+    return root
+
+
+def to_dict_nodes(node):
+    return rebuild(node, lambda item, children: DictNode(item.tag, item.value, children, item.props))
+
+
+def to_slotted_nodes(node):
+    def make(item, children):
+        if children is None:
+            return LeafNode(item.tag, item.value, item.props)
+        return ParentNode(item.tag, children, item.props)
+    return rebuild(node, make)
+
+
+def traced_size(func, arg):
+    # Bytes still allocated after func(arg) returns, while the result is alive
+    tracemalloc.start()
+    try:
+        before = tracemalloc.get_traced_memory()[0]
+        result = func(arg)
+        size = tracemalloc.get_traced_memory()[0] - before
+        del result
+        return size
+    finally:
+        tracemalloc.stop()
+
+
+def count_nodes(node):
+    count = 0
+    stack = [node]
+    while stack:
+        item = stack.pop()
+        count += 1
+        if isinstance(item, ParentNode):
+            stack.extend(item.children)
+    return count
+
+
+def bench_nodes(paragraphs=(200, 2000)):
+    # Memory held by the node objects of a page in each representation.
+    # The text strings are shared by all three, so only the structure is compared.
+    rng = random.Random(0)
+    results = []
+    for count in paragraphs:
+        tree = markdown_to_html_node(make_page(rng, count))
+        assert FlatTree.from_node(tree).to_html() == tree.to_html()
+        results.append((
+            count_nodes(tree),
+            traced_size(to_dict_nodes, tree),
+            traced_size(to_slotted_nodes, tree),
+            traced_size(FlatTree.from_node, tree),
+        ))
+    return results
+
+
+def make_boilerplate_pages(rng, count, shared=10, unique=10):
+    # Pages that all end in the same callouts and link lists, as docs sites tend to
+    footer = [make_paragraph(rng, 40, link_rate=0.3) for _ in range(shared)]
+    pages = []
+    for _ in range(count):
+        body = make_page(rng, unique).rstrip("\n")
+        pages.append(body + "\n\n" + "\n\n".join(footer) + "\n")
+    return pages
+
+
+def parse_all(pages):
+    for page in pages:
+        markdown_to_html_node(page)
+
+
+def bench_fragments(counts=(50, 500)):
+    # Parsing pages that share half their blocks, without and with the fragment cache
+    rng = random.Random(0)
+    results = []
+    for count in counts:
+        pages = make_boilerplate_pages(rng, count)
+        fragcache.disable()
+        expected = [markdown_to_html_node(page).to_html() for page in pages[:5]]
+        uncached = best_of(parse_all, pages)
+        cache = fragcache.enable()
+        cold = best_of(parse_all, pages, repeat=1)
+        warm = best_of(parse_all, pages)
+        assert [markdown_to_html_node(page).to_html() for page in pages[:5]] == expected
+        fragcache.disable()
+        results.append((count, uncached, cold, warm, cache.stats()))
+    return results
+
+
+def bench_parse_cache(pages=200, blocks=40):
+    # Rebuilding every page after a template-only change, parsing again vs reading the parse cache
+    results = []
+    with tempfile.TemporaryDirectory() as root:
+        content, template = make_site(root, pages, blocks)
+        for label, cache in (("parse", None), ("cached", parsecache.ParseCache(os.path.join(root, "parse")))):
+            dest = os.path.join(root, f"docs-{label}")
+            parsecache.active = cache
+            time_build(content, template, dest, 1)
+            with open(template, 'a') as f:
+                f.write("<!-- changed -->\n")
+            results.append((label, time_build(content, template, dest, 1)))
+        parsecache.disable()
+    return results
+
+
+def slow_open(latency):
+    # open() that waits `latency` seconds first, standing in for a network-mounted volume
+    def opener(*args, **kwargs):
+        time.sleep(latency)
+        return open(*args, **kwargs)
+    return opener
+
+
+def bench_pipeline(pages=200, blocks=40, latency=0.0, workers=1):
+    # Rendering every page one after the other vs through the reader/render/writer pipeline
+    results = []
+    with tempfile.TemporaryDirectory() as root:
+        content, template = make_site(root, pages, blocks)
+        jobs = [(src, dest, None) for src, dest in build.collect_pages(content, os.path.join(root, "docs"))]
+        outputs = {}
+        build.open = slow_open(latency)
+        try:
+            for name, render in (("serial", build.render_pages), ("pipeline", build.pipeline_pages)):
+                start = time.perf_counter()
+                for job, refs, changed, error in render(jobs, template, "/", workers):
+                    assert error is None, error
+                results.append((name, time.perf_counter() - start))
+                outputs[name] = []
+                for _, dest, _ in jobs:
+                    with open(dest) as f:
+                        outputs[name].append(f.read())
+        finally:
+            del build.open
+        assert outputs["serial"] == outputs["pipeline"]
+    return results
+
+
+# How a large page is rendered: read whole and parsed (the parse cache path),
+# streamed line by line into a full tree, or memory-mapped and rendered block by block
+LARGE_FILE_MODES = ("read", "stream", "mapped")
+
+
+def render_large_file(mode, src, dest):
+    from template import Template
+
+    template = Template.compile("<title>{{ Title }}</title>\n{{ Content }}")
+    if mode == "read":
+        with open(src, 'rb') as f:
+            title, content, _, _ = build.render_source(f.read(), template, "/")
+        build.write_atomically(dest, lambda f: template.write(f, Title=title, Content=content))
+    elif mode == "stream":
+        from block import parse_markdown
+
+        with open(src) as f:
+            html_node, title = parse_markdown(f)
+        build.write_atomically(dest, lambda f: template.write(f, Title=title, Content=html_node))
+    else:
+        build.stream_page(src, template, dest, "/")
+
+
+def peak_rss():
+    # VmHWM starts over at exec; ru_maxrss would include the parent's peak from before it
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    import resource
+
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on Linux, bytes on macOS
+    return max_rss if sys.platform == "darwin" else max_rss * 1024
+
+
+def report_large_file(mode, src, dest):
+    # Runs in a fresh interpreter so the peak is this render's alone
+    start = time.perf_counter()
+    render_large_file(mode, src, dest)
+    seconds = time.perf_counter() - start
+    print(json.dumps({"seconds": seconds, "max_rss": peak_rss()}))
+
+
+def write_large_file(path, size_mb, rng):
+    with open(path, 'w') as f:
+        written = f.write("# A large page\n\n")
+        while written < size_mb * 1024 * 1024:
+            written += f.write(make_page(rng, 20) + "\n\n")
+
+
+def bench_large_files(sizes_mb=(10, 50, 100)):
+    # Peak RSS and time of rendering one large page in each LARGE_FILE_MODES mode
+    rng = random.Random(0)
+    src_dir = os.path.dirname(os.path.abspath(__file__))
+    env = {**os.environ, "PYTHONPATH": src_dir}
+    results = []
+    with tempfile.TemporaryDirectory() as root:
+        src = os.path.join(root, "big.md")
+        for size_mb in sizes_mb:
+            write_large_file(src, size_mb, rng)
+            outputs = {}
+            for mode in LARGE_FILE_MODES:
+                dest = os.path.join(root, f"{mode}.html")
+                code = f"import bench; bench.report_large_file({mode!r}, {src!r}, {dest!r})"
+                result = subprocess.run([sys.executable, "-c", code], env=env, capture_output=True, text=True,
+                                        check=True)
+                results.append((size_mb, mode, json.loads(result.stdout.splitlines()[-1])))
+                outputs[mode] = file_hash(dest)
+                os.remove(dest)
+            assert len(set(outputs.values())) == 1, "modes rendered different html"
+    return results
+
+
+def html_sizes(dest):
+    # (bytes, gzipped bytes) of every page under dest
+    size = compressed = 0
+    for dir_path, _, file_names in os.walk(dest):
+        for name in file_names:
+            if name.endswith(".html"):
+                with open(os.path.join(dir_path, name), 'rb') as f:
+                    data = f.read()
+                size += len(data)
+                compressed += len(gzip.compress(data, 9, mtime=0))
+    return size, compressed
+
+
+def bench_minify(pages=200, blocks=40, repeat=3):
+    # The corpus with the readable and the minified layout: page bytes (raw and
+    # gzipped), full build time and serializer throughput
+    rng = random.Random(0)
+    trees = [markdown_to_html_node(make_page(rng, blocks)) for _ in range(20)]
+    serialize = lambda trees: [tree.to_html() for tree in trees]
+    results = []
+    with tempfile.TemporaryDirectory() as root:
+        content, template = make_site(root, pages, blocks)
+        try:
+            for label, on in (("readable", False), ("minified", True)):
+                minify.active = on
+                builds = []
+                for n in range(repeat):
+                    dest = os.path.join(root, f"docs-{label}-{n}")
+                    builds.append(time_build(content, template, dest, 1))
+                size, compressed = html_sizes(dest)
+                chars = sum(len(html) for html in serialize(trees))
+                results.append((label, size, compressed, min(builds), chars / best_of(serialize, trees, repeat=15)))
+        finally:
+            minify.disable()
+    return results
+
+
+def run_jobs(argv):
+    pages = int(argv[0]) if len(argv) > 0 else 200
+    max_jobs = int(argv[1]) if len(argv) > 1 else None
+    results = bench_jobs(pages, max_jobs=max_jobs)
+
+    base = results[0][1]
+    print(f"{'jobs':>4}  {'seconds':>8}  {'speedup':>7}")
+    for jobs, seconds in results:
+        print(f"{jobs:>4}  {seconds:>8.3f}  {base / seconds:>6.2f}x")
+
+
+def run_inline(argv):
+    print(f"{'words':>6}  {'chained ms':>10}  {'single ms':>9}  {'speedup':>7}")
+    for words, chained, single in bench_inline():
+        print(f"{words:>6}  {chained * 1000:>10.2f}  {single * 1000:>9.2f}  {chained / single:>6.2f}x")
+
+
+def run_links(argv):
+    print(f"{'links':>6}  {'findall split ms':>16}  {'scanner split ms':>16}  {'findall urls ms':>15}  "
+          f"{'scanner urls ms':>15}")
+    for links, old_split, new_split, old_urls, new_urls in bench_links():
+        print(f"{links:>6}  {old_split * 1000:>16.2f}  {new_split * 1000:>16.2f}  {old_urls * 1000:>15.2f}  "
+              f"{new_urls * 1000:>15.2f}")
+
+
+def run_blocks(argv):
+    print(f"{'blocks':>6}  {'regex us/block':>14}  {'dispatch us/block':>17}  {'speedup':>7}")
+    for count, regex, dispatch in bench_blocks():
+        print(f"{count:>6}  {regex / count * 1e6:>14.2f}  {dispatch / count * 1e6:>17.2f}  {regex / dispatch:>6.2f}x")
+
+
+def run_block_reader(argv):
+    print(f"{'file MB':>7}  {'whole-string peak MB':>20}  {'streaming peak MB':>17}")
+    for size_mb, whole, streaming in bench_block_reader():
+        print(f"{size_mb:>7}  {whole / 2**20:>20.2f}  {streaming / 2**20:>17.2f}")
+
+
+def run_serializer(argv):
+    print(f"{'tree':>9}  {'recursive ms':>12}  {'streaming ms':>12}  {'recursive peak MB':>17}  {'streaming peak MB':>17}")
+    for name, recursive, streaming, recursive_peak, streaming_peak in bench_serializer():
+        print(f"{name:>9}  {recursive * 1000:>12.2f}  {streaming * 1000:>12.2f}  "
+              f"{recursive_peak / 2**20:>17.2f}  {streaming_peak / 2**20:>17.2f}")
+
+
+def run_nodes(argv):
+    print(f"{'nodes':>7}  {'__dict__ KB':>11}  {'__slots__ KB':>12}  {'flat arrays KB':>14}")
+    for nodes, dict_size, slotted_size, flat_size in bench_nodes():
+        print(f"{nodes:>7}  {dict_size / 1024:>11.1f}  {slotted_size / 1024:>12.1f}  {flat_size / 1024:>14.1f}")
+
+
+def run_fragments(argv):
+    print(f"{'pages':>5}  {'no cache ms':>11}  {'cold ms':>8}  {'warm ms':>8}  {'hit rate':>8}")
+    for count, uncached, cold, warm, stats in bench_fragments():
+        print(f"{count:>5}  {uncached * 1000:>11.2f}  {cold * 1000:>8.2f}  {warm * 1000:>8.2f}  {stats['hit_rate']:>8.2f}")
+
+
+def run_parse_cache(argv):
+    pages = int(argv[0]) if argv else 200
+    print(f"{'rebuild':>7}  {'seconds':>8}")
+    for label, seconds in bench_parse_cache(pages):
+        print(f"{label:>7}  {seconds:>8.3f}")
+
+
+def run_large_files(argv):
+    # usage: bench.py large [size MB ...]
+    sizes = tuple(int(arg) for arg in argv) or (10, 50, 100)
+    print(f"{'file MB':>7}  {'mode':>6}  {'seconds':>8}  {'peak RSS MB':>11}")
+    for size_mb, mode, result in bench_large_files(sizes):
+        print(f"{size_mb:>7}  {mode:>6}  {result['seconds']:>8.2f}  {result['max_rss'] / 2**20:>11.1f}")
+
+
+def run_pipeline(argv):
+    # usage: bench.py pipeline [pages] [latency ms] [workers]
+    pages = int(argv[0]) if len(argv) > 0 else 200
+    latency = float(argv[1]) / 1000 if len(argv) > 1 else 0.0
+    workers = int(argv[2]) if len(argv) > 2 else 1
+    results = bench_pipeline(pages, latency=latency, workers=workers)
+    base = results[0][1]
+    print(f"{'build':>8}  {'seconds':>8}  {'speedup':>7}")
+    for name, seconds in results:
+        print(f"{name:>8}  {seconds:>8.3f}  {base / seconds:>6.2f}x")
+
+
+def run_minify(argv):
+    # usage: bench.py minify [pages]
+    pages = int(argv[0]) if argv else 200
+    results = bench_minify(pages)
+    base_size, base_compressed = results[0][1], results[0][2]
+    print(f"{'layout':>8}  {'html KB':>8}  {'gzip KB':>8}  {'saved':>6}  {'gzip saved':>10}  {'build s':>8}  "
+          f"{'serialize MB/s':>14}")
+    for label, size, compressed, seconds, throughput in results:
+        print(f"{label:>8}  {size / 1024:>8.1f}  {compressed / 1024:>8.1f}  {1 - size / base_size:>6.1%}  "
+              f"{1 - compressed / base_compressed:>10.1%}  {seconds:>8.3f}  {throughput / 2**20:>14.2f}")
+
+
+RESULTS_DIR = os.path.join(".ssg", "bench")
+
+
+def measure(func, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start)
+    return {"min": min(timings), "median": statistics.median(timings), "repeat": repeat}
+
+
+def run_suite_benchmarks(pages=50, blocks=200, repeat=5, seed=0):
+    # The standard suite: each hot function in isolation, then whole builds
+    results = {}
+    with tempfile.TemporaryDirectory() as root:
+        content, template = make_site(root, pages, blocks, seed=seed)
+        page_path = os.path.join(content, "section0", "page0", "index.md")
+        with open(page_path) as f:
+            markdown = f.read()
+        paragraph = make_paragraph(random.Random(seed), 2000)
+        tree = markdown_to_html_node(markdown)
+        dest = os.path.join(root, "docs")
+
+        results["markdown_to_html_node"] = measure(lambda: markdown_to_html_node(markdown), repeat)
+        results["text_to_textnodes"] = measure(lambda: text_to_textnodes(paragraph), repeat)
+        results["to_html"] = measure(tree.to_html, repeat)
+        results["generate_page"] = measure(
+            lambda: generate_page(page_path, template, os.path.join(dest, "page.html"), "/"), repeat)
+        results["generate_pages_recursive"] = measure(
+            lambda: generate_pages_recursive(content, template, dest, "/"), max(1, repeat // 2))
+    return results
+
+
+def git_revision():
+    try:
+        rev = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+        dirty = subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"],
+                               capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+    return rev + ("-dirty" if dirty else "")
+
+
+def save_results(results, config, label=None):
+    os.makedirs(RESULTS_DIR, exist_ok=True)
+    label = label or git_revision()
+    path = os.path.join(RESULTS_DIR, f"{label}.json")
+    with open(path, 'w') as f:
+        json.dump({
+            "label": label,
+            "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": platform.python_version(),
+            "machine": platform.machine(),
+            "config": config,
+            "results": results,
+        }, f, indent=2, sort_keys=True)
+    return path
+
+
+def load_results(name):
+    # Accepts a path or a label saved in RESULTS_DIR
+    path = name if os.path.exists(name) else os.path.join(RESULTS_DIR, f"{name}.json")
+    with open(path) as f:
+        return json.load(f)
+
+
+def run_suite(argv):
+    parser = argparse.ArgumentParser(prog="bench.py suite")
+    parser.add_argument("--pages", type=int, default=50)
+    parser.add_argument("--blocks", type=int, default=200)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--label", help="name to save the results under (default: git revision)")
+    parser.add_argument("--no-save", action="store_true")
+    args = parser.parse_args(argv)
+
+    config = {"pages": args.pages, "blocks": args.blocks, "repeat": args.repeat, "seed": args.seed}
+    results = run_suite_benchmarks(args.pages, args.blocks, args.repeat, args.seed)
+    print(f"{'benchmark':<26}  {'min ms':>10}  {'median ms':>10}")
+    for name, stats in results.items():
+        print(f"{name:<26}  {stats['min'] * 1000:>10.2f}  {stats['median'] * 1000:>10.2f}")
+    if not args.no_save:
+        print(f"saved {save_results(results, config, args.label)}")
+
+
+def run_compare(argv):
+    # usage: bench.py compare <baseline> <candidate>
+    if len(argv) != 2:
+        sys.exit("usage: bench.py compare <baseline> <candidate>")
+    base, new = load_results(argv[0]), load_results(argv[1])
+    if base["config"] != new["config"]:
+        print(f"warning: configs differ: {base['config']} vs {new['config']}")
+    print(f"{'benchmark':<26}  {base['label']:>12}  {new['label']:>12}  {'change':>8}")
+    for name, stats in new["results"].items():
+        if name not in base["results"]:
+            continue
+        before = base["results"][name]["min"]
+        after = stats["min"]
+        print(f"{name:<26}  {before * 1000:>10.2f}ms  {after * 1000:>10.2f}ms  {(after / before - 1) * 100:>+7.1f}%")
+
+
+BENCHMARKS = {
+    "jobs": run_jobs,
+    "inline": run_inline,
+    "links": run_links,
+    "blocks": run_blocks,
+    "reader": run_block_reader,
+    "serializer": run_serializer,
+    "nodes": run_nodes,
+    "fragments": run_fragments,
+    "parsecache": run_parse_cache,
+    "pipeline": run_pipeline,
+    "large": run_large_files,
+    "minify": run_minify,
+    "suite": run_suite,
+    "compare": run_compare,
+}
+
+
+def main(argv=None):
+    # usage: python3 src/bench.py <benchmark> [args...]
+    argv = sys.argv[1:] if argv is None else argv
+    name = argv[0] if argv else "suite"
+    if name not in BENCHMARKS:
+        sys.exit(f"unknown benchmark {name!r}, choose from: {', '.join(BENCHMARKS)}")
+    BENCHMARKS[name](argv[1:])
+
+
+if __name__ == "__main__":
+    main()
@@ -1,8 +1,16 @@
+import logging
 import re
 from enum import Enum
-from htmlnode import HTMLNode, ParentNode, LeafNode, text_node_to_html_node, text_to_textnodes 
+import profiler
+import stages
+from depgraph import markup_key
+from plaintext import heading_anchor
+from htmlnode import HTMLNode, ParentNode, LeafNode, extract_markdown_urls, iter_html, text_node_to_html_node, \
+                     text_to_textnodes 
 from textnode import TextNode, TextType, split_nodes_delimiter
 
+logger = logging.getLogger(__name__)
+
 class BlockType(Enum):
     PARAGRAPH = 'p'
     HEADING = 'h1'
@@ -16,132 +24,211 @@ class BlockType(Enum):
     UNORDERED_LIST = 'ul'
     ORDERED_LIST = 'ol'
     
+def iter_blocks(lines):
+    # Lazily groups lines (e.g. an open file) into stripped blocks separated by
+    # blank lines. Blank lines inside a ``` fence belong to the code block.
+    block = []
+    in_fence = False
+    for line in lines:
+        line = line.rstrip("\n")
+        stripped = line.strip()
+        if in_fence:
+            block.append(line)
+            if stripped.endswith("```"):
+                in_fence = False
+            continue
+        if not stripped:
+            if block:
+                yield "\n".join(block).strip()
+                block = []
+            continue
+        if stripped.startswith("```"):
+            # An opening fence, unless the same line also closes it
+            in_fence = len(stripped) < 6 or not stripped.endswith("```")
+        block.append(line)
+    if block:
+        yield "\n".join(block).strip()
+
 def markdown_to_blocks(markdown):
-    blocks = markdown.split("\n\n")
-    blocks = [block.strip() for block in blocks if block.strip() != ""]
-    return blocks
+    return list(iter_blocks(markdown.split("\n")))
+
+HEADING_TYPES = (
+    BlockType.HEADING,
+    BlockType.HEADING2,
+    BlockType.HEADING3,
+    BlockType.HEADING4,
+    BlockType.HEADING5,
+    BlockType.HEADING6,
+)
+HEADING_PATTERN = re.compile(r'(#{1,6}) [^\n]+')
+ORDERED_ITEM_PATTERN = re.compile(r'\d+\. [^\n]')
+
+# Markers clean_block_text strips, compiled once at import
+HEADING_MARKER = re.compile(r'^(#{1,6}) ')
+CODE_FENCE = re.compile(r'^```|```$')
+QUOTE_MARKER = re.compile(r'^> ?', re.MULTILINE)
+UNORDERED_MARKER = re.compile(r'^- ')
+ORDERED_MARKER = re.compile(r'^\d+\. ')
+
+def classify_block(block):
+    # Dispatches on the first character so each block is checked against at
+    # most one rule. Returns (block_type, heading_level); the level is 0 for
+    # anything that is not a heading.
+    first = block[:1]
+    if first == "#":
+        match = HEADING_PATTERN.fullmatch(block)
+        if match:
+            level = len(match.group(1))
+            return HEADING_TYPES[level - 1], level
+    elif first == "`":
+        if len(block) >= 6 and block.startswith("```") and block.endswith("```"):
+            return BlockType.CODE, 0
+    elif first == ">":
+        if all(line.startswith(">") for line in block.split("\n")):
+            return BlockType.QUOTE, 0
+    elif first == "-":
+        if all(line.startswith("- ") and len(line) > 2 for line in block.split("\n")):
+            return BlockType.UNORDERED_LIST, 0
+    elif first.isdigit():
+        if all(ORDERED_ITEM_PATTERN.match(line) for line in block.split("\n")):
+            return BlockType.ORDERED_LIST, 0
+    return BlockType.PARAGRAPH, 0
 
 def block_to_block_type(block):
-    if re.match(r'^(#{1}) .+$', block):
-        return BlockType.HEADING
-    elif re.match(r'^(#{2}) .+$', block):
-        return BlockType.HEADING2
-    elif re.match(r'^(#{3}) .+$', block):
-        return BlockType.HEADING3
-    elif re.match(r'^(#{4}) .+$', block):
-        return BlockType.HEADING4
-    elif re.match(r'^(#{5}) .+$', block):
-        return BlockType.HEADING5
-    elif re.match(r'^(#{6}) .+$', block):
-        return BlockType.HEADING6
-    elif re.match(r"^```[\s\S]*?```$", block):
-        return BlockType.CODE
-    elif re.match(r'^(?:> ?.*(?:\n|$))+$', block):
-        return BlockType.QUOTE
-    elif re.match(r"^(?:- .+(?:\n|$))+$", block):
-        return BlockType.UNORDERED_LIST
-    elif re.match(r'^(?:\d+\. .+(?:\n|$))+$', block):
-        return BlockType.ORDERED_LIST
-    else:
-        return BlockType.PARAGRAPH
+    return classify_block(block)[0]
 
-def  markdown_to_html_node(markdown):
-    blocks = markdown_to_blocks(markdown)
+def parse_markdown(lines, base_path="/", refs=None, index=None):
+    # Builds the html node tree and finds the title in the same pass over the
+    # blocks. Returns (html_node, title); title is None if there is no "# " block.
+    # If refs is a list, the urls of the page's links and images are appended to it.
+    # If index is a search.PageIndex, every block's text is added to it.
     block_nodes = []
+    title = None
+    for block, node in iter_block_nodes(iter_blocks(lines), base_path, refs, index):
+        if title is None and block.startswith("# "):
+            title = block[2:].strip()
+        block_nodes.append(node)
+    return ParentNode(tag="div", children=block_nodes), title
+
+def iter_markdown_html(blocks, base_path="/", refs=None, index=None):
+    # The html parse_markdown's tree serializes to, produced block by block from
+    # already split blocks, so a page never exists as a whole tree in memory
+    yield "<div>"
+    for _, node in iter_block_nodes(blocks, base_path, refs, index):
+        yield from iter_html(node)
+    yield "</div>" if stages.active("minify") else "</div>\n"
+
+def iter_block_nodes(blocks, base_path="/", refs=None, index=None):
+    # Yields (block, html node) for every block
+    classify = classify_block
+    clean = clean_block_text
+    tokenize = text_to_textnodes
+    convert = text_nodes_to_html_nodes
+    prof = profiler.active
+    cache = stages.active("fragcache")
+    minifying = stages.active("minify")
+    if prof.enabled:
+        blocks = prof.timed_iter(profiler.BLOCK_SPLITTING, blocks)
+        classify = prof.timed(profiler.BLOCK_CLASSIFICATION, classify)
+        clean = prof.timed(profiler.BLOCK_CLASSIFICATION, clean)
+        tokenize = prof.timed(profiler.INLINE_TOKENIZING, tokenize)
+        convert = prof.timed(profiler.NODE_CONVERSION, convert)
+
     for block in blocks:
-        block_type = block_to_block_type(block)
+        urls = extract_markdown_urls(block) if "](" in block and (refs is not None or cache is not None) else ()
+        if refs is not None:
+            refs.extend(urls)
+        block_type, level = classify(block)
+        if index is not None:
+            index.add(block, level)
+        if cache is not None:
+            # A cached block comes back as a raw html leaf with the same output
+            key = (block_type.value, block, base_path)
+            if urls:
+                # Link and image markup also depends on what the stages know about their targets
+                key += (markup_key(urls),)
+            if minifying:
+                key += (stages.module("minify").render_key(),)
+            html = cache.get(key)
+            if html is None:
+                html = "".join(iter_html(_block_node(block, block_type, level, clean, tokenize, convert, base_path)))
+                cache.put(key, html)
+            yield block, LeafNode(None, html)
+            continue
+        yield block, _block_node(block, block_type, level, clean, tokenize, convert, base_path)
 
-        # stripping block type markers from the block text
-        block_text = clean_block_text(block, block_type)
+def _block_node(block, block_type, level, clean, tokenize, convert, base_path):
+    # stripping block type markers from the block text
+    if level:
+        block_text = block[level + 1:]
+        # Headings get an id so search results (and anyone else) can link to them
+        anchor = heading_anchor(block_text)
+        props = {"id": anchor} if anchor else None
+    else:
+        block_text = clean(block, block_type)
+        props = None
+
+    children = convert(tokenize(block_text), base_path)
+    return ParentNode(tag=block_type.value, children=children, props=props)
 
-        children = text_to_children(block_text)
-        block_node = ParentNode(tag=block_type.value, children=children)
-        block_nodes.append(block_node)
-    return ParentNode(tag="div", children=block_nodes)
+def markdown_to_html_node(markdown, base_path="/"):
+    return parse_markdown(markdown.split("\n"), base_path)[0]
 
 def clean_block_text(block, block_type):
-    if block_type in (
-        BlockType.HEADING,
-        BlockType.HEADING2,
-        BlockType.HEADING3,
-        BlockType.HEADING4,
-        BlockType.HEADING5,
-        BlockType.HEADING6,
-    ):
-        return re.sub(r'^(#{1,6}) ', '', block)
+    if block_type in HEADING_TYPES:
+        return HEADING_MARKER.sub('', block)
 
     elif block_type == BlockType.CODE:
-        return re.sub(r'^```|```$', '', block)
+        return CODE_FENCE.sub('', block)
 
     elif block_type == BlockType.QUOTE:
-        return re.sub(r'^> ?', '', block, flags=re.MULTILINE)
+        return QUOTE_MARKER.sub('', block)
 
     elif block_type == BlockType.UNORDERED_LIST:
         lines = block.split('\n')
         items = [
-            f"<li>{re.sub(r'^- ', '', line)}</li>"
+            f"<li>{UNORDERED_MARKER.sub('', line)}</li>"
             for line in lines if line.strip()
         ]
-        return "  " + "\n  ".join(items)
+        return join_list_items(items)
 
     elif block_type == BlockType.ORDERED_LIST:
         lines = block.split('\n')
         items = []
         for line in lines:
             if line.strip():
-                cleaned = re.sub(r'^\d+\. ', '', line)
+                cleaned = ORDERED_MARKER.sub('', line)
                 items.append(f"<li>{cleaned}</li>")
-        return "  " + "\n  ".join(items)
+        return join_list_items(items)
 
     else:
         return block
 
 
-def text_to_children(text):
-    text_nodes = text_to_textnodes(text)
-    html_nodes = [text_node_to_html_node(node) for node in text_nodes]
-    return html_nodes
+def join_list_items(items):
+    # One indented item per line; minified lists run them together
+    if stages.active("minify"):
+        return "".join(items)
+    return "  " + "\n  ".join(items)
+
+
+def text_nodes_to_html_nodes(text_nodes, base_path="/"):
+    return [text_node_to_html_node(node, base_path) for node in text_nodes]
+
+def text_to_children(text, base_path="/"):
+    return text_nodes_to_html_nodes(text_to_textnodes(text), base_path)
 
 
 def extract_title(markdown):
-    blocks = markdown_to_blocks(markdown)
-    for block in blocks:
+    for block in iter_blocks(markdown.split("\n")):
         if block.startswith("# "):
             return block[2:].strip()
     raise ValueError("No title found in markdown")
 
-import os
-
-def generate_page(from_path, template_path, dest_path, base_path=""):
-    print(f"Generating page from {from_path} to {dest_path} using template {template_path}")
-    
-    with open(from_path, 'r') as f:
-        markdown = f.read()
-
-    html_node = markdown_to_html_node(markdown)
-    html = html_node.to_html()
-    title = extract_title(markdown)
-    
-    with open(template_path, 'r') as f:
-        template = f.read()
-
-    html = template.replace("{{ Title }}", title).replace("{{ Content }}", html).replace('href="/', f'href="{base_path}').replace('src="/', f'src="{base_path}')
-
-    # ✅ Ensure destination directory exists
-    os.makedirs(os.path.dirname(dest_path), exist_ok=True)
-
-    with open(dest_path, 'w') as f:
-        f.write(html)
-
-def generate_pages_recursive(dir_path_content, template_path, dest_dir_path, base_path=""):
-    for item in os.listdir(dir_path_content):
-        content_path = os.path.join(dir_path_content, item)
-        dest_path = os.path.join(dest_dir_path, item.replace('.md', '.html'))
-
-        if os.path.isdir(content_path):
-            generate_pages_recursive(content_path, template_path, dest_path, base_path)
-        elif content_path.endswith('.md'):
-            generate_page(content_path, template_path, dest_path, base_path)
+# The build itself lives in build.py, which only imports the parser once a
+# page actually has to be rendered; these names stay importable from here
+from build import write_atomically, generate_page, render_page, collect_pages, remove_stale_pages, \
+                  render_pages, generate_pages_recursive
 
 
 if __name__ == "__main__":
@@ -0,0 +1,521 @@
+import filecmp
+import io
+import logging
+import os
+
+import profiler
+import stages
+from depgraph import DependencyGraph, markup_key
+from manifest import Manifest, build_key, file_hash
+
+logger = logging.getLogger(__name__)
+
+# Stages whose settings go into every page's html: whether it has a search box
+# and whether it is minified. The image catalog and the fingerprinted names only
+# go into the markup of the links and images that point at them, which each
+# page records with its assets (DependencyGraph.asset_signature).
+RENDER_STAGES = ("search", "minify")
+
+
+def render_key():
+    # What besides the source, template and base path goes into a page's html.
+    # Stages that were never imported are off and add nothing.
+    return "".join(stages.module(name).render_key() for name in RENDER_STAGES if stages.module(name) is not None)
+
+
+def current_build_key(template_path, base_path):
+    # build_key with render_key() and, when fingerprinting is on, the names the
+    # template's own links come out with, which every page carries
+    key = render_key()
+    asset_map = stages.active("fingerprint")
+    if asset_map is not None:
+        with open(template_path, 'r') as f:
+            text = f.read()
+        if stages.active("search") is not None:
+            text += "".join(stages.module("search").template_values().values())
+        key += asset_map.template_key(text)
+    return build_key(template_path, base_path, key)
+
+
+def load_template(template_path, base_path):
+    from template import Template
+
+    # The {{ Search }} slot stays empty unless search is on
+    search = stages.module("search")
+    return Template.load(template_path, base_path, search.template_values() if search is not None else {"Search": ""})
+
+
+# multiprocessing context of the render pools; None is the platform's default
+POOL_CONTEXT = None
+
+
+def stage_settings():
+    # What rendering a page reads from the optional stages, None for those that
+    # are off. Pool workers are set up from this by _init_worker instead of
+    # relying on fork to hand the module state down: spawned workers would
+    # start with every stage off. The image catalog and asset map are small and
+    # go as they are; the caches and the fragment store go as where they live.
+    store = stages.active("search")
+    parse_cache = stages.active("parsecache")
+    cache = stages.active("fragcache")
+    return {
+        "images": stages.active("images"),
+        "fingerprint": stages.active("fingerprint"),
+        "minify": True if stages.active("minify") else None,
+        "search": store.directory if store is not None else None,
+        "parsecache": (parse_cache.directory, parse_cache.max_bytes) if parse_cache is not None else None,
+        "fragcache": (cache.max_bytes, cache.path) if cache is not None else None,
+    }
+
+
+def _init_worker(settings, profiling):
+    # Stages that are off are not imported, or turned off again if fork brought them along
+    for name, setting in settings.items():
+        if setting is None and stages.module(name) is not None:
+            stages.module(name).disable()
+    if settings["images"] is not None:
+        import images
+        images.active = settings["images"]
+    if settings["fingerprint"] is not None:
+        import fingerprint
+        fingerprint.active = settings["fingerprint"]
+    if settings["minify"] is not None:
+        import minify
+        minify.enable()
+    if settings["search"] is not None:
+        import search
+        search.enable(settings["search"])
+    if settings["parsecache"] is not None:
+        import parsecache
+        parsecache.enable(*settings["parsecache"])
+    if settings["fragcache"] is not None:
+        import fragcache
+        fragcache.enable(*settings["fragcache"])
+    if profiling:
+        profiler.enable()
+
+
+def _render_pool(workers):
+    from concurrent.futures import ProcessPoolExecutor
+
+    return ProcessPoolExecutor(max_workers=workers, mp_context=POOL_CONTEXT, initializer=_init_worker,
+                               initargs=(stage_settings(), profiler.active.enabled))
+
+
+def write_atomically(dest_path, write):
+    # Calls write(f) on a temporary file next to dest_path and moves it into place
+    # once it is complete, so a failure never leaves a half-written page behind.
+    # If the result is identical to the existing file, the file is left alone
+    # (mtime included) so rsync and CDN uploads skip it. Returns True if it changed.
+    os.makedirs(os.path.dirname(dest_path), exist_ok=True)
+    tmp_path = dest_path + ".tmp"
+    try:
+        with open(tmp_path, 'w') as f:
+            write(f)
+        if os.path.isfile(dest_path) and filecmp.cmp(tmp_path, dest_path, shallow=False):
+            os.remove(tmp_path)
+            return False
+        os.replace(tmp_path, dest_path)
+        return True
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def generate_page(from_path, template_path, dest_path, base_path="", template=None):
+    # `template` is an already compiled Template; builds pass one in so the
+    # template file is read and parsed once instead of once per page.
+    # Returns the page's profile record when profiling is on, otherwise None.
+    return render_page(from_path, template_path, dest_path, base_path, template)[2]
+
+
+def render_page(from_path, template_path, dest_path, base_path="", template=None):
+    # generate_page, also returning the urls the page references and whether
+    # dest_path changed: (refs, changed, profile record)
+    # The parser and template engine are imported here rather than at the top,
+    # so a build where every page is fresh never loads them
+    import mapped
+    from block import parse_markdown
+
+    logger.debug("generate page src=%s dest=%s template=%s", from_path, dest_path, template_path)
+    prof = profiler.active
+
+    with prof.page(from_path):
+        if template is None:
+            with prof.stage(profiler.TEMPLATING):
+                template = load_template(template_path, base_path)
+
+        if mapped.is_large(from_path):
+            # Bypasses the parse cache: caching the article would mean holding all of it in memory
+            refs, changed, fragment = stream_page(from_path, template, dest_path, base_path)
+        elif prof.enabled or stages.active("parsecache") is not None:
+            # Keep the stages apart: read, parse, serialize, fill the template, write.
+            # The parse cache needs the source bytes and the article as a string anyway.
+            with prof.stage(profiler.IO):
+                with open(from_path, 'rb') as f:
+                    source = f.read()
+            title, content, refs, fragment = render_source(source, template, base_path)
+            if prof.enabled:
+                # Filled on its own so templating and io are timed apart
+                with prof.stage(profiler.TEMPLATING):
+                    html = template.render(Title=title, Content=content)
+                write = lambda f: f.write(html)
+            else:
+                # Streamed through write_chunks, so only the article (which the
+                # parse cache keeps anyway) is held as a string, never the whole page
+                write = lambda f: template.write(f, Title=title, Content=content)
+            with prof.stage(profiler.IO):
+                changed = write_atomically(dest_path, write)
+        else:
+            refs = []
+            index = page_index()
+            with open(from_path, 'r') as f:
+                html_node, title = parse_markdown(f, base_path, refs, index)
+            if title is None:
+                raise ValueError("No title found in markdown")
+            changed = write_atomically(dest_path, lambda f: template.write(f, Title=title, Content=html_node))
+            refs = list(dict.fromkeys(refs))
+            fragment = index.fragment(title) if index is not None else None
+        if fragment is not None:
+            stages.active("search").put(from_path, fragment)
+
+    return refs, changed, prof.page_report(from_path)
+
+
+def page_index():
+    # A search.PageIndex to collect the page's text in, or None when search is off
+    return stages.module("search").PageIndex() if stages.active("search") is not None else None
+
+
+def stream_page(from_path, template, dest_path, base_path):
+    # Renders a large source straight from a memory map into dest_path, one
+    # block at a time, so neither the markdown nor the page is held whole.
+    # Returns (refs, changed, search fragment or None).
+    import mapped
+    from block import iter_markdown_html
+    from htmlnode import extract_markdown_urls
+
+    # Collected without duplicates as the blocks go by: a large page repeats its links a lot
+    refs = {}
+    index = page_index()
+
+    def blocks():
+        for block in source.blocks():
+            if "](" in block:
+                refs.update(dict.fromkeys(extract_markdown_urls(block)))
+            yield block
+
+    with mapped.MappedSource(from_path) as source:
+        title = source.title()
+        if title is None:
+            raise ValueError("No title found in markdown")
+        content = iter_markdown_html(blocks(), base_path, index=index)
+        changed = write_atomically(dest_path, lambda f: template.write(f, Title=title, Content=content))
+    return list(refs), changed, index.fragment(title) if index is not None else None
+
+
+def render_source(source, template, base_path):
+    # The part of render_page between reading and writing: markdown bytes in,
+    # (title, article html, referenced urls, search fragment or None) out.
+    # Filling the template is left to the writer, which streams it into the file.
+    # Consults the parse cache if one is active.
+    from block import parse_markdown
+
+    prof = profiler.active
+    cache = stages.active("parsecache")
+    index = page_index()
+    entry = None
+    if cache is not None:
+        with prof.stage(profiler.IO):
+            key = stages.module("parsecache").source_key(source, base_path, render_key())
+            entry = cache.get(key)
+        if entry is not None and index is not None and entry[3] is None:
+            # Cached by a build without search: parse again to index the page
+            entry = None
+        if entry is not None and entry[4] != markup_key(entry[2]):
+            # An image or fingerprinted asset the page links to changed since
+            entry = None
+    if entry is None:
+        # TextIOWrapper decodes and translates newlines exactly like open()
+        refs = []
+        html_node, title = parse_markdown(io.TextIOWrapper(io.BytesIO(source)), base_path, refs, index)
+        if title is None:
+            raise ValueError("No title found in markdown")
+        with prof.stage(profiler.SERIALIZATION):
+            content = html_node.to_html()
+        fragment = index.fragment(title) if index is not None else None
+        if cache is not None:
+            with prof.stage(profiler.IO):
+                cache.put(key, title, content, refs, fragment["sections"] if fragment is not None else None,
+                          markup_key(refs))
+    else:
+        title, content, refs, sections, _ = entry
+        fragment = {"title": title, "sections": sections} if index is not None else None
+    return title, content, list(dict.fromkeys(refs)), fragment
+
+
+def collect_pages(dir_path_content, dest_dir_path):
+    # Walks the content tree and returns a sorted list of (source, destination) pairs
+    pages = []
+    for item in sorted(os.listdir(dir_path_content)):
+        content_path = os.path.join(dir_path_content, item)
+        dest_path = os.path.join(dest_dir_path, item.replace('.md', '.html'))
+
+        if os.path.isdir(content_path):
+            pages.extend(collect_pages(content_path, dest_path))
+        elif content_path.endswith('.md'):
+            pages.append((content_path, dest_path))
+    return pages
+
+
+def remove_stale_pages(manifest, sources, changes=None):
+    # Deletes the outputs of pages whose markdown source no longer exists
+    removed = 0
+    for src_path in sorted(set(manifest.pages) - set(sources)):
+        dest_path = manifest.pages.pop(src_path)["dest"]
+        if os.path.exists(dest_path):
+            logger.info("remove page dest=%s reason=source-deleted src=%s", dest_path, src_path)
+            os.remove(dest_path)
+            if changes is not None:
+                changes.remove(dest_path)
+            try:
+                os.rmdir(os.path.dirname(dest_path))
+            except OSError:
+                pass
+        removed += 1
+    return removed
+
+
+def render_pages(jobs, template_path, base_path, workers=1):
+    # Renders (source, destination, hash) jobs, serially or in a process pool.
+    # Yields (job, refs, changed, error) in the same order as `jobs` so the caller sees a
+    # deterministic sequence no matter which worker finished first.
+    if not jobs:
+        return
+    prof = profiler.active
+    with prof.stage(profiler.TEMPLATING):
+        template = load_template(template_path, base_path)
+    if workers <= 1 or len(jobs) <= 1:
+        for job in jobs:
+            try:
+                refs, changed, _ = render_page(job[0], template_path, job[1], base_path, template)
+            except Exception as e:
+                yield job, None, False, e
+            else:
+                yield job, refs, changed, None
+        return
+
+    with _render_pool(workers) as pool:
+        futures = [
+            pool.submit(render_page, content_path, template_path, dest_path, base_path, template)
+            for content_path, dest_path, _ in jobs
+        ]
+        for job, future in zip(jobs, futures):
+            try:
+                refs, changed, record = future.result()
+            except Exception as e:
+                yield job, None, False, e
+            else:
+                prof.merge_page(job[0], record)
+                yield job, refs, changed, None
+
+
+# How many pages each pipeline stage may run ahead of the next one
+PIPELINE_DEPTH = 16
+_DONE = object()
+
+
+def _read_sources(jobs, sources):
+    for job in jobs:
+        try:
+            with open(job[0], 'rb') as f:
+                sources.put((job, f.read(), None))
+        except Exception as e:
+            sources.put((job, None, e))
+    sources.put(_DONE)
+
+
+def _write_outputs(writes, template, results):
+    # Writes (and reports) pages strictly in job order
+    while True:
+        item = writes.get()
+        if item is _DONE:
+            break
+        job, page, refs, fragment, error = item
+        changed = False
+        if error is None:
+            try:
+                title, content = page
+                changed = write_atomically(job[1], lambda f: template.write(f, Title=title, Content=content))
+                if fragment is not None:
+                    stages.active("search").put(job[0], fragment)
+            except Exception as e:
+                error = e
+        results.append((job, refs, changed, error))
+
+
+def pipeline_pages(jobs, template_path, base_path, workers=1, depth=PIPELINE_DEPTH):
+    """
+    Renders (source, destination, hash) jobs like render_pages, but overlaps the
+    disk and the CPU: a reader thread prefetches markdown sources, pages are
+    rendered in this thread (or a process pool) and a writer thread writes them out.
+    The stages are joined by queues of at most `depth` pages, so a slow disk or a
+    slow renderer makes the others wait instead of piling pages up in memory.
+    Yields (job, refs, changed, error) in the same order as `jobs` once everything is written.
+    """
+    if not jobs:
+        return
+    import queue
+    import threading
+    from collections import deque
+
+    import mapped
+
+    template = load_template(template_path, base_path)
+    # Large sources are not read into the queues; they are streamed once the rest is written
+    all_jobs = jobs
+    streamed = [job for job in jobs if mapped.is_large(job[0])]
+    if streamed:
+        skip = set(streamed)
+        jobs = [job for job in jobs if job not in skip]
+    sources = queue.Queue(depth)
+    writes = queue.Queue(depth)
+    results = []
+    reader = threading.Thread(target=_read_sources, args=(jobs, sources), daemon=True)
+    writer = threading.Thread(target=_write_outputs, args=(writes, template, results), daemon=True)
+    reader.start()
+    writer.start()
+
+    def render_serially():
+        while (item := sources.get()) is not _DONE:
+            job, source, error = item
+            if error is None:
+                try:
+                    title, content, refs, fragment = render_source(source, template, base_path)
+                except Exception as e:
+                    error = e
+            writes.put((job, (title, content), refs, fragment, None) if error is None else (job, None, None, None, error))
+
+    def render_in_pool(pool):
+        # At most `depth` pages are in flight; the oldest is handed on first
+        in_flight = deque()
+
+        def hand_on():
+            job, future = in_flight.popleft()
+            try:
+                title, content, refs, fragment = future.result()
+            except Exception as e:
+                writes.put((job, None, None, None, e))
+            else:
+                writes.put((job, (title, content), refs, fragment, None))
+
+        while (item := sources.get()) is not _DONE:
+            job, source, error = item
+            if error is None:
+                in_flight.append((job, pool.submit(render_source, source, template, base_path)))
+            else:
+                in_flight.append((job, _failed(error)))
+            if len(in_flight) >= depth:
+                hand_on()
+        while in_flight:
+            hand_on()
+
+    try:
+        if workers <= 1 or len(jobs) <= 1:
+            render_serially()
+        else:
+            with _render_pool(workers) as pool:
+                render_in_pool(pool)
+    finally:
+        writes.put(_DONE)
+        writer.join()
+    reader.join()
+    if streamed:
+        results.extend(render_pages(streamed, template_path, base_path))
+        order = {job: i for i, job in enumerate(all_jobs)}
+        results.sort(key=lambda result: order[result[0]])
+    yield from results
+
+
+def _failed(error):
+    from concurrent.futures import Future
+
+    future = Future()
+    future.set_exception(error)
+    return future
+
+
+def generate_pages_recursive(dir_path_content, template_path, dest_dir_path, base_path="", manifest=None, jobs=1,
+                             pipeline=True, changes=None, shard=None, asset_dir=None):
+    # Static files are expected to be in dest_dir_path already: pages are rebuilt
+    # when a file they reference changes, and references to missing files are logged.
+    # pipeline=False renders page by page (render_pages); profiled builds always
+    # do, so each stage's time is charged to the right page.
+    # Pages that are written or removed are recorded in `changes` (a publish.ChangeSet).
+    # shard=(i, N) renders only the pages shard.select_pages assigns to shard i;
+    # links to the other shards' pages still resolve. asset_dir is passed on to
+    # DependencyGraph.
+    # With search on (search.active), pages without a stored search fragment are
+    # rendered too, and the site index is rewritten when any page changed; a
+    # sharded build leaves the index to the merge.
+    # What the image catalog (images.active) and fingerprinted asset names
+    # (fingerprint.active) say about the files a page references is part of its
+    # asset signatures, so a changed image or asset rebuilds only the pages that
+    # point at it.
+    if manifest is None:
+        manifest = Manifest()
+
+    all_pages = collect_pages(dir_path_content, dest_dir_path)
+    graph = DependencyGraph(dest_dir_path, template_path, [dest_path for _, dest_path in all_pages], asset_dir)
+    if shard is None:
+        pages = all_pages
+    else:
+        from shard import select_pages
+        pages = select_pages(all_pages, dir_path_content, shard)
+    removed = remove_stale_pages(manifest, [src_path for src_path, _ in pages], changes)
+
+    build = current_build_key(template_path, base_path)
+    store = stages.active("search")
+    stale = []
+    skipped = 0
+    for content_path, dest_path in pages:
+        src_hash = file_hash(content_path)
+        if manifest.is_fresh(content_path, dest_path, src_hash, build) \
+                and not graph.assets_changed(manifest.pages[content_path]) \
+                and (store is None or store.has(content_path)):
+            skipped += 1
+        else:
+            stale.append((content_path, dest_path, src_hash))
+
+    rebuilt = 0
+    failed = []
+    render = pipeline_pages if pipeline and not profiler.active.enabled else render_pages
+    unchanged = 0
+    for (content_path, dest_path, src_hash), refs, changed, error in render(stale, template_path, base_path, jobs):
+        if error is None:
+            manifest.record(content_path, dest_path, src_hash, refs, graph.assets_for(refs, dest_path))
+            rebuilt += 1
+            if not changed:
+                unchanged += 1
+            elif changes is not None:
+                changes.wrote(dest_path)
+        else:
+            # Forget the page so the next build retries it
+            manifest.pages.pop(content_path, None)
+            failed.append((content_path, error))
+            logger.error("page failed src=%s error=%r", content_path, error)
+
+    manifest.build = build
+    manifest.save()
+    if store is not None and shard is None:
+        import search
+        if rebuilt or removed or not os.path.exists(search.index_path(dest_dir_path)):
+            search.write_index(store, manifest, dest_dir_path, changes)
+    for content_path, url in graph.broken_references(manifest):
+        logger.warning("broken reference src=%s url=%s", content_path, url)
+    logger.info("pages rebuilt=%d unchanged=%d skipped=%d removed=%d", rebuilt, unchanged, skipped, removed)
+    if failed:
+        pages_list = ", ".join(content_path for content_path, _ in failed)
+        raise RuntimeError(f"Failed to generate {len(failed)} page(s): {pages_list}") from failed[0][1]
+    return rebuilt, skipped
@@ -0,0 +1,75 @@
+import os
+import sys
+
+# Only sys and os are imported up front: each command imports what it needs
+# when it runs, so `ssg build` on an up-to-date site never loads the markdown
+# parser and `ssg --help` loads almost nothing.
+
+USAGE = """usage: ssg <command> [options]
+
+commands:
+  build [basepath]   build content/ into docs/, rebuilding only what changed
+  merge N            combine the output of `build --shard i/N` shards into docs/
+  serve              serve docs/ (--watch rebuilds on change)
+  clean              delete docs/ and the build caches in .ssg/
+  bench [name]       run a benchmark (default: the standard suite)
+
+Run `ssg <command> --help` for the options of a command."""
+
+
+def run_build(argv):
+    from main import main
+    return main(argv)
+
+
+def run_merge(argv):
+    from shard import main
+    return main(argv)
+
+
+def run_serve(argv):
+    from serve import main
+    return main(argv)
+
+
+def run_bench(argv):
+    from bench import main
+    return main(argv)
+
+
+def run_clean(argv):
+    import argparse
+    import shutil
+
+    parser = argparse.ArgumentParser(prog="ssg clean", description="Delete the built site and the build caches")
+    parser.add_argument("--keep-cache", action="store_true", help="only delete docs/, keep .ssg/")
+    args = parser.parse_args(argv)
+    for path in ["docs"] + ([] if args.keep_cache else [".ssg"]):
+        if os.path.exists(path):
+            shutil.rmtree(path)
+            print(f"removed {path}/")
+
+
+COMMANDS = {
+    "build": run_build,
+    "merge": run_merge,
+    "serve": run_serve,
+    "clean": run_clean,
+    "bench": run_bench,
+}
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    if not argv or argv[0] in ("-h", "--help"):
+        print(USAGE)
+        return 0
+    command = COMMANDS.get(argv[0])
+    if command is None:
+        print(f"ssg: unknown command {argv[0]!r}\n\n{USAGE}", file=sys.stderr)
+        return 2
+    return command(argv[1:])
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,118 @@
+import gzip
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+try:
+    import brotli
+except ImportError:
+    # Optional: without it only .gz siblings are written
+    brotli = None
+
+logger = logging.getLogger(__name__)
+
+# Text formats worth compressing; images are compressed already
+COMPRESS_EXTENSIONS = (".html", ".css", ".js", ".json", ".svg", ".xml", ".txt")
+GZIP_LEVEL = 9
+BROTLI_QUALITY = 11
+SUFFIXES = (".gz", ".br")
+
+
+def encodings():
+    # (suffix, compress function) for every encoding available here
+    result = [(".gz", lambda data: gzip.compress(data, GZIP_LEVEL, mtime=0))]
+    if brotli is not None:
+        result.append((".br", lambda data: brotli.compress(data, quality=BROTLI_QUALITY)))
+    return result
+
+
+def is_compressed(path):
+    # True for the siblings precompress writes ("index.html.gz")
+    base, suffix = os.path.splitext(path)
+    return suffix in SUFFIXES and base.endswith(COMPRESS_EXTENSIONS)
+
+
+def is_current(path, sibling):
+    # A sibling carries the mtime of the file it was made from, so an
+    # output write_atomically left alone keeps its compressed copies too
+    try:
+        return os.stat(sibling).st_mtime_ns == os.stat(path).st_mtime_ns
+    except FileNotFoundError:
+        return False
+
+
+def compress_file(path, suffixes):
+    # Writes the requested siblings of path; the file is read once for all of them
+    with open(path, 'rb') as f:
+        data = f.read()
+    st = os.stat(path)
+    for suffix, compress in encodings():
+        if suffix not in suffixes:
+            continue
+        sibling = path + suffix
+        tmp_path = sibling + ".tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(compress(data))
+        os.utime(tmp_path, ns=(st.st_atime_ns, st.st_mtime_ns))
+        os.replace(tmp_path, sibling)
+    return path
+
+
+def precompress(dest_dir, workers=8, changes=None):
+    """
+    Writes a .gz (and, with the brotli module installed, a .br) sibling next
+    to every text file in dest_dir, the way hosts with precompressed file
+    support (nginx gzip_static, most CDNs) expect them. Siblings that are
+    still current are kept, and siblings whose file is gone are removed.
+    Compression runs in a thread pool: zlib and brotli release the GIL.
+    Returns (compressed, unchanged, removed).
+    """
+    wanted = [suffix for suffix, _ in encodings()]
+    tasks = []
+    unchanged = 0
+    removed = 0
+    for dir_path, dir_names, file_names in os.walk(dest_dir):
+        dir_names.sort()
+        for name in sorted(file_names):
+            path = os.path.join(dir_path, name)
+            if name.endswith(COMPRESS_EXTENSIONS):
+                stale = [suffix for suffix in wanted if not is_current(path, path + suffix)]
+                if stale:
+                    tasks.append((path, stale))
+                else:
+                    unchanged += 1
+            elif is_compressed(name) and not os.path.exists(os.path.splitext(path)[0]):
+                logger.info("remove file dest=%s reason=source-deleted", path)
+                os.remove(path)
+                removed += 1
+                if changes is not None:
+                    changes.remove(path)
+
+    if workers > 1 and len(tasks) > 1:
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            list(pool.map(lambda task: compress_file(*task), tasks))
+    else:
+        for path, suffixes in tasks:
+            compress_file(path, suffixes)
+    if changes is not None:
+        for path, suffixes in tasks:
+            for suffix in suffixes:
+                changes.wrote(path + suffix)
+    logger.info("precompressed files=%d unchanged=%d removed=%d encodings=%s", len(tasks), unchanged, removed,
+                ",".join(suffix.lstrip(".") for suffix in wanted))
+    return len(tasks), unchanged, removed
+
+
+# True: the build writes compressed siblings, and sync_directory keeps them
+# (assets.is_stage_output). precompress itself runs once the pages are written.
+active = False
+
+
+def enable():
+    global active
+    active = True
+
+
+def disable():
+    global active
+    active = False
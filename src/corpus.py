@@ -0,0 +1,127 @@
+import argparse
+import os
+import random
+import sys
+
+# Relative weight of each block kind on a generated page
+DEFAULT_MIX = {
+    "paragraph": 6,
+    "heading": 1,
+    "list": 2,
+    "ordered": 1,
+    "quote": 1,
+    "code": 1,
+}
+
+WORDS = (
+    "the quick brown fox jumps over lazy dog elf ring hobbit wizard shire river mountain "
+    "road forest tower king sword song lore ancient journey fellowship council valley star"
+).split()
+
+TEMPLATE = (
+    "<!doctype html>\n<html>\n<head><title>{{ Title }}</title>"
+    '<link href="/index.css" rel="stylesheet" /></head>\n'
+    "<body><article>{{ Content }}</article></body>\n</html>\n"
+)
+
+
+def parse_mix(text):
+    # "paragraph=6,list=2" -> {"paragraph": 6, "list": 2}
+    mix = {}
+    for part in text.split(","):
+        kind, _, weight = part.partition("=")
+        kind = kind.strip()
+        if kind not in DEFAULT_MIX:
+            raise ValueError(f"Unknown block kind {kind!r}, choose from: {', '.join(DEFAULT_MIX)}")
+        mix[kind] = int(weight or 1)
+    return mix
+
+
+def make_paragraph(rng, words, link_rate=0.05, image_rate=0.005):
+    # A paragraph of `words` words sprinkled with bold, italic, code, links and images
+    parts = []
+    for _ in range(words):
+        word = rng.choice(WORDS)
+        roll = rng.random()
+        if roll < image_rate:
+            word = f"![{word}](/images/{rng.choice(WORDS)}.png)"
+        elif roll < image_rate + link_rate:
+            word = f"[{word}](/blog/{rng.choice(WORDS)})"
+        elif roll < 0.15:
+            word = f"**{word}**"
+        elif roll < 0.20:
+            word = f"_{word}_"
+        elif roll < 0.23:
+            word = f"`{word}`"
+        parts.append(word)
+    return " ".join(parts)
+
+
+def make_block(rng, kind, words, link_rate):
+    if kind == "heading":
+        return "#" * rng.randint(2, 6) + " " + " ".join(rng.choice(WORDS) for _ in range(4))
+    if kind == "list":
+        return "\n".join(f"- {make_paragraph(rng, 8, link_rate)}" for _ in range(rng.randint(3, 8)))
+    if kind == "ordered":
+        return "\n".join(f"{n}. {make_paragraph(rng, 8, link_rate)}" for n in range(1, rng.randint(3, 8) + 1))
+    if kind == "quote":
+        return "\n".join(f"> {make_paragraph(rng, 12, link_rate)}" for _ in range(rng.randint(1, 4)))
+    if kind == "code":
+        lines = [f"{rng.choice(WORDS)}({rng.choice(WORDS)}, {rng.choice(WORDS)})" for _ in range(rng.randint(3, 12))]
+        return "```\n" + "\n".join(lines) + "\n```"
+    return make_paragraph(rng, words, link_rate)
+
+
+def make_page(rng, blocks, mix=None, words=60, link_rate=0.05):
+    # A page with a title and `blocks` further blocks drawn from `mix`
+    mix = mix or DEFAULT_MIX
+    kinds = list(mix)
+    weights = [mix[kind] for kind in kinds]
+    parts = [f"# {rng.choice(WORDS).title()} {rng.randint(0, 10**6)}"]
+    for kind in rng.choices(kinds, weights, k=blocks):
+        parts.append(make_block(rng, kind, words, link_rate))
+    return "\n\n".join(parts) + "\n"
+
+
+def make_site(root, pages=100, blocks=40, mix=None, words=60, link_rate=0.05, seed=0):
+    """
+    Writes a deterministic site under root:
+    root/content/sectionN/pageM/index.md, root/static/index.css and root/template.html
+    The same arguments always produce byte-identical files.
+    Returns (content_dir, template_path).
+    """
+    rng = random.Random(seed)
+    content = os.path.join(root, "content")
+    for n in range(pages):
+        page_dir = os.path.join(content, f"section{n % 10}", f"page{n}")
+        os.makedirs(page_dir, exist_ok=True)
+        with open(os.path.join(page_dir, "index.md"), 'w') as f:
+            f.write(make_page(rng, blocks, mix, words, link_rate))
+
+    static = os.path.join(root, "static")
+    os.makedirs(static, exist_ok=True)
+    with open(os.path.join(static, "index.css"), 'w') as f:
+        f.write("body { font-family: serif; }\n")
+
+    template = os.path.join(root, "template.html")
+    with open(template, 'w') as f:
+        f.write(TEMPLATE)
+    return content, template
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Generate a deterministic synthetic markdown site")
+    parser.add_argument("root", help="directory to write content/, static/ and template.html into")
+    parser.add_argument("--pages", type=int, default=100)
+    parser.add_argument("--blocks", type=int, default=40, help="blocks per page, besides the title")
+    parser.add_argument("--words", type=int, default=60, help="words per paragraph")
+    parser.add_argument("--mix", type=parse_mix, default=None,
+                        help="block kind weights, e.g. paragraph=6,list=2,code=1")
+    parser.add_argument("--link-rate", type=float, default=0.05, help="fraction of words that are links")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(sys.argv[1:] if argv is None else argv)
+    make_site(args.root, args.pages, args.blocks, args.mix, args.words, args.link_rate, args.seed)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,117 @@
+import logging
+import os
+import posixpath
+from urllib.parse import urlsplit
+
+import stages
+
+logger = logging.getLogger(__name__)
+
+# Stages that shape the markup of a link or image from what they know about
+# its target: the image catalog (size and variants) and the fingerprinted names
+MARKUP_STAGES = ("images", "fingerprint")
+
+
+def reference_target(url, page_path):
+    """
+    Maps a url found in a page to the site path it points at ("images/x.png"),
+    relative to the site root. page_path is the page's own site path
+    ("blog/tom/index.html"), used for relative urls.
+    Returns None for external urls and same-page anchors.
+    """
+    parts = urlsplit(url)
+    if parts.scheme or parts.netloc or not parts.path:
+        return None
+    if parts.path.startswith("/"):
+        path = parts.path
+    else:
+        path = posixpath.join("/", posixpath.dirname(page_path), parts.path)
+    return posixpath.normpath(path).lstrip("/")
+
+
+def target_candidates(target):
+    # "/blog/tom" may be served from blog/tom, blog/tom/index.html or blog/tom.html
+    if target in ("", "."):
+        return ["index.html"]
+    return [target, posixpath.join(target, "index.html"), target + ".html"]
+
+
+def target_markup(target):
+    # What the markup stages that are on know about a site path; part of the
+    # signature of every asset a page references
+    return [stage.markup_key(target) for stage in map(stages.active, MARKUP_STAGES) if stage is not None]
+
+
+def markup_key(urls):
+    # target_markup of every root-relative url in urls, as a string for cache
+    # keys; the stages leave the markup of other urls alone
+    return repr([target_markup(reference_target(url, "")) for url in urls
+                 if url.startswith("/") and not url.startswith("//")])
+
+
+def site_path(path, dest_dir):
+    return os.path.relpath(path, dest_dir).replace(os.sep, "/")
+
+
+class DependencyGraph:
+    def __init__(self, dest_dir, template_path, page_dests=(), asset_dir=None):
+        """
+        Links every page to the inputs its html depends on: its markdown source,
+        the template and the files in dest_dir its links and images point at.
+        dest_dir - the output directory; static files are already synced into it
+        page_dests - destination paths of every page in this build, so links to
+                     pages that are about to be generated count as resolved
+        asset_dir - where to look for non-page files instead of dest_dir (a shard
+                    that does not copy static/ points this at static/ itself)
+        The per-page part lives in the manifest ("refs" and "assets"), which
+        keeps it across builds without a second file.
+        """
+        self.dest_dir = dest_dir
+        self.template_path = template_path
+        self.page_paths = {site_path(dest, dest_dir) for dest in page_dests}
+        self.asset_dir = dest_dir if asset_dir is None else asset_dir
+
+    def resolve(self, url, dest_path):
+        # Returns the site path url points at, "" for external urls, None if it is broken
+        target = reference_target(url, site_path(dest_path, self.dest_dir))
+        if target is None:
+            return ""
+        for candidate in target_candidates(target):
+            if candidate in self.page_paths or os.path.isfile(os.path.join(self.asset_dir, candidate)):
+                return candidate
+        return None
+
+    def asset_signature(self, path):
+        # Size and mtime of an asset (sync_directory carries mtimes over from
+        # static/), then what the stages put into the markup pointing at it
+        try:
+            st = os.stat(os.path.join(self.asset_dir, path))
+        except FileNotFoundError:
+            return None
+        return [st.st_size, st.st_mtime_ns] + target_markup(path)
+
+    def assets_for(self, refs, dest_path):
+        # {site path: signature} for the referenced files that are not pages
+        assets = {}
+        for url in refs:
+            target = self.resolve(url, dest_path)
+            if target and target not in self.page_paths:
+                assets[target] = self.asset_signature(target)
+        return assets
+
+    def assets_changed(self, entry):
+        # True if any asset recorded for a manifest entry differs from the file on disk now
+        return any(self.asset_signature(path) != signature for path, signature in entry.get("assets", {}).items())
+
+    def dependents(self, manifest, asset_path):
+        # Sources of the pages that reference asset_path (a site path)
+        return sorted(src for src, entry in manifest.pages.items() if asset_path in entry.get("assets", {}))
+
+    def broken_references(self, manifest):
+        # (source, url) for every internal link or image that points nowhere
+        broken = []
+        for src_path, entry in sorted(manifest.pages.items()):
+            for url in entry.get("refs", ()):
+                if self.resolve(url, entry["dest"]) is None:
+                    broken.append((src_path, url))
+        return broken
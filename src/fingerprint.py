@@ -0,0 +1,123 @@
+import logging
+import os
+import posixpath
+import re
+from urllib.parse import urlsplit
+
+from manifest import file_hash
+
+logger = logging.getLogger(__name__)
+
+# Assets that get a copy named after their content, which a host can serve
+# with a far-future cache lifetime. Images keep their plain names: stylesheets
+# refer to them with url(), which nothing rewrites.
+FINGERPRINT_EXTENSIONS = (".css", ".js")
+HASH_LENGTH = 10
+# "index.3f2a9c1b7d.css"
+FINGERPRINTED_PATTERN = re.compile(r'\.[0-9a-f]{%d}\.(?:css|js)$' % HASH_LENGTH)
+# Root-relative href and src attributes in the template
+ATTRIBUTE_PATTERN = re.compile(r'((?:href|src)=")(/[^"/][^"]*)"')
+
+
+def fingerprinted_name(path, digest):
+    stem, ext = posixpath.splitext(path)
+    return f"{stem}.{digest[:HASH_LENGTH]}{ext}"
+
+
+def is_fingerprinted(path):
+    return FINGERPRINTED_PATTERN.search(path) is not None
+
+
+class AssetMap:
+    def __init__(self, names=None):
+        """
+        Maps the site path of every fingerprinted asset ("index.css") to the
+        name of its content-addressed copy ("index.3f2a9c1b7d.css"). The plain
+        file stays in place, so links nothing rewrites keep working.
+        """
+        self.names = names if names is not None else {}
+
+    @classmethod
+    def scan(cls, static_dir):
+        names = {}
+        for dir_path, dir_names, file_names in os.walk(static_dir):
+            dir_names.sort()
+            for name in sorted(file_names):
+                if name.endswith(FINGERPRINT_EXTENSIONS) and not is_fingerprinted(name):
+                    path = os.path.join(dir_path, name)
+                    site = os.path.relpath(path, static_dir).replace(os.sep, "/")
+                    names[site] = fingerprinted_name(site, file_hash(path))
+        return cls(names)
+
+    def publish(self, static_dir, dest_dir, changes=None):
+        """
+        Copies every asset to its fingerprinted name in dest_dir and removes
+        fingerprinted copies whose content is gone. Returns (copied, removed).
+        """
+        from assets import copy_file, needs_copy
+
+        copied = 0
+        for site, name in sorted(self.names.items()):
+            src_path = os.path.join(static_dir, site)
+            dest_path = os.path.join(dest_dir, name)
+            if needs_copy(src_path, dest_path):
+                os.makedirs(os.path.dirname(dest_path), exist_ok=True)
+                copy_file(src_path, dest_path)
+                copied += 1
+                if changes is not None:
+                    changes.wrote(dest_path)
+
+        wanted = set(self.names.values())
+        removed = 0
+        for dir_path, _, file_names in os.walk(dest_dir):
+            for file_name in file_names:
+                dest_path = os.path.join(dir_path, file_name)
+                site = os.path.relpath(dest_path, dest_dir).replace(os.sep, "/")
+                if is_fingerprinted(site) and site not in wanted \
+                        and not os.path.exists(os.path.join(static_dir, site)):
+                    logger.info("remove file dest=%s reason=stale-fingerprint", dest_path)
+                    os.remove(dest_path)
+                    removed += 1
+                    if changes is not None:
+                        changes.remove(dest_path)
+        logger.info("fingerprinted assets=%d copied=%d removed=%d", len(self.names), copied, removed)
+        return copied, removed
+
+    def rewrite(self, url):
+        # A root-relative url with the asset's fingerprinted name; anything else comes back as it is
+        if not url.startswith("/") or url.startswith("//"):
+            return url
+        parts = urlsplit(url)
+        name = self.names.get(parts.path[1:])
+        if name is None:
+            return url
+        return "/" + name + url[len(parts.path):]
+
+    def rewrite_attributes(self, html):
+        return ATTRIBUTE_PATTERN.sub(lambda match: f'{match.group(1)}{self.rewrite(match.group(2))}"', html)
+
+    def markup_key(self, site):
+        # The fingerprinted name links to site are rewritten to, or None
+        return self.names.get(site)
+
+    def template_key(self, text):
+        # The urls the href and src attributes of a template come out with
+        return " ".join(self.rewrite(url) for _, url in ATTRIBUTE_PATTERN.findall(text))
+
+    def __repr__(self):
+        return f"AssetMap(assets={len(self.names)})"
+
+
+# The map urls are rewritten through; None (the default) means no fingerprinting
+active = None
+
+
+def enable(static_dir):
+    global active
+    active = AssetMap.scan(static_dir)
+    return active
+
+
+def disable():
+    global active
+    active = None
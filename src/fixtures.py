@@ -0,0 +1,31 @@
+import os
+import tempfile
+import unittest
+
+
+def write(path, text):
+    # Writes text (or bytes) exactly as given, creating missing directories; returns path
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    if isinstance(text, bytes):
+        with open(path, 'wb') as f:
+            f.write(text)
+    else:
+        with open(path, 'w', newline="") as f:
+            f.write(text)
+    return path
+
+
+class TempDirTestCase(unittest.TestCase):
+    """
+    Gives every test a fresh temporary directory, self.root, which is removed
+    once the test is done. Subclasses that set up more call super().setUp() first.
+    """
+
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.root = tmp.name
+
+    def write(self, path, text):
+        # write() with relative paths taken from self.root
+        return write(os.path.join(self.root, path), text)
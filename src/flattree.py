@@ -0,0 +1,134 @@
+import sys
+from array import array
+
+import stages
+from htmlnode import ParentNode
+
+LEAF = 0
+PARENT = 1
+
+
+class FlatTree:
+    def __init__(self):
+        """
+        A node tree stored as parallel arrays instead of one object per node.
+        Node i is described by:
+        kinds[i] - LEAF or PARENT
+        tag_ids[i] - index into tags (0 is reserved for "no tag")
+        values[i] - the text of a leaf node, None for parents
+        props[i] - the attribute dictionary, usually None
+        first_child[i], child_count[i] - the range of node ids holding its children
+        Nodes are laid out breadth first, so every node's children are contiguous.
+        """
+        self.tags = [None]
+        self.tag_index = {None: 0}
+        self.kinds = array('B')
+        self.tag_ids = array('H')
+        self.values = []
+        self.props = []
+        self.first_child = array('I')
+        self.child_count = array('I')
+
+    def _tag_id(self, tag):
+        tag_id = self.tag_index.get(tag)
+        if tag_id is None:
+            tag_id = len(self.tags)
+            self.tags.append(sys.intern(tag))
+            self.tag_index[tag] = tag_id
+        return tag_id
+
+    def _append(self, node):
+        is_parent = isinstance(node, ParentNode)
+        self.kinds.append(PARENT if is_parent else LEAF)
+        self.tag_ids.append(self._tag_id(node.tag))
+        self.values.append(None if is_parent else node.value)
+        self.props.append(node.props or None)
+        self.first_child.append(0)
+        self.child_count.append(0)
+
+    @classmethod
+    def from_node(cls, root):
+        tree = cls()
+        tree._append(root)
+        queue = [root]
+        node_id = 0
+        # queue[node_id] is the node whose children get appended next
+        while node_id < len(queue):
+            node = queue[node_id]
+            if isinstance(node, ParentNode):
+                if node.children is None:
+                    raise ValueError("Parent nodes must have children")
+                tree.first_child[node_id] = len(queue)
+                tree.child_count[node_id] = len(node.children)
+                for child in node.children:
+                    tree._append(child)
+                    queue.append(child)
+            node_id += 1
+        return tree
+
+    def __len__(self):
+        return len(self.kinds)
+
+    def _props_to_html(self, node_id):
+        props = self.props[node_id]
+        if not props:
+            return ""
+        return "".join([f' {k}="{v}"' for k, v in props.items()])
+
+    def iter_html(self, node_id=0):
+        # Same output as iter_html() on the object tree, walking the arrays
+        kinds = self.kinds
+        tags = self.tags
+        tag_ids = self.tag_ids
+        first_child = self.first_child
+        child_count = self.child_count
+
+        if kinds[node_id] == LEAF:
+            yield self._leaf_html(node_id)
+            return
+        if tags[tag_ids[node_id]] is None:
+            raise ValueError("Parent nodes must have a tag")
+        minify = stages.module("minify")
+        minifying = minify is not None and minify.active
+        verbatim = 1 if minifying and tags[tag_ids[node_id]] in minify.VERBATIM_TAGS else 0
+        yield f"<{tags[tag_ids[node_id]]}{self._props_to_html(node_id)}>"
+
+        # Each stack entry is (parent, next child to emit, end of its child range)
+        start = first_child[node_id]
+        stack = [(node_id, start, start + child_count[node_id])]
+        while stack:
+            parent, child, end = stack.pop()
+            while child < end:
+                if kinds[child] == PARENT:
+                    tag = tags[tag_ids[child]]
+                    if tag is None:
+                        raise ValueError("Parent nodes must have a tag")
+                    yield f"<{tag}{self._props_to_html(child)}>"
+                    if minifying and tag in minify.VERBATIM_TAGS:
+                        verbatim += 1
+                    stack.append((parent, child + 1, end))
+                    parent = child
+                    child = first_child[parent]
+                    end = child + child_count[parent]
+                    continue
+                yield self._leaf_html(child)
+                child += 1
+            tag = tags[tag_ids[parent]]
+            if minifying and tag in minify.VERBATIM_TAGS:
+                verbatim -= 1
+            yield f"</{tag}>" if minifying and not verbatim else f"</{tag}>\n"
+
+    def _leaf_html(self, node_id):
+        value = self.values[node_id]
+        tag = self.tags[self.tag_ids[node_id]]
+        if value is None:
+            raise ValueError(f"Leaf nodes must have a value. tag: {tag}, props: {self.props[node_id]}")
+        if tag is None:
+            return value
+        return f"<{tag}{self._props_to_html(node_id)}>{value}</{tag}>"
+
+    def to_html(self):
+        return "".join(self.iter_html())
+
+    def __repr__(self):
+        return f"FlatTree(nodes={len(self)}, tags={self.tags[1:]})"
@@ -0,0 +1,124 @@
+import logging
+import os
+import pickle
+from collections import OrderedDict
+
+from manifest import GENERATOR_VERSION
+
+logger = logging.getLogger(__name__)
+
+FRAGMENT_CACHE_PATH = os.path.join(".ssg", "fragments.pickle")
+DEFAULT_MAX_BYTES = 32 * 1024 * 1024
+
+
+def entry_size(key, html):
+    # Rough size of an entry: the block text it is keyed by plus the html
+    return len(key[1]) + len(html)
+
+
+class FragmentCache:
+    def __init__(self, max_bytes=DEFAULT_MAX_BYTES, path=None, lazy=False):
+        """
+        Maps (block type, block text, base path) to the block's rendered html,
+        so text repeated across pages (footers, callouts, link lists) is only
+        tokenized once. The least recently used entries are evicted once the
+        cached text and html add up to more than max_bytes characters.
+        path - where load()/save() keep the cache between builds (None: memory only)
+        lazy - defer reading path until the first lookup, so builds that render
+               nothing never pay for loading the cache
+        """
+        self.max_bytes = max_bytes
+        self.path = path
+        self.pending_load = lazy
+        self.entries = OrderedDict()
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key):
+        if self.pending_load:
+            self._load_entries()
+        html = self.entries.get(key)
+        if html is None:
+            self.misses += 1
+            return None
+        self.entries.move_to_end(key)
+        self.hits += 1
+        return html
+
+    def put(self, key, html):
+        if self.pending_load:
+            self._load_entries()
+        size = entry_size(key, html)
+        if size > self.max_bytes:
+            return
+        old = self.entries.pop(key, None)
+        if old is not None:
+            self.size -= entry_size(key, old)
+        self.entries[key] = html
+        self.size += size
+        while self.size > self.max_bytes:
+            old_key, old_html = self.entries.popitem(last=False)
+            self.size -= entry_size(old_key, old_html)
+            self.evictions += 1
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "entries": len(self.entries),
+            "bytes": self.size,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+        }
+
+    @classmethod
+    def load(cls, path=FRAGMENT_CACHE_PATH, max_bytes=DEFAULT_MAX_BYTES):
+        cache = cls(max_bytes, path)
+        cache._load_entries()
+        return cache
+
+    def _load_entries(self):
+        self.pending_load = False
+        try:
+            with open(self.path, 'rb') as f:
+                version, entries = pickle.load(f)
+        except (FileNotFoundError, EOFError, ValueError, pickle.UnpicklingError):
+            # A missing or corrupt cache only costs a cold build
+            return
+        if version != GENERATOR_VERSION:
+            return
+        for key, html in entries:
+            self.put(key, html)
+
+    def save(self):
+        # Nothing to write if the cache was never loaded, let alone changed
+        if self.path is None or self.pending_load:
+            return
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        # Unique per process so concurrent shard builds never share a temporary file
+        tmp_path = f"{self.path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'wb') as f:
+            # Oldest first, so loading replays the same recency order
+            pickle.dump((GENERATOR_VERSION, list(self.entries.items())), f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, self.path)
+
+    def __repr__(self):
+        return f"FragmentCache(entries={len(self.entries)}, bytes={self.size}, hits={self.hits}, misses={self.misses})"
+
+
+# The cache parse_markdown consults; None (the default) means no caching
+active = None
+
+
+def enable(max_bytes=DEFAULT_MAX_BYTES, path=None):
+    global active
+    active = FragmentCache(max_bytes, path, lazy=path is not None)
+    return active
+
+
+def disable():
+    global active
+    active = None
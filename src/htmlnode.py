@@ -1,7 +1,12 @@
 from textnode import TextNode, TextType, split_nodes_delimiter
 import re
+import stages
+import sys
 
 class HTMLNode:
+    # Pages create tens of thousands of nodes; slots keep each one free of a __dict__
+    __slots__ = ("tag", "value", "children", "props")
+
     def __init__(self, tag=None, value=None, children=None, props=None):
         """
         inputs:
@@ -11,7 +16,7 @@ class HTMLNode:
         props - A dictionary of key-value pairs representing the attributes of the HTML tag. 
                 For example, a link (<a> tag) might have {"href": "https://www.google.com"}
         """
-        self.tag = tag
+        self.tag = sys.intern(tag) if isinstance(tag, str) else tag
         self.value = value
         self.children = children
         self.props = props 
@@ -20,11 +25,14 @@ class HTMLNode:
         raise NotImplementedError("to be implemented by child classes")
 
     def props_to_html(self):
-        result = ""
         if isinstance(self.props, dict):
-            for k,v in self.props.items():
-                result += f' {k}="{v}"'
-        return result 
+            return "".join([f' {k}="{v}"' for k, v in self.props.items()])
+        return ""
+
+    def write_html(self, sink):
+        # Streams the html into any object with a write() method (file, StringIO, ...),
+        # a few hundred chunks at a time so the sink sees fewer, larger writes
+        write_chunks(sink, iter_html(self))
 
     def __repr__(self):
         result = []
@@ -56,6 +64,8 @@ class HTMLNode:
 
     
 class LeafNode(HTMLNode):
+    __slots__ = ()
+
     def __init__(self, tag, value, props=None):
         super().__init__(tag=tag, value=value, children=None, props=props)
 
@@ -91,6 +101,8 @@ class LeafNode(HTMLNode):
 
 
 class ParentNode(HTMLNode):
+    __slots__ = ()
+
     def __init__(self, tag, children, props=None):
         super().__init__(tag=tag, value=None, children=children, props=props)
 
@@ -100,7 +112,7 @@ class ParentNode(HTMLNode):
         if self.tag is None:
             raise ValueError("Parent nodes must have a tag")
 
-        return f"<{self.tag}{self.props_to_html()}>{''.join([child.to_html() for child in self.children])}</{self.tag}>\n"
+        return "".join(iter_html(self))
 
     def __repr__(self):
         result = []
@@ -126,7 +138,69 @@ class ParentNode(HTMLNode):
         return f"ParentNode({', '.join(result)})"
 
 
-def text_node_to_html_node(text_node):
+def _open_tag(node):
+    if node.children is None:
+        raise ValueError("Parent nodes must have children")
+    if node.tag is None:
+        raise ValueError("Parent nodes must have a tag")
+    return f"<{node.tag}{node.props_to_html()}>"
+
+
+def iter_html(node):
+    # Yields the html of a node tree chunk by chunk. The walk keeps its own
+    # stack of child iterators instead of recursing, so children are never
+    # concatenated into intermediate strings and deep trees can't hit the
+    # recursion limit.
+    if not isinstance(node, ParentNode):
+        yield node.to_html()
+        return
+    # Every closing tag is followed by a newline, unless minify is on; inside
+    # <pre> and the like (verbatim, the number of open ones) it is content and stays
+    minify = stages.module("minify")
+    minifying = minify is not None and minify.active
+    verbatim = 1 if minifying and node.tag in minify.VERBATIM_TAGS else 0
+    yield _open_tag(node)
+    stack = [(node, iter(node.children))]
+    while stack:
+        parent, children = stack[-1]
+        for child in children:
+            if isinstance(child, ParentNode):
+                yield _open_tag(child)
+                stack.append((child, iter(child.children)))
+                if minifying and child.tag in minify.VERBATIM_TAGS:
+                    verbatim += 1
+                break
+            yield child.to_html()
+        else:
+            stack.pop()
+            if minifying and parent.tag in minify.VERBATIM_TAGS:
+                verbatim -= 1
+            yield f"</{parent.tag}>" if minifying and not verbatim else f"</{parent.tag}>\n"
+
+
+def write_chunks(sink, chunks, batch=512):
+    buffer = []
+    for chunk in chunks:
+        buffer.append(chunk)
+        if len(buffer) >= batch:
+            sink.write("".join(buffer))
+            buffer.clear()
+    if buffer:
+        sink.write("".join(buffer))
+
+
+def resolve_url(url, base_path="/"):
+    # Root-relative urls ("/images/x.png") are served from under the base path;
+    # assets with a fingerprinted copy are linked by that name
+    asset_map = stages.active("fingerprint")
+    if asset_map is not None:
+        url = asset_map.rewrite(url)
+    if base_path != "/" and url and url.startswith("/") and not url.startswith("//"):
+        return base_path + url[1:]
+    return url
+
+
+def text_node_to_html_node(text_node, base_path="/"):
     if text_node.text_type == TextType.BOLD:
         return LeafNode("b", text_node.text)
     elif text_node.text_type == TextType.ITALIC:
@@ -136,89 +210,159 @@ def text_node_to_html_node(text_node):
     elif text_node.text_type == TextType.CODE:
         return LeafNode("code", text_node.text)
     elif text_node.text_type == TextType.LINK:
-        return LeafNode("a", text_node.text, props={"href": text_node.url})
+        return LeafNode("a", text_node.text, props={"href": resolve_url(text_node.url, base_path)})
     elif text_node.text_type == TextType.IMAGE:
-        return LeafNode("img", text_node.text, props={"src": text_node.url})
+        return LeafNode("img", text_node.text, props=image_props(text_node.url, base_path))
     else:
         raise ValueError(f"Unsupported text type: {text_node.text_type}")
 
 
+def image_props(url, base_path="/"):
+    # src, plus the size, resized variants and lazy loading of images the
+    # image catalog (images.active) knows, so the browser can lay the page out
+    # before the image arrives and download no more pixels than it shows
+    props = {"src": resolve_url(url, base_path)}
+    catalog = stages.active("images")
+    found = catalog.lookup(url) if catalog is not None else None
+    if found is None:
+        return props
+    path, image = found
+    props["width"] = str(image["width"])
+    props["height"] = str(image["height"])
+    if image["variants"]:
+        variant_path = stages.module("images").variant_path
+        candidates = [f'{resolve_url("/" + variant_path(path, width), base_path)} {width}w'
+                      for width, _ in image["variants"]]
+        candidates.append(f'{props["src"]} {image["width"]}w')
+        props["srcset"] = ", ".join(candidates)
+    props["loading"] = "lazy"
+    return props
+
+
+# Links and images in one pattern: group 1 is "!" for an image, group 2 the
+# link text or alt text, group 3 the url. The text may hold balanced brackets
+# one level deep ("[see [1]](/notes)"), but not a link of its own: in
+# "[see [notes](/notes)](/x)" only the inner link is one.
+BRACKETED_TEXT = r'[^\[\]\n]*(?:\[[^\[\]\n]*\](?!\()[^\[\]\n]*)*'
+MARKDOWN_LINK_OR_IMAGE_PATTERN = re.compile(r'(!?)\[(' + BRACKETED_TEXT + r')\]\(([^)\n]*)\)')
+# The same spans with only the url captured, so findall returns the urls
+# themselves instead of tuples to pick them out of. An image's url is found
+# from its bracket, without the "!".
+MARKDOWN_URL_PATTERN = re.compile(r'\[' + BRACKETED_TEXT + r'\]\(([^)\n]*)\)')
+
 def extract_markdown_images(text):
     # This function extracts markdown image syntax ![alt text](image_url) from the input text
     # and returns a list of tuples (alt_text, image_url)
     
-    pattern = r'!\[(.*?)\]\((.*?)\)'
-    matches = re.findall(pattern, text)
-    return matches
+    return [(alt_text, url) for bang, alt_text, url in MARKDOWN_LINK_OR_IMAGE_PATTERN.findall(text) if bang]
 
 def extract_markdown_links(text):
     # This function extracts markdown link syntax [link text](url) from the input text
     # and returns a list of tuples (link_text, url)
     
-    pattern = r'\[(.*?)\]\((.*?)\)'
-    matches = re.findall(pattern, text)
-    return matches
+    return [(link_text, url) for bang, link_text, url in MARKDOWN_LINK_OR_IMAGE_PATTERN.findall(text) if not bang]
+
+def extract_markdown_urls(text):
+    # The urls of every link and image in the text, in order
+    return MARKDOWN_URL_PATTERN.findall(text)
 
 def split_nodes_image(old_nodes):
-    new_nodes = []
-    for node in old_nodes:
-        if node.text_type == TextType.TEXT:
-            matches = extract_markdown_images(node.text)
-            if matches:
-                # If there are markdown images, we need to split the text node into multiple nodes
-                # For example, "This is an image ![alt text](image_url) in the text" would be split into:
-                # [TextNode("This is an image ", TextType.TEXT), TextNode(None, TextType.IMAGE, url="image_url"), TextNode(" in the text", TextType.TEXT)]
-                last_index = 0
-                for alt_text, image_url in matches:
-                    start_index = node.text.find(f"![{alt_text}]({image_url})", last_index)
-                    if start_index != -1:
-                        # Add the text before the image as a separate node
-                        if start_index > last_index:
-                            new_nodes.append(TextNode(node.text[last_index:start_index], TextType.TEXT))
-                        # Add the image as a separate node
-                        new_nodes.append(TextNode(alt_text, TextType.IMAGE, url=image_url))
-                        last_index = start_index + len(f"![{alt_text}]({image_url})")
-                # Add any remaining text after the last image as a separate node
-                if last_index < len(node.text):
-                    new_nodes.append(TextNode(node.text[last_index:], TextType.TEXT))
-            else:
-                new_nodes.append(node)
-        else:
-            new_nodes.append(node)
-    return new_nodes
+    return _split_nodes_links_or_images(old_nodes, TextType.IMAGE)
 
 def split_nodes_link(old_nodes):
+    return _split_nodes_links_or_images(old_nodes, TextType.LINK)
+
+def _split_nodes_links_or_images(old_nodes, text_type):
+    # Splits text nodes around their images (or links). Candidates are found
+    # by their opening bracket and the link-or-image pattern is matched right
+    # there, so text is cut at the spans the scanner returned and nothing is
+    # searched for twice. The bound methods are looked up once: this loop runs
+    # for every link on a page
+    image = text_type == TextType.IMAGE
+    opening = "![" if image else "["
+    match_at = MARKDOWN_LINK_OR_IMAGE_PATTERN.match
     new_nodes = []
+    append = new_nodes.append
     for node in old_nodes:
-        if node.text_type == TextType.TEXT:
-            matches = extract_markdown_links(node.text)
-            if matches:
-                last_index = 0
-                for link_text, url in matches:
-                    start_index = node.text.find(f"[{link_text}]({url})", last_index)
-                    if start_index != -1:
-                        # Add the text before the link as a separate node
-                        if start_index > last_index:
-                            new_nodes.append(TextNode(node.text[last_index:start_index], TextType.TEXT))
-                        # Add the link as a separate node
-                        new_nodes.append(TextNode(link_text, TextType.LINK, url=url))
-                        last_index = start_index + len(f"[{link_text}]({url})")
-                # Add any remaining text after the last link as a separate node
-                if last_index < len(node.text):
-                    new_nodes.append(TextNode(node.text[last_index:], TextType.TEXT))
-            else:
-                new_nodes.append(node)
-        else:
-            new_nodes.append(node)
+        if node.text_type != TextType.TEXT:
+            append(node)
+            continue
+        text = node.text
+        find = text.find
+        last_index = 0
+        start_index = find(opening)
+        while start_index != -1:
+            if not image and start_index > 0 and text[start_index - 1] == "!":
+                # The bracket of an image, which stays text here
+                match = match_at(text, start_index - 1)
+                start_index = find(opening, match.end() if match else start_index + 1)
+                continue
+            match = match_at(text, start_index)
+            if match is None:
+                start_index = find(opening, start_index + 1)
+                continue
+            # Add the text before the image or link as a separate node
+            if start_index > last_index:
+                append(TextNode(text[last_index:start_index], TextType.TEXT))
+            label, url = match.group(2, 3)
+            append(TextNode(label, text_type, url=url))
+            last_index = match.end()
+            start_index = find(opening, last_index)
+        if last_index == 0:
+            append(node)
+        elif last_index < len(text):
+            # Add any remaining text after the last one as a separate node
+            append(TextNode(text[last_index:], TextType.TEXT))
     return new_nodes
 
+# Inline markup recognised by text_to_textnodes. Bold is listed before the
+# single-character delimiters so "**" is never read as two empty italics.
+INLINE_DELIMITERS = {
+    "**": TextType.BOLD,
+    "_": TextType.ITALIC,
+    "`": TextType.CODE,
+}
+INLINE_TOKEN_PATTERN = re.compile(r'\*\*|[_`]|!?\[')
+
 def text_to_textnodes(text):
-    nodes = [TextNode(text, TextType.TEXT)]
-    nodes = split_nodes_delimiter(nodes, "**", TextType.BOLD)
-    nodes = split_nodes_delimiter(nodes, "_", TextType.ITALIC)
-    nodes = split_nodes_delimiter(nodes, "`", TextType.CODE)
-    nodes = split_nodes_image(nodes)
-    nodes = split_nodes_link(nodes)
+    # Tokenizes bold, italic, code, images and links in a single left-to-right scan.
+    # Whatever sits inside a span is taken literally, so `a_b` stays code and
+    # [a_b](/x_y) stays a link instead of being torn apart by the italic rule.
+    # Spans do not nest: TextNodes are flat, so "_a **b** c_" is one italic
+    # node whose text keeps the asterisks ("<i>a **b** c</i>").
+    nodes = []
+    plain_start = 0
+    index = 0
+    while True:
+        token = INLINE_TOKEN_PATTERN.search(text, index)
+        if token is None:
+            break
+        start = token.start()
+        marker = token.group()
+
+        if marker in INLINE_DELIMITERS:
+            end = text.find(marker, token.end())
+            if end == -1:
+                raise ValueError(f"Unmatched delimiter '{marker}' in text: {text}")
+            if start > plain_start:
+                nodes.append(TextNode(text[plain_start:start], TextType.TEXT))
+            inner = text[token.end():end]
+            if inner:
+                nodes.append(TextNode(inner, INLINE_DELIMITERS[marker]))
+            index = plain_start = end + len(marker)
+            continue
+
+        match = MARKDOWN_LINK_OR_IMAGE_PATTERN.match(text, start)
+        if match is None:
+            # A lone bracket is just text
+            index = token.end()
+            continue
+        if start > plain_start:
+            nodes.append(TextNode(text[plain_start:start], TextType.TEXT))
+        text_type = TextType.IMAGE if match.group(1) else TextType.LINK
+        nodes.append(TextNode(match.group(2), text_type, url=match.group(3)))
+        index = plain_start = match.end()
+
+    if plain_start < len(text):
+        nodes.append(TextNode(text[plain_start:], TextType.TEXT))
     return nodes
-
-
@@ -0,0 +1,319 @@
+import functools
+import importlib.util
+import json
+import logging
+import os
+import posixpath
+import re
+import struct
+from urllib.parse import urlsplit
+
+import pngcodec
+from manifest import file_hash
+
+logger = logging.getLogger(__name__)
+
+IMAGES_DIR = os.path.join(".ssg", "images")
+CATALOG_PATH = os.path.join(IMAGES_DIR, "catalog.json")
+# Bump when the catalog's layout changes; older catalogs are rescanned
+CATALOG_FORMAT = 1
+IMAGE_EXTENSIONS = (".png", ".jpg", ".jpeg", ".gif")
+# Formats that get resized variants; GIFs would lose their animation
+VARIANT_EXTENSIONS = (".png", ".jpg", ".jpeg")
+# Widths of the resized variants; only those narrower than the image are made
+VARIANT_WIDTHS = (480, 960, 1440)
+JPEG_QUALITY = 82
+# "images/tom-480w.png" is the 480 pixel wide variant of "images/tom.png"
+VARIANT_PATTERN = re.compile(r'-\d+w\.(?:png|jpe?g)$')
+# JPEG start-of-frame markers, which carry the dimensions (C4, C8 and CC are other segments)
+SOF_MARKERS = set(range(0xC0, 0xD0)) - {0xC4, 0xC8, 0xCC}
+
+
+def image_size(path):
+    # (width, height) read from the file header, or None if the format isn't recognized
+    with open(path, 'rb') as f:
+        head = f.read(33)
+        if head[:8] == pngcodec.SIGNATURE:
+            return pngcodec.parse_header(head)[:2]
+        if head[:6] in (b"GIF87a", b"GIF89a"):
+            return struct.unpack("<HH", head[6:10])
+        if head[:2] == b"\xff\xd8":
+            f.seek(2)
+            return _jpeg_size(f)
+    return None
+
+
+def _jpeg_size(f):
+    # Walks the segments up to the first start-of-frame
+    while True:
+        marker = f.read(2)
+        if len(marker) < 2 or marker[0] != 0xFF:
+            return None
+        kind = marker[1]
+        if kind == 0xFF:
+            # Fill byte
+            f.seek(-1, os.SEEK_CUR)
+            continue
+        if kind in (0x01, 0xD8) or 0xD0 <= kind <= 0xD7:
+            continue
+        length = f.read(2)
+        if len(length) < 2:
+            return None
+        if kind in SOF_MARKERS:
+            frame = f.read(5)
+            if len(frame) < 5:
+                return None
+            height, width = struct.unpack(">HH", frame[1:5])
+            return width, height
+        f.seek(struct.unpack(">H", length)[0] - 2, os.SEEK_CUR)
+
+
+def pillow():
+    # Pillow's Image module, or None. Optional: without Pillow only PNGs
+    # pngcodec can decode get variants. Imported on first use, so builds that
+    # resize nothing never load it.
+    try:
+        from PIL import Image
+    except ImportError:
+        return None
+    return Image
+
+
+@functools.lru_cache(maxsize=None)
+def has_pillow():
+    # Whether Pillow is installed, without importing it
+    return importlib.util.find_spec("PIL") is not None
+
+
+def encoder():
+    # Names what makes the variants; part of their cache key
+    return "pillow" if has_pillow() else f"pngcodec{pngcodec.VERSION}"
+
+
+def can_resize(path):
+    ext = os.path.splitext(path)[1].lower()
+    if ext not in VARIANT_EXTENSIONS:
+        return False
+    if pillow() is not None:
+        return True
+    if ext != ".png":
+        return False
+    with open(path, 'rb') as f:
+        try:
+            return pngcodec.is_supported(pngcodec.read_header(f))
+        except ValueError:
+            return False
+
+
+def variant_path(path, width):
+    stem, ext = posixpath.splitext(path)
+    return f"{stem}-{width}w{ext}"
+
+
+def is_variant(path):
+    return VARIANT_PATTERN.search(path) is not None
+
+
+def variant_sizes(width, height):
+    return [[w, max(1, round(height * w / width))] for w in VARIANT_WIDTHS if w < width]
+
+
+def make_variants(src_path, sizes):
+    """
+    Writes the resized copies of src_path: sizes is a list of (width, height,
+    destination). The image is decoded once for all of them. Runs in worker
+    processes, so it only takes and returns plain values.
+    """
+    Image = pillow()
+    if Image is not None:
+        with Image.open(src_path) as image:
+            image.load()
+            for width, height, dest in sizes:
+                variant = image.resize((width, height), Image.LANCZOS)
+                options = {"quality": JPEG_QUALITY} if image.format == "JPEG" else {}
+                tmp_path = f"{dest}.{os.getpid()}.tmp"
+                variant.save(tmp_path, format=image.format, optimize=True, **options)
+                os.replace(tmp_path, dest)
+        return len(sizes)
+    width, height, channels, rows, colour_chunks = pngcodec.read(src_path)
+    for new_width, new_height, dest in sizes:
+        resized, resized_channels = pngcodec.drop_opaque_alpha(
+            pngcodec.resize(rows, width, height, channels, new_width, new_height), channels)
+        tmp_path = f"{dest}.{os.getpid()}.tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(pngcodec.encode(new_width, new_height, resized_channels, resized, colour_chunks))
+        os.replace(tmp_path, dest)
+    return len(sizes)
+
+
+def _make_variants(task):
+    return make_variants(*task)
+
+
+class ImageCatalog:
+    def __init__(self, path=CATALOG_PATH, images=None):
+        """
+        What the build knows about every image in static/, keyed by site path
+        ("images/tom.png"): {"size", "mtime", "hash", "width", "height",
+        "variants": [[width, height], ...]}. Size and mtime let a scan skip
+        files that haven't changed; the content hash keys the variant cache
+        (cache_dir), so an image is resized once however often it is renamed,
+        copied or rebuilt.
+        """
+        self.path = path
+        self.cache_dir = os.path.dirname(path) or "."
+        self.images = images if images is not None else {}
+
+    @classmethod
+    def load(cls, path=CATALOG_PATH):
+        try:
+            with open(path, 'r') as f:
+                data = json.load(f)
+        except (FileNotFoundError, ValueError):
+            return cls(path)
+        if data.get("format") != CATALOG_FORMAT or data.get("encoder") != encoder():
+            return cls(path)
+        return cls(path, images=data.get("images", {}))
+
+    def save(self):
+        os.makedirs(self.cache_dir, exist_ok=True)
+        # Unique per process: every shard of a sharded build scans static/
+        tmp_path = f"{self.path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump({"format": CATALOG_FORMAT, "encoder": encoder(), "images": self.images}, f, indent=2,
+                      sort_keys=True)
+        os.replace(tmp_path, self.path)
+
+    def scan(self, static_dir):
+        # Brings the catalog in line with the images in static_dir; returns how many were (re)measured
+        images = {}
+        measured = 0
+        for dir_path, dir_names, file_names in os.walk(static_dir):
+            dir_names.sort()
+            for name in sorted(file_names):
+                if not name.lower().endswith(IMAGE_EXTENSIONS):
+                    continue
+                path = os.path.join(dir_path, name)
+                site = os.path.relpath(path, static_dir).replace(os.sep, "/")
+                st = os.stat(path)
+                entry = self.images.get(site)
+                if entry is None or entry["size"] != st.st_size or entry["mtime"] != st.st_mtime_ns:
+                    entry = self._measure(path, st)
+                    measured += 1
+                if entry is not None:
+                    images[site] = entry
+        self.images = images
+        logger.info("images scanned=%d measured=%d", len(images), measured)
+        return measured
+
+    def _measure(self, path, st):
+        try:
+            size = image_size(path)
+        except (OSError, ValueError, struct.error):
+            size = None
+        if size is None:
+            logger.warning("unreadable image src=%s", path)
+            return None
+        width, height = size
+        return {
+            "size": st.st_size,
+            "mtime": st.st_mtime_ns,
+            "hash": file_hash(path),
+            "width": width,
+            "height": height,
+            "variants": variant_sizes(width, height) if can_resize(path) else [],
+        }
+
+    def cache_path(self, entry, width, site):
+        return os.path.join(self.cache_dir, f"{entry['hash']}-{encoder()}-{width}{posixpath.splitext(site)[1]}")
+
+    def publish(self, static_dir, dest_dir, workers=1, changes=None):
+        """
+        Puts every variant into dest_dir next to its image. Variants missing
+        from the cache are made first, one task per image, in a process pool
+        when workers > 1. Variants no image needs any more are removed from
+        dest_dir and the cache. Returns (made, copied, removed).
+        """
+        from assets import copy_file, needs_copy
+
+        tasks = []
+        wanted = {}
+        for site, entry in sorted(self.images.items()):
+            missing = []
+            for width, height in entry["variants"]:
+                cache_path = self.cache_path(entry, width, site)
+                # Identical images share their variants
+                if cache_path not in wanted.values() and not os.path.exists(cache_path):
+                    missing.append((width, height, cache_path))
+                wanted[variant_path(site, width)] = cache_path
+            if missing:
+                tasks.append((os.path.join(static_dir, site), missing))
+
+        os.makedirs(self.cache_dir, exist_ok=True)
+        if workers > 1 and len(tasks) > 1:
+            from concurrent.futures import ProcessPoolExecutor
+            with ProcessPoolExecutor(max_workers=min(workers, len(tasks))) as pool:
+                made = sum(pool.map(_make_variants, tasks))
+        else:
+            made = sum(make_variants(*task) for task in tasks)
+
+        copied = 0
+        for site, cache_path in sorted(wanted.items()):
+            dest_path = os.path.join(dest_dir, site)
+            if needs_copy(cache_path, dest_path):
+                os.makedirs(os.path.dirname(dest_path), exist_ok=True)
+                copy_file(cache_path, dest_path)
+                copied += 1
+                if changes is not None:
+                    changes.wrote(dest_path)
+
+        removed = 0
+        for dir_path, _, file_names in os.walk(dest_dir):
+            for name in file_names:
+                dest_path = os.path.join(dir_path, name)
+                site = os.path.relpath(dest_path, dest_dir).replace(os.sep, "/")
+                if is_variant(site) and site not in wanted \
+                        and not os.path.exists(os.path.join(static_dir, site)):
+                    logger.info("remove file dest=%s reason=unused-variant", dest_path)
+                    os.remove(dest_path)
+                    removed += 1
+                    if changes is not None:
+                        changes.remove(dest_path)
+        keep = {os.path.basename(path) for path in wanted.values()} | {os.path.basename(self.path)}
+        for name in os.listdir(self.cache_dir):
+            if name not in keep and not name.endswith(".tmp"):
+                os.remove(os.path.join(self.cache_dir, name))
+
+        logger.info("image variants made=%d copied=%d removed=%d encoder=%s", made, copied, removed, encoder())
+        return made, copied, removed
+
+    def lookup(self, url):
+        # The entry for a root-relative image url ("/images/tom.png"), or None
+        if not url.startswith("/") or url.startswith("//"):
+            return None
+        site = posixpath.normpath(urlsplit(url).path).lstrip("/")
+        entry = self.images.get(site)
+        return (site, entry) if entry is not None else None
+
+    def markup_key(self, site):
+        # What an <img> pointing at site gets from the catalog: its size and variants, or None
+        entry = self.images.get(site)
+        return [entry["width"], entry["height"], entry["variants"]] if entry is not None else None
+
+    def __repr__(self):
+        return f"ImageCatalog(path={self.path}, images={len(self.images)})"
+
+
+# The catalog image markup is taken from; None (the default) means plain <img src=...>
+active = None
+
+
+def enable(path=CATALOG_PATH):
+    global active
+    active = ImageCatalog.load(path)
+    return active
+
+
+def disable():
+    global active
+    active = None
@@ -1,37 +1,183 @@
-from textnode import TextNode, TextType
 import os
-import shutil
-from block import generate_page, generate_pages_recursive
+from build import collect_pages, generate_pages_recursive
+from manifest import Manifest, MANIFEST_PATH
+from assets import is_stage_output, sync_directory
+from publish import ChangeSet, CHANGES_PATH
+from shard import owns_static, parse_shard, shard_dir
 import sys 
+import argparse
+import logging
+import time
+import profiler
 
+logger = logging.getLogger(__name__)
 
-def copy_directory(src, dest):
-    # 1. If destination exists, remove it completely
-    if os.path.exists(dest):
-        print(f"Deleting existing destination: {dest}")
-        shutil.rmtree(dest)
+PROFILE_PATH = os.path.join(".ssg", "profile.json")
+LOG_FORMAT = "%(asctime)s level=%(levelname)s logger=%(name)s %(message)s"
 
-    # 2. Recreate empty destination directory
-    os.makedirs(dest, exist_ok=True)
 
-    # 3. Iterate through items in source directory
-    for item in os.listdir(src):
-        src_path = os.path.join(src, item)
-        dest_path = os.path.join(dest, item)
+def setup_logging(level):
+    logging.basicConfig(level=getattr(logging, level.upper()), format=LOG_FORMAT, stream=sys.stderr)
 
-        if os.path.isdir(src_path):
-            # Recursively copy subdirectory
-            copy_directory(src_path, dest_path)
-        else:
-            # Copy file
-            print(f"Copying file: {src_path} -> {dest_path}")
-            shutil.copy2(src_path, dest_path)
 
+def parse_args(argv):
+    parser = argparse.ArgumentParser(description="Build the static site from content/ into docs/")
+    parser.add_argument("basepath", nargs="?", default="/",
+                        help="path the site is served under, e.g. /static-site-generator/")
+    parser.add_argument("--jobs", "-j", type=int, default=1,
+                        help="number of worker processes used to render pages (0 = one per CPU)")
+    parser.add_argument("--clean", action="store_true",
+                        help="rebuild every page, compare static files by content and delete anything "
+                             "in docs/ the build did not produce (files that come out the same are left alone)")
+    parser.add_argument("--checksum", action="store_true",
+                        help="compare static files by content hash instead of size and mtime")
+    add_stage_args(parser)
+    parser.add_argument("--shard", type=parse_shard, metavar="I/N",
+                        help="render only shard I of N (numbered from 1) into .ssg/shards/I-of-N/; "
+                             "shard 1 also copies static/. Combine the shards with `ssg merge N`")
+    add_logging_args(parser)
+    parser.add_argument("--profile", nargs="?", const=PROFILE_PATH, default=None, metavar="PATH",
+                        help=f"record per-stage timings and write a JSON report (default {PROFILE_PATH})")
+    parser.add_argument("--top", type=int, default=10,
+                        help="number of slowest pages listed by --profile")
+    return parser.parse_args(argv)
+
+
+def add_stage_args(parser):
+    # The optional stages; ssg serve takes the same flags, so the pages it renders match the build's
+    # The cache sizes default to None, meaning the cache's own default, so
+    # parsing the flags imports no stage module
+    parser.add_argument("--cache-size", type=int, metavar="MB",
+                        help="size of the rendered block cache kept in .ssg/ between builds (0 disables it)")
+    parser.add_argument("--parse-cache-size", type=int, metavar="MB",
+                        help="size of the on-disk cache of parsed pages in .ssg/parse/ (0 disables it)")
+    parser.add_argument("--no-search", dest="search", action="store_false",
+                        help="don't build the search index in docs/search/")
+    parser.add_argument("--no-images", dest="images", action="store_false",
+                        help="copy images as they are: no resized variants, and <img> tags without "
+                             "width, height, srcset or loading")
+    parser.add_argument("--no-fingerprint", dest="fingerprint", action="store_false",
+                        help="don't copy stylesheets and scripts to content-hashed names or link pages to them")
+    parser.add_argument("--no-compress", dest="compress", action="store_false",
+                        help="don't write .gz (and, with brotli installed, .br) copies of html, css, js and json")
+    parser.add_argument("--minify", action="store_true",
+                        help="write pages without the whitespace between tags, the template's line breaks "
+                             "and comments; <pre> and <code> content is left as it is")
+
+
+def enable_stages(args, dest_dir, jobs=1, changes=None, fragments_dir=None, publish=True):
+    """
+    Turns on the optional stages args asks for: the image catalog and the asset
+    map (their variants and copies go into dest_dir when publish is set), minifying,
+    the parse and fragment caches, the search index and compressing. Builds and
+    the dev server both go through here, so a page rendered by either gets the
+    same build key. Running precompress is left to the caller: it runs once the
+    pages are written.
+    Each stage's module is imported here, when it is turned on (see stages.py),
+    and before static/ is synced, so sync_directory keeps the stages' files.
+    fragments_dir defaults to search.FRAGMENTS_DIR.
+    Returns (fragment cache, parse cache), either None when it is off.
+    """
+    if args.images:
+        import images
+        # Every shard needs the catalog for the <img> markup; the one that copies static/ also makes the variants
+        catalog = images.enable()
+        catalog.scan("static")
+        if publish:
+            catalog.publish("static", dest_dir, jobs, changes)
+        catalog.save()
+    if args.fingerprint:
+        import fingerprint
+        # Like the image catalog: every shard links to the fingerprinted names, one writes the copies
+        assets = fingerprint.enable("static")
+        if publish:
+            assets.publish("static", dest_dir, changes)
+    if args.minify:
+        import minify
+        minify.enable()
+    parse_cache = cache = None
+    if args.parse_cache_size is None or args.parse_cache_size > 0:
+        import parsecache
+        size = parsecache.DEFAULT_MAX_BYTES if args.parse_cache_size is None else args.parse_cache_size << 20
+        parse_cache = parsecache.enable(max_bytes=size)
+    if args.cache_size is None or args.cache_size > 0:
+        import fragcache
+        size = fragcache.DEFAULT_MAX_BYTES if args.cache_size is None else args.cache_size << 20
+        cache = fragcache.enable(size, fragcache.FRAGMENT_CACHE_PATH)
+    if args.search:
+        import search
+        search.enable(fragments_dir or search.FRAGMENTS_DIR)
+    if args.compress:
+        import compress
+        compress.enable()
+    return cache, parse_cache
+
+
+def add_logging_args(parser):
+    parser.add_argument("--log-level", default="info", choices=["debug", "info", "warning", "error"],
+                        help="only log messages at this level or above (debug lists every page and file)")
+
+
+def main(argv=None):
+    args = parse_args(sys.argv[1:] if argv is None else argv)
+    setup_logging(args.log_level)
+    jobs = args.jobs if args.jobs > 0 else os.cpu_count() or 1
+    prof = profiler.enable() if args.profile else profiler.active
+    start = time.perf_counter()
+
+    dest_dir, manifest_path, changes_path, asset_dir = "docs", MANIFEST_PATH, CHANGES_PATH, None
+    fragments_dir = None
+    if args.shard:
+        root = shard_dir(args.shard)
+        dest_dir = os.path.join(root, "docs")
+        manifest_path = os.path.join(root, "manifest.json")
+        changes_path = os.path.join(root, "changes.json")
+        fragments_dir = os.path.join(root, "search")
+        # Shards other than 1 do not copy static/ and resolve references against it directly
+        asset_dir = None if owns_static(args.shard) else "static"
+        os.makedirs(dest_dir, exist_ok=True)
+
+    changes = ChangeSet(dest_dir)
+    cache, parse_cache = enable_stages(args, dest_dir, jobs, changes, fragments_dir,
+                                       publish=not args.shard or owns_static(args.shard))
+    with prof.stage(profiler.IO):
+        if args.shard and not owns_static(args.shard):
+            logger.info("static files are copied by shard 1/%d", args.shard[1])
+        elif args.clean:
+            # docs/ stays in place (and servable) throughout; only what differs is replaced
+            page_dests = {os.path.relpath(dest_path, dest_dir) for _, dest_path in collect_pages("content", dest_dir)}
+            keep = lambda path: path in page_dests or is_stage_output(path)
+            sync_directory("static", dest_dir, checksum=True, keep=keep, changes=changes)
+        else:
+            sync_directory("static", dest_dir, checksum=args.checksum, changes=changes)
+    manifest = Manifest(manifest_path) if args.clean else Manifest.load(manifest_path)
+    rebuilt = 0
+    try:
+        rebuilt, _ = generate_pages_recursive("content", "template.html", dest_dir, args.basepath, manifest, jobs,
+                                              changes=changes, shard=args.shard, asset_dir=asset_dir)
+        if args.compress:
+            import compress
+            with prof.stage(profiler.IO):
+                compress.precompress(dest_dir, max(jobs, 2), changes)
+    finally:
+        changes.save(changes_path)
+        logger.info("published written=%d removed=%d changes=%s", len(changes.written), len(changes.removed),
+                    changes_path)
+        if cache is not None and not cache.pending_load:
+            # Blocks rendered (and parse cache lookups made) in worker
+            # processes stay in those workers
+            cache.save()
+            logger.info("fragment cache %s", " ".join(f"{k}={v:.2f}" if isinstance(v, float) else f"{k}={v}"
+                                                      for k, v in cache.stats().items()))
+        if parse_cache is not None and rebuilt:
+            logger.info("parse cache hits=%d misses=%d", parse_cache.hits, parse_cache.misses)
+            parse_cache.gc()
 
-def main():
-    basepath = sys.argv[1] if len(sys.argv) > 1 else "/"
-    copy_directory("static", "docs")
-    generate_pages_recursive("content", "template.html", "docs", basepath)
+    logger.info("build finished seconds=%.3f", time.perf_counter() - start)
+    if args.profile:
+        prof.write_json(args.profile)
+        logger.info("profile written path=%s", args.profile)
+        print(prof.format_table(args.top))
 
 if __name__ == '__main__':
     main()
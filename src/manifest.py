@@ -0,0 +1,88 @@
+import hashlib
+import json
+import os
+
+# Bump this whenever a change to the generator alters the HTML it emits,
+# so that every page gets rebuilt on the next run.
+GENERATOR_VERSION = "6"
+
+MANIFEST_PATH = os.path.join(".ssg", "manifest.json")
+
+
+def file_hash(path):
+    # Hash the file in chunks so large sources never have to sit in memory
+    h = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 16), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def build_key(template_path, base_path, render_key=""):
+    # Everything besides the page's own source and the files it references that
+    # ends up in its output. render_key (see build.current_build_key) covers the
+    # stages that are on and the fingerprinted names of the template's links
+    h = hashlib.sha256()
+    h.update(GENERATOR_VERSION.encode())
+    h.update(b"\0")
+    h.update(file_hash(template_path).encode())
+    h.update(b"\0")
+    h.update(base_path.encode())
+    h.update(b"\0")
+    h.update(render_key.encode())
+    return h.hexdigest()
+
+
+class Manifest:
+    def __init__(self, path=None, build=None, pages=None):
+        """
+        inputs:
+        path - where the manifest is stored on disk (None keeps it in memory only)
+        build - the build key (generator version, template hash, base path) of the last build
+        pages - a dictionary mapping each source path to {"hash": ..., "dest": ...},
+                plus the urls the page references ("refs") and the signatures of
+                the files they resolved to ("assets") when the build tracks them
+        """
+        self.path = path
+        self.build = build
+        self.pages = pages if pages is not None else {}
+
+    @classmethod
+    def load(cls, path):
+        try:
+            with open(path, 'r') as f:
+                data = json.load(f)
+        except (FileNotFoundError, ValueError):
+            # A missing or corrupt manifest just means a full rebuild
+            return cls(path)
+        return cls(path, build=data.get("build"), pages=data.get("pages", {}))
+
+    def save(self):
+        if self.path is None:
+            return
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump({"build": self.build, "pages": self.pages}, f, indent=2, sort_keys=True)
+        os.replace(tmp_path, self.path)
+
+    def is_fresh(self, src_path, dest_path, src_hash, build):
+        entry = self.pages.get(src_path)
+        return (
+            build == self.build
+            and entry is not None
+            and entry["hash"] == src_hash
+            and entry["dest"] == dest_path
+            and os.path.exists(dest_path)
+        )
+
+    def record(self, src_path, dest_path, src_hash, refs=None, assets=None):
+        entry = {"hash": src_hash, "dest": dest_path}
+        if refs:
+            entry["refs"] = refs
+        if assets:
+            entry["assets"] = assets
+        self.pages[src_path] = entry
+
+    def __repr__(self):
+        return f"Manifest(path={self.path}, build={self.build}, pages={len(self.pages)})"
@@ -0,0 +1,149 @@
+import mmap
+import os
+import re
+
+# Sources at least this large are memory-mapped and streamed block by block;
+# below it, reading the whole file is cheaper than setting up a mapping
+MMAP_THRESHOLD = 1 << 20
+# How far behind the read position mapped pages are handed back to the kernel
+RELEASE_BYTES = 8 << 20
+
+# One line: leading whitespace, the stripped text (group 1), trailing whitespace.
+# str.strip() also strips \x1c-\x1f, so they count as whitespace here too.
+LINE_PATTERN = re.compile(rb'[ \t\v\f\r\x1c-\x1f]*([^\n]*?)[ \t\v\f\r\x1c-\x1f]*(?:\n|\Z)')
+FENCE = b"```"
+
+
+def is_large(path):
+    try:
+        return os.path.getsize(path) >= MMAP_THRESHOLD
+    except OSError:
+        # Whoever opens the file next reports the error
+        return False
+
+
+class MappedSource:
+    def __init__(self, path):
+        """
+        A markdown file held as a read-only memory map. Blocks are found as
+        (offset, length) spans into the map without copying any text; a block
+        is only decoded into a string when the parser asks for it, and that
+        string is dropped once the block's html has been written.
+        Use as a context manager; the map is closed on exit.
+        """
+        self.path = path
+        with open(path, 'rb') as f:
+            size = os.fstat(f.fileno()).st_size
+            # An empty file can't be mapped
+            self.map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) if size else None
+        self.size = size
+        self.view = memoryview(self.map) if self.map is not None else memoryview(b"")
+        if self.map is not None and hasattr(mmap, "MADV_SEQUENTIAL"):
+            self.map.madvise(mmap.MADV_SEQUENTIAL)
+        # Files with \r newlines go through open(), which translates them like the other paths do
+        self.universal_newlines = self._contains(b"\r")
+
+    def _contains(self, needle):
+        # Searched window by window so the scan never holds the whole file resident
+        for start in range(0, self.size, RELEASE_BYTES):
+            end = min(start + RELEASE_BYTES, self.size)
+            found = self.map.find(needle, start, end) != -1
+            self._release(start, end)
+            if found:
+                return True
+        return False
+
+    def _release(self, start, end):
+        # Hands mapped pages in [start, end) back to the kernel; reading them again just faults them back in
+        if hasattr(mmap, "MADV_DONTNEED"):
+            end -= end % mmap.PAGESIZE
+            if end > start:
+                self.map.madvise(mmap.MADV_DONTNEED, start, end - start)
+
+    def close(self):
+        self.view.release()
+        if self.map is not None:
+            self.map.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def _stripped_bounds(self, match):
+        start, end = match.span(1)
+        if start < end and (self.view[start] >= 0x80 or self.view[end - 1] >= 0x80):
+            # The line may start or end with non-ASCII whitespace, which only str.strip() knows
+            text = str(self.view[start:end], "utf-8")
+            stripped = text.strip()
+            if not stripped:
+                return start, start
+            start += len(text[:len(text) - len(text.lstrip())].encode())
+            end -= len(text[len(text.rstrip()):].encode())
+        return start, end
+
+    def spans(self):
+        """
+        Yields the (offset, length) of every block, split exactly like
+        block.iter_blocks: blank lines separate blocks, except inside a ``` fence.
+        """
+        view = self.view
+        size = self.size
+        match_line = LINE_PATTERN.match
+        source = self.map if self.map is not None else b""
+        block_start = None
+        block_end = 0
+        in_fence = False
+        pos = 0
+        while pos < size:
+            match = match_line(source, pos)
+            pos = match.end()
+            start, end = self._stripped_bounds(match)
+            if in_fence:
+                if start < end:
+                    block_end = end
+                    if view[end - 3:end] == FENCE:
+                        in_fence = False
+                continue
+            if start == end:
+                if block_start is not None:
+                    yield block_start, block_end - block_start
+                    block_start = None
+                continue
+            if view[start:start + 3] == FENCE:
+                # An opening fence, unless the same line also closes it
+                in_fence = end - start < 6 or view[end - 3:end] != FENCE
+            if block_start is None:
+                block_start = start
+            block_end = end
+        if block_start is not None:
+            yield block_start, block_end - block_start
+
+    def text(self, offset, length):
+        # The one copy a block's text ever gets: decoded straight out of the map
+        return str(self.view[offset:offset + length], "utf-8").strip()
+
+    def blocks(self):
+        # The text of every block, decoded one at a time. Mapped pages the
+        # parser has moved past are released as it goes, so the resident size
+        # stays near RELEASE_BYTES however large the file is.
+        if self.universal_newlines:
+            from block import iter_blocks
+
+            with open(self.path, 'r') as f:
+                yield from iter_blocks(f)
+            return
+        released = 0
+        for offset, length in self.spans():
+            yield self.text(offset, length)
+            if offset - released >= RELEASE_BYTES:
+                self._release(released, offset)
+                released = offset - offset % mmap.PAGESIZE
+
+    def title(self):
+        # parse_markdown's title: the first "# " block, without its marker
+        for block in self.blocks():
+            if block.startswith("# "):
+                return block[2:].strip()
+        return None
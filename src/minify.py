@@ -0,0 +1,58 @@
+import re
+
+# The newline after every closing tag, the indentation of list items and the
+# template's own line breaks are only there for people reading the html. With
+# minify on (active), the serializer and Template.compile leave them out, so
+# compact html is written directly instead of being cleaned up afterwards.
+
+# Elements whose content is shown or run exactly as written
+VERBATIM_TAGS = frozenset(("pre", "code", "textarea", "script", "style"))
+# One pass over hand-written markup: verbatim elements (kept), comments other
+# than the conditional ones old browsers read (dropped) and whitespace that
+# spans a line break
+MARKUP_PATTERN = re.compile(
+    r'(?P<verbatim><(?P<tag>pre|code|textarea|script|style)\b.*?</(?P=tag)\s*>)'
+    r'|(?P<comment><!--(?!\[).*?-->)'
+    r'|[ \t\r]*\n\s*',
+    re.S | re.I)
+
+
+def _minify_match(match):
+    if match.group("verbatim"):
+        return match.group()
+    if match.group("comment"):
+        return ""
+    # Between two tags the line break is layout and goes; next to text it is one space
+    text, start, end = match.string, match.start(), match.end()
+    if text.endswith(">", 0, start) and text.startswith("<", end):
+        return ""
+    return " "
+
+
+def minify_markup(text):
+    """
+    Drops comments and the line breaks (and the indentation after them) of
+    hand-written html such as the template. Whitespace within a line is kept,
+    so inline elements stay apart, and <pre>, <code>, <textarea>, <script> and
+    <style> elements are left exactly as they are.
+    """
+    return MARKUP_PATTERN.sub(_minify_match, text).strip()
+
+
+# True: emit compact html; False (the default) keeps the readable layout
+active = False
+
+
+def render_key():
+    # Folded into the build key and the parse and fragment cache keys
+    return "minify" if active else ""
+
+
+def enable():
+    global active
+    active = True
+
+
+def disable():
+    global active
+    active = False
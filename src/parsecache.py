@@ -0,0 +1,186 @@
+import argparse
+import hashlib
+import logging
+import os
+import pickle
+import sys
+import zlib
+
+from manifest import GENERATOR_VERSION
+
+logger = logging.getLogger(__name__)
+
+PARSE_CACHE_DIR = os.path.join(".ssg", "parse")
+DEFAULT_MAX_BYTES = 256 * 1024 * 1024
+ENTRY_SUFFIX = ".bin"
+# Bump when the layout of an entry changes
+ENTRY_FORMAT = "4"
+
+
+def source_key(source, base_path, render_key=""):
+    # What the rendered article depends on: the markdown bytes, the base path
+    # links are rewritten under, the stages that are on (build.render_key())
+    # and the generator version. What the stages know about the targets of its
+    # links and images is stored with the entry instead (depgraph.markup_key),
+    # as the urls are only known once the page is parsed.
+    h = hashlib.sha256()
+    h.update(GENERATOR_VERSION.encode())
+    h.update(b"\0")
+    h.update(ENTRY_FORMAT.encode())
+    h.update(b"\0")
+    h.update(base_path.encode())
+    h.update(b"\0")
+    h.update(render_key.encode())
+    h.update(b"\0")
+    h.update(source)
+    return h.hexdigest()
+
+
+class ParseCache:
+    def __init__(self, directory=PARSE_CACHE_DIR, max_bytes=DEFAULT_MAX_BYTES):
+        """
+        Keeps the title, rendered article html, referenced urls, search
+        sections (None when the page was rendered without search) and markup
+        key of the referenced urls of every page on disk, keyed by source_key(), so a build that only changed
+        template.html never parses markdown.
+        Each entry is its own zlib-compressed pickle under directory/<key[:2]>/,
+        which lets worker processes read and write entries without coordinating.
+        max_bytes - the size gc() trims the cache down to
+        """
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+
+    def _path(self, key):
+        return os.path.join(self.directory, key[:2], key + ENTRY_SUFFIX)
+
+    def get(self, key):
+        # Returns (title, html, refs, sections, markup) or None
+        path = self._path(key)
+        try:
+            with open(path, 'rb') as f:
+                title, html, refs, sections, markup = pickle.loads(zlib.decompress(f.read()))
+        except FileNotFoundError:
+            self.misses += 1
+            return None
+        except (OSError, EOFError, ValueError, zlib.error, pickle.UnpicklingError):
+            # A truncated or corrupt entry is dropped and rebuilt
+            logger.warning("corrupt parse cache entry path=%s", path)
+            self.misses += 1
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            return None
+        self.hits += 1
+        # gc() evicts by mtime, so mark the entry as recently used
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        return title, html, refs, sections, markup
+
+    def put(self, key, title, html, refs=(), sections=None, markup=""):
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        data = zlib.compress(pickle.dumps((title, html, list(refs), sections, markup), protocol=pickle.HIGHEST_PROTOCOL))
+        # Unique per process so concurrent workers never share a temporary file
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+
+    def entries(self):
+        # Yields (path, size, mtime) for every entry
+        if not os.path.isdir(self.directory):
+            return
+        for dir_path, _, file_names in os.walk(self.directory):
+            for name in file_names:
+                if not name.endswith(ENTRY_SUFFIX):
+                    continue
+                path = os.path.join(dir_path, name)
+                try:
+                    st = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                yield path, st.st_size, st.st_mtime_ns
+
+    def size(self):
+        return sum(size for _, size, _ in self.entries())
+
+    def gc(self, max_bytes=None):
+        """
+        Removes the least recently used entries until the cache holds at most
+        max_bytes (default self.max_bytes). Returns (removed, remaining bytes).
+        """
+        max_bytes = self.max_bytes if max_bytes is None else max_bytes
+        entries = sorted(self.entries(), key=lambda entry: entry[2])
+        total = sum(size for _, size, _ in entries)
+        removed = 0
+        for path, size, _ in entries:
+            if total <= max_bytes:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total -= size
+            removed += 1
+        logger.info("parse cache gc removed=%d bytes=%d max_bytes=%d", removed, total, max_bytes)
+        return removed, total
+
+    def stats(self):
+        entries = list(self.entries())
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "entries": len(entries),
+            "bytes": sum(size for _, size, _ in entries),
+        }
+
+    def __repr__(self):
+        return f"ParseCache(directory={self.directory}, max_bytes={self.max_bytes})"
+
+
+# The cache generate_page consults; None (the default) means always parse
+active = None
+
+
+def enable(directory=PARSE_CACHE_DIR, max_bytes=DEFAULT_MAX_BYTES):
+    global active
+    active = ParseCache(directory, max_bytes)
+    return active
+
+
+def disable():
+    global active
+    active = None
+
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(description="Inspect or trim the on-disk parse cache")
+    parser.add_argument("command", choices=["gc", "stats", "clear"])
+    parser.add_argument("--dir", default=PARSE_CACHE_DIR)
+    parser.add_argument("--max-size", type=int, default=DEFAULT_MAX_BYTES >> 20, metavar="MB",
+                        help="size gc trims the cache down to")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(sys.argv[1:] if argv is None else argv)
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    cache = ParseCache(args.dir, args.max_size << 20)
+    if args.command == "gc":
+        removed, remaining = cache.gc()
+        print(f"removed {removed} entries, {remaining / 2**20:.1f} MB left")
+    elif args.command == "clear":
+        removed, _ = cache.gc(0)
+        print(f"removed {removed} entries")
+    else:
+        stats = cache.stats()
+        print(f"{stats['entries']} entries, {stats['bytes'] / 2**20:.1f} MB in {args.dir}")
+
+
+if __name__ == "__main__":
+    main()
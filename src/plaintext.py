@@ -0,0 +1,24 @@
+import re
+
+# Markdown reduced to its words: what the search index holds and what heading
+# ids are made of. Kept apart from search.py and the parser so rendering a
+# page needs neither the search stage nor this needs the parser.
+
+# Letters and digits; search.js tokenizes queries with the equivalent /[\p{L}\p{N}]+/u
+TERM_PATTERN = re.compile(r'[^\W_]+')
+# Links and images count as their text, not their url. The text follows
+# htmlnode.MARKDOWN_LINK_OR_IMAGE_PATTERN, which this module doesn't import:
+# a fresh build never loads the parser.
+LINK_OR_IMAGE_PATTERN = re.compile(r'!?\[([^\[\]\n]*(?:\[[^\[\]\n]*\](?!\()[^\[\]\n]*)*)\]\([^)\n]*\)')
+# Bold, code and italic markers; underscores inside words stay
+INLINE_MARKER_PATTERN = re.compile(r'\*\*|`|(?<!\w)_|_(?!\w)')
+
+
+def plain_text(markdown):
+    return INLINE_MARKER_PATTERN.sub('', LINK_OR_IMAGE_PATTERN.sub(r'\1', markdown))
+
+
+def heading_anchor(heading):
+    # The id a heading gets, e.g. "Why Tom _Bombadil_ was a mistake" -> "why-tom-bombadil-was-a-mistake".
+    # A page with two identical headings gets the same id twice; links go to the first.
+    return "-".join(TERM_PATTERN.findall(plain_text(heading).lower()))
@@ -0,0 +1,191 @@
+import struct
+import zlib
+from itertools import accumulate
+
+# Just enough PNG to resize images without Pillow: 8-bit, non-interlaced
+# greyscale, greyscale + alpha, RGB and RGBA. Anything else (palettes, 16-bit
+# channels, interlacing) raises ValueError, and images.py leaves it as it is.
+
+# Bump when encode() writes different bytes for the same pixels; it keys cached variants
+VERSION = 1
+SIGNATURE = b"\x89PNG\r\n\x1a\n"
+# Colour type -> channels per pixel
+CHANNELS = {0: 1, 2: 3, 4: 2, 6: 4}
+COLOUR_TYPES = {channels: colour_type for colour_type, channels in CHANNELS.items()}
+# Chunks describing the colour space, carried over into resized copies
+COLOUR_CHUNKS = (b"iCCP", b"sRGB", b"gAMA", b"cHRM")
+COMPRESSION_LEVEL = 9
+# How far a filtered byte, read as a signed difference, is from 0
+DISTANCE = [v if v < 128 else 256 - v for v in range(256)]
+
+
+def read_header(f):
+    return parse_header(f.read(33))
+
+
+def parse_header(head):
+    # (width, height, bit depth, colour type, interlace method) from the first 33 bytes of the file
+    if len(head) < 33 or head[:8] != SIGNATURE or head[12:16] != b"IHDR":
+        raise ValueError("not a PNG file")
+    width, height, bit_depth, colour_type, _, _, interlace = struct.unpack(">IIBBBBB", head[16:29])
+    return width, height, bit_depth, colour_type, interlace
+
+
+def is_supported(header):
+    _, _, bit_depth, colour_type, interlace = header
+    return bit_depth == 8 and colour_type in CHANNELS and interlace == 0
+
+
+def _chunks(data):
+    pos = len(SIGNATURE)
+    while pos + 8 <= len(data):
+        length, kind = struct.unpack(">I4s", data[pos:pos + 8])
+        yield kind, data[pos + 8:pos + 8 + length]
+        pos += 12 + length
+        if kind == b"IEND":
+            return
+
+
+def read(path):
+    """
+    Decodes a PNG into (width, height, channels, rows, colour chunks), where
+    rows holds one bytes object of width * channels samples per scanline.
+    """
+    with open(path, 'rb') as f:
+        data = f.read()
+    if data[:8] != SIGNATURE:
+        raise ValueError(f"{path}: not a PNG file")
+    header = None
+    idat = []
+    colour_chunks = []
+    for kind, body in _chunks(data):
+        if kind == b"IHDR":
+            width, height, bit_depth, colour_type, _, _, interlace = struct.unpack(">IIBBBBB", body[:13])
+            header = (width, height, bit_depth, colour_type, interlace)
+        elif kind == b"IDAT":
+            idat.append(body)
+        elif kind in COLOUR_CHUNKS:
+            colour_chunks.append((kind, body))
+    if header is None or not is_supported(header):
+        raise ValueError(f"{path}: unsupported PNG (only 8-bit, non-interlaced, without a palette)")
+    width, height, _, colour_type, _ = header
+    channels = CHANNELS[colour_type]
+    rows = unfilter(zlib.decompress(b"".join(idat)), width * channels, height, channels)
+    return width, height, channels, rows, colour_chunks
+
+
+def unfilter(data, stride, height, bpp):
+    # Undoes the per-scanline filters; the one byte in front of every line says which
+    rows = []
+    prev = bytes(stride)
+    pos = 0
+    for _ in range(height):
+        kind = data[pos]
+        raw = data[pos + 1:pos + 1 + stride]
+        pos += 1 + stride
+        if len(raw) != stride:
+            raise ValueError("truncated PNG image data")
+        if kind == 0:
+            row = raw
+        elif kind == 1:
+            # Sub: a running sum per channel
+            row = bytearray(stride)
+            for c in range(bpp):
+                row[c::bpp] = bytes(v & 0xff for v in accumulate(raw[c::bpp]))
+        elif kind == 2:
+            row = bytes([(a + b) & 0xff for a, b in zip(raw, prev)])
+        elif kind == 3:
+            row = bytearray(raw)
+            for i in range(stride):
+                left = row[i - bpp] if i >= bpp else 0
+                row[i] = (row[i] + ((left + prev[i]) >> 1)) & 0xff
+        elif kind == 4:
+            row = bytearray(raw)
+            for i in range(bpp):
+                # Left and upper-left are 0 here, so Paeth picks the byte above
+                row[i] = (row[i] + prev[i]) & 0xff
+            for i in range(bpp, stride):
+                a = row[i - bpp]
+                b = prev[i]
+                c = prev[i - bpp]
+                pa = abs(b - c)
+                pb = abs(a - c)
+                pc = abs(a + b - 2 * c)
+                if pa <= pb and pa <= pc:
+                    row[i] = (row[i] + a) & 0xff
+                elif pb <= pc:
+                    row[i] = (row[i] + b) & 0xff
+                else:
+                    row[i] = (row[i] + c) & 0xff
+        else:
+            raise ValueError(f"unknown PNG filter type {kind}")
+        row = bytes(row)
+        rows.append(row)
+        prev = row
+    return rows
+
+
+def _spans(size, new_size):
+    # The source range [start, end) each output position covers
+    return [(i * size // new_size, max(i * size // new_size + 1, (i + 1) * size // new_size)) for i in range(new_size)]
+
+
+def resize(rows, width, height, channels, new_width, new_height):
+    """
+    Box filter: every output pixel is the average of the source pixels it
+    covers. Meant for shrinking; rows are summed column-wise first and then
+    each channel is summed in slices, which keeps the per-pixel work in C.
+    """
+    x_spans = _spans(width, new_width)
+    resized = []
+    for y0, y1 in _spans(height, new_height):
+        sums = rows[y0] if y1 - y0 == 1 else list(map(sum, zip(*rows[y0:y1])))
+        out = bytearray(new_width * channels)
+        for c in range(channels):
+            channel = sums[c::channels]
+            out[c::channels] = bytes((sum(channel[x0:x1]) + ((x1 - x0) * (y1 - y0) >> 1)) // ((x1 - x0) * (y1 - y0))
+                                     for x0, x1 in x_spans)
+        resized.append(bytes(out))
+    return resized
+
+
+def _chunk(kind, body):
+    return struct.pack(">I", len(body)) + kind + body + struct.pack(">I", zlib.crc32(kind + body))
+
+
+def drop_opaque_alpha(rows, channels):
+    # An alpha channel that is 255 everywhere only costs bytes: returns (rows, channels) without it
+    if channels not in (2, 4) or not all(row[channels - 1::channels].count(255) * channels == len(row) for row in rows):
+        return rows, channels
+    colours = channels - 1
+    stripped = []
+    for row in rows:
+        out = bytearray(len(row) // channels * colours)
+        for c in range(colours):
+            out[c::colours] = row[c::channels]
+        stripped.append(bytes(out))
+    return stripped, colours
+
+
+def encode(width, height, channels, rows, colour_chunks=()):
+    """
+    Each scanline gets whichever of the Sub and Up filters leaves the smaller
+    sum of absolute differences (libpng's heuristic); the other filters cost
+    a Python loop per byte and rarely do better on resized photos.
+    """
+    filtered = []
+    prev = bytes(width * channels)
+    for row in rows:
+        up = bytes([(a - b) & 0xff for a, b in zip(row, prev)])
+        sub = bytes([(a - b) & 0xff for a, b in zip(row, bytes(channels) + row[:-channels])])
+        if sum(map(DISTANCE.__getitem__, sub)) < sum(map(DISTANCE.__getitem__, up)):
+            filtered += (b"\x01", sub)
+        else:
+            filtered += (b"\x02", up)
+        prev = row
+    ihdr = struct.pack(">IIBBBBB", width, height, 8, COLOUR_TYPES[channels], 0, 0, 0)
+    parts = [SIGNATURE, _chunk(b"IHDR", ihdr)]
+    parts += [_chunk(kind, body) for kind, body in colour_chunks]
+    parts.append(_chunk(b"IDAT", zlib.compress(b"".join(filtered), COMPRESSION_LEVEL)))
+    parts.append(_chunk(b"IEND", b""))
+    return b"".join(parts)
@@ -0,0 +1,233 @@
+import json
+import os
+import time
+from contextlib import nullcontext
+
+# Stage names, in pipeline order
+BLOCK_SPLITTING = "block splitting"
+BLOCK_CLASSIFICATION = "block classification"
+INLINE_TOKENIZING = "inline tokenizing"
+NODE_CONVERSION = "node conversion"
+SERIALIZATION = "serialization"
+TEMPLATING = "templating"
+IO = "io"
+STAGES = (BLOCK_SPLITTING, BLOCK_CLASSIFICATION, INLINE_TOKENIZING, NODE_CONVERSION, SERIALIZATION, TEMPLATING, IO)
+
+
+def new_stats():
+    return {"seconds": 0.0, "peak_bytes": 0, "net_bytes": 0, "calls": 0}
+
+
+def add_stats(total, stats):
+    # Times, net bytes and calls add up; the peak of several runs is the highest one
+    for key in total:
+        total[key] = max(total[key], stats[key]) if key == "peak_bytes" else total[key] + stats[key]
+
+
+class Profiler:
+    enabled = True
+
+    def __init__(self):
+        """
+        Collects wall time, memory and call counts per stage, for every page
+        and for the build as a whole. Memory is measured with tracemalloc,
+        which runs while the profiler does:
+        peak_bytes - the most a single call of the stage had allocated on top
+                     of what was allocated when it started
+        net_bytes - what the stage's calls left allocated (freed memory counts
+                    against it, so it can be below 0)
+        pages - {page: {"total": stats, "stages": {stage: stats}}}
+        build - {stage: stats} for work that does not belong to a single page
+        """
+        # Imported here: tracemalloc takes longer to import than the rest of
+        # startup, and only profiled builds need it
+        import tracemalloc
+
+        if not tracemalloc.is_tracing():
+            tracemalloc.start()
+        self.traced_memory = tracemalloc.get_traced_memory
+        self.reset_peak = tracemalloc.reset_peak
+        # The highest peak a finished inner timer saw since an outer timer reset
+        # it; tracemalloc keeps a single peak, which every timer resets
+        self.carried_peak = 0
+        self.pages = {}
+        self.build = {}
+        self.current = None
+
+    def _stats_for(self, stage):
+        if self.current is None:
+            stages = self.build
+        else:
+            stages = self.pages[self.current]["stages"]
+        stats = stages.get(stage)
+        if stats is None:
+            stats = stages[stage] = new_stats()
+        return stats
+
+    def start_memory(self):
+        # Resets tracemalloc's peak for a timer that starts now. Returns what
+        # stop_memory needs: the bytes allocated now and the peak so far, which
+        # the timers around this one still have to see.
+        current, peak = self.traced_memory()
+        outer_peak = max(self.carried_peak, peak)
+        self.carried_peak = 0
+        self.reset_peak()
+        return current, outer_peak
+
+    def stop_memory(self, memory):
+        # (peak, net) bytes allocated since start_memory returned memory
+        start, outer_peak = memory
+        current, peak = self.traced_memory()
+        peak = max(self.carried_peak, peak)
+        self.carried_peak = max(outer_peak, peak)
+        return peak - start, current - start
+
+    def stage(self, stage):
+        return _Timer(self, stage)
+
+    def page(self, page):
+        return _PageTimer(self, page)
+
+    def timed(self, stage, func):
+        # Wraps func so every call is charged to stage
+        def wrapper(*args, **kwargs):
+            with _Timer(self, stage):
+                return func(*args, **kwargs)
+        return wrapper
+
+    def timed_iter(self, stage, iterable):
+        # Charges the time spent producing each item to stage
+        iterator = iter(iterable)
+        while True:
+            with _Timer(self, stage):
+                try:
+                    item = next(iterator)
+                except StopIteration:
+                    return
+            yield item
+
+    def page_report(self, page):
+        return self.pages.get(page)
+
+    def merge_page(self, page, record):
+        # Adds a page record produced in another process
+        if record is not None:
+            self.pages[page] = record
+
+    def totals(self):
+        totals = {stage: dict(stats) for stage, stats in self.build.items()}
+        for record in self.pages.values():
+            for stage, stats in record["stages"].items():
+                add_stats(totals.setdefault(stage, new_stats()), stats)
+        return totals
+
+    def slowest_pages(self, n=10):
+        return sorted(self.pages.items(), key=lambda item: item[1]["total"]["seconds"], reverse=True)[:n]
+
+    def report(self):
+        return {
+            "pages": self.pages,
+            "totals": self.totals(),
+            "page_count": len(self.pages),
+            "page_seconds": sum(record["total"]["seconds"] for record in self.pages.values()),
+        }
+
+    def write_json(self, path):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with open(path, 'w') as f:
+            json.dump(self.report(), f, indent=2, sort_keys=True)
+
+    def format_table(self, n=10):
+        lines = [f"{'stage':<22}  {'seconds':>9}  {'peak KiB':>10}  {'net KiB':>10}  {'calls':>8}"]
+        totals = self.totals()
+        for stage in sorted(totals, key=lambda name: STAGES.index(name) if name in STAGES else len(STAGES)):
+            stats = totals[stage]
+            lines.append(f"{stage:<22}  {stats['seconds']:>9.4f}  {stats['peak_bytes'] / 1024:>10.1f}  "
+                         f"{stats['net_bytes'] / 1024:>10.1f}  {stats['calls']:>8}")
+        lines.append("")
+        lines.append(f"{'slowest pages':<50}  {'seconds':>9}  {'peak KiB':>10}")
+        for page, record in self.slowest_pages(n):
+            lines.append(f"{page:<50}  {record['total']['seconds']:>9.4f}  "
+                         f"{record['total']['peak_bytes'] / 1024:>10.1f}")
+        return "\n".join(lines)
+
+
+class _Timer:
+    __slots__ = ("profiler", "stage", "start", "memory")
+
+    def __init__(self, profiler, stage):
+        self.profiler = profiler
+        self.stage = stage
+
+    def __enter__(self):
+        self.memory = self.profiler.start_memory()
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        elapsed = time.perf_counter() - self.start
+        peak, net = self.profiler.stop_memory(self.memory)
+        stats = self.profiler._stats_for(self.stage)
+        stats["seconds"] += elapsed
+        stats["peak_bytes"] = max(stats["peak_bytes"], peak)
+        stats["net_bytes"] += net
+        stats["calls"] += 1
+        return False
+
+
+class _PageTimer:
+    def __init__(self, profiler, page):
+        self.profiler = profiler
+        self.page = page
+
+    def __enter__(self):
+        self.profiler.pages[self.page] = {"total": new_stats(), "stages": {}}
+        self.previous = self.profiler.current
+        self.profiler.current = self.page
+        self.memory = self.profiler.start_memory()
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        total = self.profiler.pages[self.page]["total"]
+        total["seconds"] = time.perf_counter() - self.start
+        total["peak_bytes"], total["net_bytes"] = self.profiler.stop_memory(self.memory)
+        total["calls"] = 1
+        self.profiler.current = self.previous
+        return False
+
+
+class NullProfiler:
+    # Stands in when profiling is off; generate_page checks `enabled` and
+    # skips the instrumented path entirely
+    enabled = False
+
+    def stage(self, stage):
+        return nullcontext()
+
+    def page(self, page):
+        return nullcontext()
+
+    def page_report(self, page):
+        return None
+
+    def merge_page(self, page, record):
+        pass
+
+
+active = NullProfiler()
+
+
+def enable():
+    global active
+    if not active.enabled:
+        active = Profiler()
+    return active
+
+
+def disable():
+    global active
+    if active.enabled:
+        import tracemalloc
+        tracemalloc.stop()
+    active = NullProfiler()
@@ -0,0 +1,54 @@
+import json
+import os
+import time
+
+CHANGES_PATH = os.path.join(".ssg", "changes.json")
+
+
+class ChangeSet:
+    def __init__(self, root):
+        """
+        Collects the output files a build actually touched, so deploy tooling can
+        upload only those instead of the whole site.
+        root - the output directory; paths are recorded relative to it
+        written - files whose content changed (new files included)
+        removed - files the build deleted
+        """
+        self.root = root
+        self.written = set()
+        self.removed = set()
+
+    def _relative(self, path):
+        return os.path.relpath(path, self.root).replace(os.sep, "/")
+
+    def wrote(self, path):
+        path = self._relative(path)
+        self.written.add(path)
+        self.removed.discard(path)
+
+    def remove(self, path):
+        path = self._relative(path)
+        self.removed.add(path)
+        self.written.discard(path)
+
+    def __bool__(self):
+        return bool(self.written or self.removed)
+
+    def to_dict(self):
+        return {
+            "root": self.root,
+            "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "written": sorted(self.written),
+            "removed": sorted(self.removed),
+        }
+
+    def save(self, path=CHANGES_PATH):
+        # Replaced on every build: it describes the difference to the previous build only
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        tmp_path = path + ".tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump(self.to_dict(), f, indent=2)
+        os.replace(tmp_path, path)
+
+    def __repr__(self):
+        return f"ChangeSet(root={self.root}, written={len(self.written)}, removed={len(self.removed)})"
@@ -0,0 +1,128 @@
+// Client for the index search.py writes next to this file. index.json is
+// fetched on the first query; term shards only once a query needs them.
+//
+//   ssgSearch("tom bombadil").then(results => ...)
+//
+// resolves to [{url, title, heading, score}], best first. The last word of a
+// query also matches longer terms, so results update while typing. Pages with
+// an <input id="search"> and a <ul id="search-results"> are wired up as is.
+(() => {
+  "use strict";
+  const FORMAT = 1;
+  const base = new URL(".", document.currentScript.src);
+  const site = new URL("..", base);
+  const shards = new Map();
+  let meta = null;
+
+  const fetchJSON = async (name) => {
+    const response = await fetch(new URL(name, base));
+    if (!response.ok) throw new Error(`${name}: ${response.status}`);
+    return response.json();
+  };
+
+  const loadMeta = () => {
+    meta = meta || fetchJSON("index.json").then((index) => {
+      if (index.format !== FORMAT) throw new Error(`unsupported search index format ${index.format}`);
+      return index;
+    });
+    return meta;
+  };
+
+  const loadShard = (name) => {
+    if (!shards.has(name)) shards.set(name, fetchJSON(`${name}.json`));
+    return shards.get(name);
+  };
+
+  // The same rules as search.terms() and search.shard_name()
+  const terms = (text, minLength) =>
+    (text.toLowerCase().match(/[\p{L}\p{N}]+/gu) || []).filter((term) => [...term].length >= minLength);
+
+  const shardName = (term, prefixLength) => {
+    const prefix = [...term].slice(0, prefixLength);
+    if (/^[a-z0-9]+$/.test(prefix.join(""))) return prefix.join("");
+    return "u" + prefix.map((char) => char.codePointAt(0).toString(16)).join("-");
+  };
+
+  // Adds a term's (document delta, section, count) triples to hits: document -> section -> count
+  const addPostings = (hits, postings) => {
+    let doc = 0;
+    for (let i = 0; i < postings.length; i += 3) {
+      doc += postings[i];
+      const sections = hits.get(doc) || new Map();
+      sections.set(postings[i + 1], (sections.get(postings[i + 1]) || 0) + postings[i + 2]);
+      hits.set(doc, sections);
+    }
+  };
+
+  const search = async (query, limit = 10) => {
+    const index = await loadMeta();
+    const words = terms(query, index.min_term_length);
+    if (!words.length) return [];
+    const names = [...new Set(words.map((word) => shardName(word, index.prefix_length)))];
+    const loaded = new Map();
+    await Promise.all(names.filter((name) => index.shards.includes(name))
+      .map(async (name) => loaded.set(name, await loadShard(name))));
+
+    // Every word has to occur somewhere on a page
+    let matches = null;
+    words.forEach((word, i) => {
+      const shard = loaded.get(shardName(word, index.prefix_length)) || {};
+      const hits = new Map();
+      const prefix = i === words.length - 1;
+      for (const term of prefix ? Object.keys(shard).filter((term) => term.startsWith(word)) : [word]) {
+        if (shard[term]) addPostings(hits, shard[term]);
+      }
+      if (matches === null) {
+        matches = hits;
+        return;
+      }
+      for (const [doc, sections] of matches) {
+        if (!hits.has(doc)) {
+          matches.delete(doc);
+          continue;
+        }
+        for (const [section, count] of hits.get(doc)) sections.set(section, (sections.get(section) || 0) + count);
+      }
+    });
+
+    const results = [];
+    for (const [doc, sections] of matches) {
+      const [url, title, headings] = index.docs[doc];
+      let best = null;
+      let score = 0;
+      for (const [section, count] of sections) {
+        score += count;
+        if (best === null || count > sections.get(best)) best = section;
+      }
+      const [anchor, heading] = headings[best];
+      results.push({url: new URL(url + (anchor ? `#${anchor}` : ""), site).href, title, heading, score});
+    }
+    return results.sort((a, b) => b.score - a.score).slice(0, limit);
+  };
+
+  window.ssgSearch = search;
+
+  const wire = () => {
+    const input = document.getElementById("search");
+    const list = document.getElementById("search-results");
+    if (!input || !list) return;
+    let latest = 0;
+    input.addEventListener("input", async () => {
+      const query = ++latest;
+      const results = await search(input.value);
+      if (query !== latest) return;
+      list.replaceChildren(...results.map((result) => {
+        const item = document.createElement("li");
+        const link = document.createElement("a");
+        link.href = result.url;
+        link.textContent = result.heading && result.heading !== result.title
+          ? `${result.title} › ${result.heading}` : result.title;
+        item.append(link);
+        return item;
+      }));
+    });
+  };
+
+  if (document.readyState === "loading") document.addEventListener("DOMContentLoaded", wire);
+  else wire();
+})();
@@ -0,0 +1,269 @@
+import hashlib
+import json
+import logging
+import os
+import re
+import shutil
+from collections import Counter
+
+from depgraph import site_path
+from plaintext import TERM_PATTERN, heading_anchor, plain_text
+
+logger = logging.getLogger(__name__)
+
+FRAGMENTS_DIR = os.path.join(".ssg", "search")
+# Where the index goes inside the output directory
+INDEX_DIR = "search"
+INDEX_FILE = "index.json"
+CLIENT_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "search.js")
+# Bump when the layout of index.json or the shards changes; search.js checks it
+INDEX_FORMAT = 1
+# Terms are sharded by their first character, or their first two once a
+# one-character shard would be larger than MAX_SHARD_BYTES
+PREFIX_LENGTHS = (1, 2)
+MAX_SHARD_BYTES = 64 * 1024
+MIN_TERM_LENGTH = 2
+
+SHARD_NAME_PATTERN = re.compile(r'[a-z0-9]+')
+# File names shard_name() produces: the prefix ("a.json", "th.json"), or its
+# escaped code points ("ue9.json", "ue9-6c.json")
+SHARD_FILE_PATTERN = re.compile(r'(?:[a-z0-9]{1,%d}|u[0-9a-f]+(?:-[0-9a-f]+)*)\.json' % max(PREFIX_LENGTHS))
+# What the template's {{ Search }} slot becomes when there is an index: the box
+# search.js wires up and the script itself, root-relative like the template's
+# own urls so Template.compile points it at the base path
+SEARCH_BOX = (
+    '<nav>\n'
+    '      <input id="search" type="search" placeholder="Search" aria-label="Search the site" />\n'
+    '      <ul id="search-results"></ul>\n'
+    f'      <script src="/{INDEX_DIR}/search.js" defer></script>\n'
+    '    </nav>'
+)
+
+
+def terms(text):
+    return [term for term in TERM_PATTERN.findall(text.lower()) if len(term) >= MIN_TERM_LENGTH]
+
+
+def shard_name(term, prefix_length):
+    # File name of the shard holding term; search.js computes the same name
+    prefix = term[:prefix_length]
+    if SHARD_NAME_PATTERN.fullmatch(prefix):
+        return prefix
+    return "u" + "-".join(f"{ord(char):x}" for char in prefix)
+
+
+class PageIndex:
+    def __init__(self):
+        """
+        Collects one page's searchable text while parse_markdown walks its blocks.
+        sections - [anchor, heading, Counter of terms] per heading; text before the
+                   first heading goes into a section with anchor "" and heading None
+        """
+        self.sections = []
+
+    def add(self, block, level):
+        if level:
+            heading = plain_text(block[level + 1:]).strip()
+            self.sections.append([heading_anchor(heading), heading, Counter()])
+            text = heading
+        else:
+            if not self.sections:
+                self.sections.append(["", None, Counter()])
+            text = plain_text(block)
+        self.sections[-1][2].update(terms(text))
+
+    def fragment(self, title):
+        # What the fragment store keeps for the page: plain json types only
+        return {"title": title, "sections": [[anchor, heading, dict(counts)] for anchor, heading, counts in self.sections]}
+
+
+class FragmentStore:
+    def __init__(self, directory=FRAGMENTS_DIR):
+        """
+        Keeps every page's search fragment on disk, one json file per page, so
+        the site index is rebuilt from fragments without parsing a single page
+        that didn't change. Files are written atomically and per process, so
+        worker processes store fragments without coordinating.
+        """
+        self.directory = directory
+
+    def _path(self, src_path):
+        return os.path.join(self.directory, hashlib.sha1(src_path.encode()).hexdigest() + ".json")
+
+    def has(self, src_path):
+        return os.path.exists(self._path(src_path))
+
+    def get(self, src_path):
+        try:
+            with open(self._path(src_path)) as f:
+                fragment = json.load(f)
+        except (FileNotFoundError, ValueError):
+            return None
+        return fragment if fragment.get("src") == src_path else None
+
+    def put(self, src_path, fragment):
+        os.makedirs(self.directory, exist_ok=True)
+        path = self._path(src_path)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump(dict(fragment, src=src_path), f, separators=(",", ":"))
+        os.replace(tmp_path, path)
+
+    def prune(self, sources):
+        # Deletes the fragments of pages that are gone; returns how many
+        keep = {os.path.basename(self._path(src_path)) for src_path in sources}
+        removed = 0
+        if os.path.isdir(self.directory):
+            for name in os.listdir(self.directory):
+                if name.endswith(".json") and name not in keep:
+                    os.remove(os.path.join(self.directory, name))
+                    removed += 1
+        return removed
+
+    def __repr__(self):
+        return f"FragmentStore(directory={self.directory})"
+
+
+def page_url(dest_path, dest_dir):
+    # Relative to the site root; search.js resolves it against where it is served
+    # from, so the index doesn't depend on the base path
+    path = site_path(dest_path, dest_dir)
+    if path == "index.html" or path.endswith("/index.html"):
+        path = path[:-len("index.html")]
+    return path
+
+
+def build_index(pages):
+    """
+    pages - (url, fragment) pairs
+    Returns (meta, shards): meta lists the documents and their sections, shards
+    maps a shard name to {term: postings}. A term's postings are a flat list of
+    (document, section, count) triples sorted by document, with each document
+    number stored as the difference to the previous one.
+    """
+    docs = []
+    postings = {}
+    for doc, (url, fragment) in enumerate(pages):
+        sections = fragment["sections"]
+        docs.append([url, fragment["title"], [[anchor, heading] for anchor, heading, _ in sections]])
+        for section, (_, _, counts) in enumerate(sections):
+            for term, count in counts.items():
+                postings.setdefault(term, []).append((doc, section, count))
+
+    encoded = {}
+    for term in sorted(postings):
+        deltas = []
+        previous = 0
+        for doc, section, count in postings[term]:
+            deltas += (doc - previous, section, count)
+            previous = doc
+        encoded[term] = deltas
+
+    for prefix_length in PREFIX_LENGTHS:
+        shards = {}
+        sizes = {}
+        for term, deltas in encoded.items():
+            name = shard_name(term, prefix_length)
+            shards.setdefault(name, {})[term] = deltas
+            # Roughly the json size: quotes and punctuation around the term, a digit and a comma per number
+            sizes[name] = sizes.get(name, 0) + len(term) + 4 + 2 * len(deltas)
+        if max(sizes.values(), default=0) <= MAX_SHARD_BYTES:
+            break
+    meta = {
+        "format": INDEX_FORMAT,
+        "prefix_length": prefix_length,
+        "min_term_length": MIN_TERM_LENGTH,
+        "docs": docs,
+        "shards": sorted(shards),
+    }
+    return meta, shards
+
+
+def write_index(store, manifest, dest_dir, changes=None):
+    """
+    Rebuilds dest_dir/search/ from the fragments of the pages in manifest:
+    index.json, one json file per shard and the search.js client. Only files
+    whose content changed are rewritten, and shards that are no longer needed
+    are removed. Returns (documents, terms, shards).
+    """
+    from build import write_atomically
+
+    pages = []
+    for src_path, entry in sorted(manifest.pages.items()):
+        fragment = store.get(src_path)
+        if fragment is None:
+            logger.warning("no search fragment src=%s", src_path)
+            continue
+        pages.append((page_url(entry["dest"], dest_dir), fragment))
+    meta, shards = build_index(pages)
+
+    index_dir = os.path.join(dest_dir, INDEX_DIR)
+    outputs = {INDEX_FILE: meta}
+    outputs.update((f"{name}.json", postings) for name, postings in shards.items())
+    for name, data in outputs.items():
+        path = os.path.join(index_dir, name)
+        text = json.dumps(data, separators=(",", ":"), ensure_ascii=False)
+        if write_atomically(path, lambda f: f.write(text)) and changes is not None:
+            changes.wrote(path)
+    script = os.path.join(index_dir, os.path.basename(CLIENT_SCRIPT))
+    with open(CLIENT_SCRIPT) as f:
+        client = f.read()
+    if write_atomically(script, lambda f: f.write(client)) and changes is not None:
+        changes.wrote(script)
+
+    for name in os.listdir(index_dir):
+        if name not in outputs and name.endswith(".json") and is_index_file(os.path.join(INDEX_DIR, name)):
+            path = os.path.join(index_dir, name)
+            os.remove(path)
+            if changes is not None:
+                changes.remove(path)
+    store.prune(manifest.pages)
+    term_count = sum(len(postings) for postings in shards.values())
+    logger.info("search index docs=%d terms=%d shards=%d", len(meta["docs"]), term_count, len(shards))
+    return len(meta["docs"]), term_count, len(shards)
+
+
+def index_path(dest_dir):
+    return os.path.join(dest_dir, INDEX_DIR, INDEX_FILE)
+
+
+def is_index_file(path):
+    # True for the files write_index puts into the output directory; path is
+    # relative to it. Anything else under search/ came from static/.
+    directory, name = os.path.split(path)
+    return directory == INDEX_DIR and (name in (INDEX_FILE, os.path.basename(CLIENT_SCRIPT))
+                                       or SHARD_FILE_PATTERN.fullmatch(name) is not None)
+
+
+def copy_fragments(source_dir, store):
+    # Used by the shard merge: every shard keeps the fragments of its own pages
+    if not os.path.isdir(source_dir):
+        return
+    os.makedirs(store.directory, exist_ok=True)
+    for name in os.listdir(source_dir):
+        if name.endswith(".json"):
+            shutil.copy2(os.path.join(source_dir, name), os.path.join(store.directory, name))
+
+
+# The store builds record page fragments in; None (the default) means no search index
+active = None
+
+
+def render_key():
+    # Pages carry the search box only while there is an index to search
+    return "search" if active is not None else ""
+
+
+def template_values():
+    return {"Search": SEARCH_BOX if active is not None else ""}
+
+
+def enable(directory=FRAGMENTS_DIR):
+    global active
+    active = FragmentStore(directory)
+    return active
+
+
+def disable():
+    global active
+    active = None
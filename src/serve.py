@@ -0,0 +1,418 @@
+import argparse
+import ctypes
+import ctypes.util
+import logging
+import mimetypes
+import os
+import select
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import stages
+from assets import sync_directory
+from build import collect_pages, current_build_key, generate_pages_recursive, load_template, render_page
+from depgraph import DependencyGraph
+from manifest import Manifest, MANIFEST_PATH, file_hash
+from main import add_logging_args, add_stage_args, enable_stages, setup_logging
+from publish import ChangeSet
+
+logger = logging.getLogger(__name__)
+
+LIVE_RELOAD_PATH = "/__livereload"
+LIVE_RELOAD_SCRIPT = (
+    '<script>new EventSource("' + LIVE_RELOAD_PATH + '").onmessage = function () { location.reload(); };</script>'
+)
+
+# inotify(7) constants
+IN_MODIFY = 0x002
+IN_ATTRIB = 0x004
+IN_CLOSE_WRITE = 0x008
+IN_MOVED_FROM = 0x040
+IN_MOVED_TO = 0x080
+IN_CREATE = 0x100
+IN_DELETE = 0x200
+IN_DELETE_SELF = 0x400
+IN_NONBLOCK = 0o4000
+WATCH_MASK = IN_MODIFY | IN_ATTRIB | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE | IN_DELETE_SELF
+
+
+class Inotify:
+    # Minimal ctypes binding: only used to sleep until something changes,
+    # the watcher still works out *what* changed by comparing snapshots
+    def __init__(self):
+        libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+        self._add_watch = libc.inotify_add_watch
+        self._add_watch.argtypes = [ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32]
+        self.fd = libc.inotify_init1(IN_NONBLOCK)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+
+    def watch(self, path):
+        # Watching the same path twice just updates the existing watch
+        self._add_watch(self.fd, os.fsencode(path), WATCH_MASK)
+
+    def wait(self, timeout):
+        # Returns True if any event arrived within timeout seconds
+        readable, _, _ = select.select([self.fd], [], [], timeout)
+        if not readable:
+            return False
+        try:
+            while os.read(self.fd, 64 * 1024):
+                pass
+        except BlockingIOError:
+            pass
+        return True
+
+    def close(self):
+        os.close(self.fd)
+
+
+def open_inotify():
+    if not sys.platform.startswith("linux"):
+        return None
+    try:
+        return Inotify()
+    except (OSError, AttributeError):
+        return None
+
+
+class Watcher:
+    def __init__(self, paths, interval=0.5, debounce=0.2, use_inotify=True):
+        """
+        inputs:
+        paths - files and directories to watch (directories recursively)
+        interval - seconds between scans when polling
+        debounce - how long things have to stay quiet before a burst of changes is reported
+        """
+        self.paths = paths
+        self.interval = interval
+        self.debounce = debounce
+        self.inotify = open_inotify() if use_inotify else None
+        self.state = self.snapshot()
+
+    def snapshot(self):
+        # Maps every watched file to (mtime, size), (re)arming inotify watches on the way
+        state = {}
+        stack = list(self.paths)
+        while stack:
+            path = stack.pop()
+            try:
+                st = os.stat(path)
+            except FileNotFoundError:
+                continue
+            if os.path.isdir(path):
+                if self.inotify is not None:
+                    self.inotify.watch(path)
+                with os.scandir(path) as entries:
+                    for entry in entries:
+                        if entry.is_dir():
+                            stack.append(entry.path)
+                        else:
+                            entry_stat = entry.stat()
+                            state[entry.path] = (entry_stat.st_mtime_ns, entry_stat.st_size)
+            else:
+                if self.inotify is not None:
+                    self.inotify.watch(path)
+                state[path] = (st.st_mtime_ns, st.st_size)
+        return state
+
+    def poll(self):
+        # Returns the set of paths added, modified or removed since the last call
+        new_state = self.snapshot()
+        changed = {path for path in new_state if self.state.get(path) != new_state[path]}
+        changed.update(path for path in self.state if path not in new_state)
+        self.state = new_state
+        return changed
+
+    def _sleep(self, timeout):
+        if self.inotify is not None:
+            self.inotify.wait(timeout)
+        else:
+            time.sleep(timeout)
+
+    def wait(self):
+        # Blocks until something changes, then keeps collecting until the
+        # burst settles down (editors often write a file several times)
+        while True:
+            if self.inotify is not None:
+                self.inotify.wait(None)
+            else:
+                time.sleep(self.interval)
+            changed = self.poll()
+            if changed:
+                break
+        while True:
+            self._sleep(self.debounce)
+            more = self.poll()
+            if not more:
+                return changed
+            changed |= more
+
+
+class SiteStore:
+    def __init__(self, root):
+        """
+        Keeps the built site in memory, keyed by url path ("/blog/tom/index.html").
+        version is bumped after every rebuild so live-reload clients can tell.
+        """
+        self.root = root
+        self.files = {}
+        self.version = 0
+        self.changed = threading.Condition()
+
+    def url_for(self, path):
+        return "/" + os.path.relpath(path, self.root).replace(os.sep, "/")
+
+    def load_all(self):
+        self.files = {}
+        for dir_path, _, file_names in os.walk(self.root):
+            for name in file_names:
+                self.refresh(os.path.join(dir_path, name))
+
+    def refresh(self, path):
+        url = self.url_for(path)
+        try:
+            with open(path, 'rb') as f:
+                self.files[url] = f.read()
+        except FileNotFoundError:
+            self.files.pop(url, None)
+
+    def lookup(self, url):
+        url = url.split("?", 1)[0].split("#", 1)[0]
+        for candidate in (url, url.rstrip("/") + "/index.html"):
+            if candidate in self.files:
+                return candidate, self.files[candidate]
+        return None, None
+
+    def notify(self):
+        with self.changed:
+            self.version += 1
+            self.changed.notify_all()
+
+
+class DevBuild:
+    def __init__(self, content_dir, static_dir, template_path, dest_dir, store, base_path="/",
+                 manifest_path=MANIFEST_PATH, compress=False):
+        # compress: keep the .gz (and .br) siblings of what a rebuild writes current, as ssg build does
+        self.content_dir = content_dir
+        self.static_dir = static_dir
+        self.template_path = template_path
+        self.dest_dir = dest_dir
+        self.store = store
+        self.base_path = base_path
+        self.manifest = Manifest.load(manifest_path)
+        self.compress = compress
+
+    def full_build(self):
+        sync_directory(self.static_dir, self.dest_dir)
+        self.update_images()
+        self.update_assets()
+        generate_pages_recursive(self.content_dir, self.template_path, self.dest_dir, self.base_path, self.manifest)
+        if self.compress:
+            import compress
+            compress.precompress(self.dest_dir)
+        self.store.load_all()
+
+    def refresh(self, changes):
+        for path in changes.written | changes.removed:
+            self.store.refresh(os.path.join(self.dest_dir, path))
+
+    def update_images(self):
+        # Rescans static/ and refreshes the variants that changed
+        catalog = stages.active("images")
+        if catalog is None:
+            return
+        image_changes = ChangeSet(self.dest_dir)
+        catalog.scan(self.static_dir)
+        catalog.publish(self.static_dir, self.dest_dir, changes=image_changes)
+        catalog.save()
+        self.refresh(image_changes)
+
+    def update_assets(self):
+        # Re-fingerprints static/ and copies what changed
+        if stages.active("fingerprint") is None:
+            return
+        import fingerprint
+        asset_changes = ChangeSet(self.dest_dir)
+        fingerprint.enable(self.static_dir).publish(self.static_dir, self.dest_dir, asset_changes)
+        self.refresh(asset_changes)
+
+    def render(self, pages, template, graph):
+        for content_path, dest_path in pages:
+            try:
+                refs, _, _ = render_page(content_path, self.template_path, dest_path, self.base_path, template)
+            except Exception as e:
+                # Keep serving the last good version while the page is broken
+                self.manifest.pages.pop(content_path, None)
+                logger.error("page failed src=%s error=%r", content_path, e)
+                continue
+            self.manifest.record(content_path, dest_path, file_hash(content_path), refs,
+                                 graph.assets_for(refs, dest_path))
+            self.store.refresh(dest_path)
+
+    def apply(self, changed):
+        # Rebuilds only what the changed paths affect
+        pages = dict(collect_pages(self.content_dir, self.dest_dir))
+        graph = DependencyGraph(self.dest_dir, self.template_path, pages.values())
+        template_changed = any(os.path.abspath(path) == os.path.abspath(self.template_path) for path in changed)
+        static_changed = any(is_under(path, self.static_dir) for path in changed)
+        content_changed = sorted(path for path in changed if is_under(path, self.content_dir) and path.endswith('.md'))
+
+        if static_changed:
+            sync_directory(self.static_dir, self.dest_dir)
+            for path in changed:
+                if is_under(path, self.static_dir):
+                    self.store.refresh(os.path.join(self.dest_dir, os.path.relpath(path, self.static_dir)))
+            self.update_images()
+            self.update_assets()
+
+        to_render = []
+        removed = False
+        if static_changed:
+            # Pages whose links or images point at a changed file, which covers
+            # new image sizes and fingerprinted names too
+            for path in changed:
+                if is_under(path, self.static_dir):
+                    asset = os.path.relpath(path, self.static_dir).replace(os.sep, "/")
+                    for content_path in graph.dependents(self.manifest, asset):
+                        if content_path in pages and content_path not in content_changed:
+                            to_render.append((content_path, pages[content_path]))
+        for content_path in content_changed:
+            if content_path in pages:
+                to_render.append((content_path, pages[content_path]))
+            elif content_path in self.manifest.pages:
+                dest_path = self.manifest.pages.pop(content_path)["dest"]
+                logger.info("remove page dest=%s reason=source-deleted src=%s", dest_path, content_path)
+                if os.path.exists(dest_path):
+                    os.remove(dest_path)
+                self.store.refresh(dest_path)
+                removed = True
+
+        build = current_build_key(self.template_path, self.base_path)
+        if build != self.manifest.build:
+            # The template, or the fingerprinted name of something it links to
+            reason = "template" if template_changed else "assets"
+            logger.info("%s changed, re-rendering pages=%d", reason, len(pages))
+            self.manifest.build = build
+            to_render = sorted(pages.items())
+        if to_render:
+            self.render(to_render, load_template(self.template_path, self.base_path), graph)
+
+        for content_path, url in graph.broken_references(self.manifest):
+            logger.warning("broken reference src=%s url=%s", content_path, url)
+        self.manifest.save()
+        if stages.active("search") is not None and (to_render or removed):
+            import search
+            index_changes = ChangeSet(self.dest_dir)
+            search.write_index(search.active, self.manifest, self.dest_dir, index_changes)
+            self.refresh(index_changes)
+        if self.compress:
+            import compress
+            compressed = ChangeSet(self.dest_dir)
+            compress.precompress(self.dest_dir, changes=compressed)
+            self.refresh(compressed)
+        self.store.notify()
+
+
+def is_under(path, directory):
+    path = os.path.abspath(path)
+    directory = os.path.abspath(directory)
+    return path == directory or path.startswith(directory + os.sep)
+
+
+def make_handler(store, live_reload):
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if live_reload and self.path == LIVE_RELOAD_PATH:
+                self.send_events()
+                return
+            url, body = store.lookup(self.path)
+            if body is None:
+                self.send_error(404, "File not found")
+                return
+            content_type = mimetypes.guess_type(url)[0] or "application/octet-stream"
+            if live_reload and content_type == "text/html":
+                body = body.replace(b"</body>", LIVE_RELOAD_SCRIPT.encode() + b"</body>", 1)
+            self.send_response(200)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(body)))
+            self.send_header("Cache-Control", "no-cache")
+            self.end_headers()
+            self.wfile.write(body)
+
+        def send_events(self):
+            # Server-sent events: one "reload" message per rebuild
+            self.send_response(200)
+            self.send_header("Content-Type", "text/event-stream")
+            self.send_header("Cache-Control", "no-cache")
+            self.end_headers()
+            seen = store.version
+            try:
+                while True:
+                    with store.changed:
+                        store.changed.wait_for(lambda: store.version != seen, timeout=15)
+                        current = store.version
+                    if current != seen:
+                        seen = current
+                        self.wfile.write(b"data: reload\n\n")
+                    else:
+                        # Keep-alive comment, also notices closed tabs
+                        self.wfile.write(b": ping\n\n")
+                    self.wfile.flush()
+            except (BrokenPipeError, ConnectionResetError):
+                pass
+
+        def log_message(self, format, *args):
+            pass
+
+    return Handler
+
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(description="Serve docs/ from memory, optionally rebuilding on change")
+    parser.add_argument("--watch", action="store_true",
+                        help="watch content/, static/ and template.html and rebuild what changed")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8888)
+    parser.add_argument("--poll", action="store_true",
+                        help="poll for changes even where inotify is available")
+    add_stage_args(parser)
+    add_logging_args(parser)
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(sys.argv[1:] if argv is None else argv)
+    setup_logging(args.log_level)
+    # The same stages as ssg build, so serving doesn't re-render (and overwrite) what the last
+    # build wrote. Edits usually touch a block or two, everything else renders from the cache.
+    # The image variants and fingerprinted copies are published by full_build.
+    enable_stages(args, "docs", publish=False)
+    store = SiteStore("docs")
+    builder = DevBuild("content", "static", "template.html", "docs", store, compress=args.compress)
+    builder.full_build()
+
+    server = ThreadingHTTPServer((args.host, args.port), make_handler(store, args.watch))
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    logger.info("serving root=docs url=http://%s:%d/", args.host, args.port)
+
+    try:
+        if not args.watch:
+            threading.Event().wait()
+        watcher = Watcher(["content", "static", "template.html"], use_inotify=not args.poll)
+        logger.info("watching mode=%s", "inotify" if watcher.inotify else "polling")
+        while True:
+            changed = watcher.wait()
+            logger.info("changed paths=%s", ",".join(sorted(changed)))
+            builder.apply(changed)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
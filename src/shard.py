@@ -0,0 +1,154 @@
+import argparse
+import filecmp
+import hashlib
+import logging
+import os
+import sys
+
+from assets import copy_file
+from manifest import Manifest, MANIFEST_PATH
+from publish import ChangeSet, CHANGES_PATH
+
+logger = logging.getLogger(__name__)
+
+SHARDS_DIR = os.path.join(".ssg", "shards")
+
+
+def parse_shard(text):
+    # "2/4" -> (2, 4); shards are numbered from 1
+    index, sep, count = text.partition("/")
+    try:
+        index, count = int(index), int(count)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"expected i/N, e.g. 1/4, got {text!r}") from None
+    if not sep or count < 1:
+        raise argparse.ArgumentTypeError(f"expected i/N with N at least 1, got {text!r}")
+    if not 1 <= index <= count:
+        raise argparse.ArgumentTypeError(f"shard must be between 1/{count} and {count}/{count}, got {text!r}")
+    return index, count
+
+
+def shard_of(rel_path, count):
+    # Stable across machines and Python runs, unlike hash()
+    digest = hashlib.sha1(rel_path.replace(os.sep, "/").encode()).digest()
+    return int.from_bytes(digest[:8], "big") % count + 1
+
+
+def select_pages(pages, content_dir, shard):
+    # The (source, destination) pairs one shard renders
+    index, count = shard
+    return [(src, dest) for src, dest in pages if shard_of(os.path.relpath(src, content_dir), count) == index]
+
+
+def shard_dir(shard):
+    index, count = shard
+    return os.path.join(SHARDS_DIR, f"{index}-of-{count}")
+
+
+def owns_static(shard):
+    # Static files are copied by a single shard so no two shards produce the same file
+    return shard[0] == 1
+
+
+def merge_shards(count, dest_dir="docs", manifest_path=MANIFEST_PATH, shards_dir=SHARDS_DIR, changes=None,
+                 fragments_dir=None):
+    """
+    Combines the output of shards 1/count .. count/count into dest_dir:
+    files that differ from what dest_dir holds are copied in, files no shard
+    produced are removed, and the shard manifests are merged into one with
+    destinations pointing into dest_dir. If the shards were built with search,
+    their page fragments are collected in fragments_dir and the site's search
+    index is written, precompressed if the shards' output was. fragments_dir
+    defaults to search.FRAGMENTS_DIR.
+    Returns (copied, unchanged, removed).
+    """
+    # main imports this module for --shard; the stages are only needed for merging
+    import compress
+    import search
+
+    shard_fragments = [os.path.join(shards_dir, f"{index}-of-{count}", "search") for index in range(1, count + 1)]
+    indexed = any(os.path.isdir(path) for path in shard_fragments)
+    produced = {}
+    manifests = []
+    for index in range(1, count + 1):
+        root = os.path.join(shards_dir, f"{index}-of-{count}")
+        shard_docs = os.path.join(root, "docs")
+        if not os.path.isdir(shard_docs):
+            raise FileNotFoundError(f"shard {index}/{count} has not been built: {shard_docs} is missing")
+        for dir_path, _, file_names in os.walk(shard_docs):
+            for name in file_names:
+                path = os.path.join(dir_path, name)
+                rel_path = os.path.relpath(path, shard_docs)
+                if rel_path in produced:
+                    raise ValueError(f"{rel_path} was produced by more than one shard")
+                produced[rel_path] = path
+        manifests.append((shard_docs, Manifest.load(os.path.join(root, "manifest.json"))))
+    # Everything is checked before dest_dir is touched, so a failed merge leaves the site as it was
+    builds = {manifest.build for _, manifest in manifests}
+    if len(builds) != 1:
+        raise ValueError("shards were built with different templates, base paths or generator versions")
+
+    copied = unchanged = 0
+    for rel_path, path in sorted(produced.items()):
+        target = os.path.join(dest_dir, rel_path)
+        if os.path.isfile(target) and filecmp.cmp(path, target, shallow=False):
+            unchanged += 1
+            continue
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        copy_file(path, target)
+        copied += 1
+        if changes is not None:
+            changes.wrote(target)
+
+    removed = 0
+    for dir_path, _, file_names in os.walk(dest_dir):
+        for name in file_names:
+            path = os.path.join(dir_path, name)
+            rel_path = os.path.relpath(path, dest_dir)
+            if rel_path not in produced and not (indexed and search.is_index_file(rel_path)):
+                logger.info("remove file dest=%s reason=not-in-any-shard", path)
+                os.remove(path)
+                removed += 1
+                if changes is not None:
+                    changes.remove(path)
+
+    merged = Manifest(manifest_path, build=builds.pop())
+    for shard_docs, manifest in manifests:
+        for src_path, entry in manifest.pages.items():
+            dest_path = os.path.join(dest_dir, os.path.relpath(entry["dest"], shard_docs))
+            merged.pages[src_path] = dict(entry, dest=dest_path)
+    merged.save()
+    if indexed:
+        store = search.FragmentStore(fragments_dir or search.FRAGMENTS_DIR)
+        for path in shard_fragments:
+            search.copy_fragments(path, store)
+        search.write_index(store, merged, dest_dir, changes)
+        if any(compress.is_compressed(rel_path) for rel_path in produced):
+            compress.precompress(os.path.join(dest_dir, search.INDEX_DIR), changes=changes)
+
+    logger.info("merged shards=%d copied=%d unchanged=%d removed=%d", count, copied, unchanged, removed)
+    return copied, unchanged, removed
+
+
+def parse_args(argv):
+    # main imports this module for --shard, so import it lazily here
+    from main import add_logging_args
+
+    parser = argparse.ArgumentParser(prog="ssg merge", description="Combine the output of a sharded build into docs/")
+    parser.add_argument("count", type=int, help="number of shards the build was split into")
+    add_logging_args(parser)
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    from main import setup_logging
+
+    args = parse_args(sys.argv[1:] if argv is None else argv)
+    setup_logging(args.log_level)
+    changes = ChangeSet("docs")
+    merge_shards(args.count, changes=changes)
+    changes.save(CHANGES_PATH)
+
+
+if __name__ == "__main__":
+    main()
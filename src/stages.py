@@ -0,0 +1,19 @@
+import sys
+
+# The optional build stages (search, images, fingerprint, compress, minify,
+# parsecache, fragcache) are modules with an `active` setting that is off until
+# their enable() is called. They are imported by whatever enables them
+# (main.enable_stages), so a build that leaves a stage off never loads it, and
+# `import main` loads none of them. Code that needs to know whether a stage is
+# on, or uses one that is, asks here instead of importing it.
+
+
+def module(name):
+    # The stage's module if something imported it, otherwise None
+    return sys.modules.get(name)
+
+
+def active(name):
+    # The stage's `active` setting; None for a stage that was never imported
+    stage = sys.modules.get(name)
+    return stage.active if stage is not None else None
@@ -0,0 +1,77 @@
+import re
+
+import stages
+from htmlnode import HTMLNode, iter_html, write_chunks
+
+SLOT_PATTERN = re.compile(r'\{\{\s*(\w+)\s*\}\}')
+
+
+def rewrite_base_path(html, base_path):
+    # Points root-relative href/src attributes at the site's base path, and
+    # at the fingerprinted copy of assets that have one (fingerprint.active)
+    asset_map = stages.active("fingerprint")
+    if asset_map is not None:
+        html = asset_map.rewrite_attributes(html)
+    return html.replace('href="/', f'href="{base_path}').replace('src="/', f'src="{base_path}')
+
+
+class Template:
+    def __init__(self, chunks, slots):
+        """
+        inputs:
+        chunks - the static pieces of the template, one more than there are slots
+        slots - a list of (name, raw_text) tuples for each {{ Name }} placeholder,
+                raw_text is emitted unchanged when no value is given for the slot
+        """
+        self.chunks = chunks
+        self.slots = slots
+
+    @classmethod
+    def compile(cls, text, base_path="/", values=None):
+        # Base path rewriting is done here once instead of over every rendered page;
+        # urls inside the content are rewritten when their nodes are created.
+        # So is minifying the template's own markup (minify.active).
+        # `values` fills the slots that are the same on every page (such as
+        # search.template_values()) first, so their urls are rewritten too.
+        if values:
+            text = SLOT_PATTERN.sub(lambda match: values.get(match.group(1), match.group()), text)
+        text = rewrite_base_path(text, base_path)
+        if stages.active("minify"):
+            text = stages.module("minify").minify_markup(text)
+        chunks = []
+        slots = []
+        last = 0
+        for match in SLOT_PATTERN.finditer(text):
+            chunks.append(text[last:match.start()])
+            slots.append((match.group(1), match.group()))
+            last = match.end()
+        chunks.append(text[last:])
+        return cls(chunks, slots)
+
+    @classmethod
+    def load(cls, path, base_path="/", values=None):
+        with open(path, 'r') as f:
+            return cls.compile(f.read(), base_path, values)
+
+    def iter_chunks(self, **values):
+        # Slot values can be plain strings, html nodes or iterables of html
+        # chunks; the last two are streamed
+        for chunk, (name, raw) in zip(self.chunks, self.slots):
+            yield chunk
+            value = values.get(name, raw)
+            if isinstance(value, str):
+                yield value
+            elif isinstance(value, HTMLNode):
+                yield from iter_html(value)
+            else:
+                yield from value
+        yield self.chunks[-1]
+
+    def write(self, sink, **values):
+        write_chunks(sink, self.iter_chunks(**values))
+
+    def render(self, **values):
+        return "".join(self.iter_chunks(**values))
+
+    def __repr__(self):
+        return f"Template(chunks={len(self.chunks)}, slots={[name for name, _ in self.slots]})"
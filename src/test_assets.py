@@ -0,0 +1,94 @@
+import os
+import shutil
+import unittest
+
+import search
+from assets import copy_file, sync_directory
+from fixtures import TempDirTestCase
+from publish import ChangeSet
+
+
+class TestSyncDirectory(TempDirTestCase):
+    def setUp(self):
+        super().setUp()
+        self.src = os.path.join(self.root, "static")
+        self.dest = os.path.join(self.root, "docs")
+        os.makedirs(os.path.join(self.src, "images"))
+        self.write(os.path.join(self.src, "index.css"), "body { color: red; }")
+        self.write(os.path.join(self.src, "images", "a.png"), "not really a png")
+
+    def read(self, path):
+        with open(path) as f:
+            return f.read()
+
+    def test_first_sync_copies_everything(self):
+        self.assertEqual(sync_directory(self.src, self.dest), (2, 0, 0))
+        self.assertEqual(self.read(os.path.join(self.dest, "images", "a.png")), "not really a png")
+
+    def test_unchanged_files_are_skipped(self):
+        sync_directory(self.src, self.dest)
+        self.assertEqual(sync_directory(self.src, self.dest), (0, 2, 0))
+        self.assertEqual(sync_directory(self.src, self.dest, checksum=True), (0, 2, 0))
+
+    def test_changed_file_is_copied(self):
+        sync_directory(self.src, self.dest)
+        self.write(os.path.join(self.src, "index.css"), "body { color: blue; }")
+        self.assertEqual(sync_directory(self.src, self.dest), (1, 1, 0))
+        self.assertEqual(self.read(os.path.join(self.dest, "index.css")), "body { color: blue; }")
+
+    def test_removed_files_go_but_html_stays(self):
+        sync_directory(self.src, self.dest)
+        self.write(os.path.join(self.dest, "index.html"), "<p>generated</p>")
+        os.remove(os.path.join(self.src, "images", "a.png"))
+        self.assertEqual(sync_directory(self.src, self.dest), (0, 1, 1))
+        self.assertFalse(os.path.exists(os.path.join(self.dest, "images", "a.png")))
+        self.assertTrue(os.path.exists(os.path.join(self.dest, "index.html")))
+
+    def enable_search(self):
+        search.enable(os.path.join(self.root, "fragments"))
+        self.addCleanup(search.disable)
+
+    def test_search_index_stays_while_search_is_on(self):
+        self.enable_search()
+        sync_directory(self.src, self.dest)
+        os.makedirs(os.path.join(self.dest, "search"))
+        self.write(os.path.join(self.dest, "search", "index.json"), "{}")
+        self.assertEqual(sync_directory(self.src, self.dest), (0, 2, 0))
+        self.assertTrue(os.path.exists(os.path.join(self.dest, "search", "index.json")))
+        search.disable()
+        self.assertEqual(sync_directory(self.src, self.dest), (0, 2, 1))
+        self.assertFalse(os.path.exists(os.path.join(self.dest, "search", "index.json")))
+
+    def test_static_search_files_are_not_index_files(self):
+        # Only the index write_index generates is kept; static/search/ and static/**/search/ are plain static files
+        self.enable_search()
+        for directory in (os.path.join(self.src, "search"), os.path.join(self.src, "docs", "search")):
+            os.makedirs(directory)
+            self.write(os.path.join(directory, "help.json"), "{}")
+            self.write(os.path.join(directory, "a.json"), "{}")
+        sync_directory(self.src, self.dest)
+        self.write(os.path.join(self.dest, "search", "b.json"), "{}")
+        shutil.rmtree(os.path.join(self.src, "search"))
+        shutil.rmtree(os.path.join(self.src, "docs"))
+        self.assertEqual(sync_directory(self.src, self.dest), (0, 2, 3))
+        self.assertEqual(sorted(os.listdir(os.path.join(self.dest, "search"))), ["a.json", "b.json"])
+
+    def test_copy_file_preserves_mtime(self):
+        src_path = os.path.join(self.src, "index.css")
+        dest_path = os.path.join(self.root, "copy.css")
+        copy_file(src_path, dest_path)
+        self.assertEqual(self.read(dest_path), "body { color: red; }")
+        self.assertEqual(os.stat(src_path).st_mtime_ns, os.stat(dest_path).st_mtime_ns)
+
+    def test_changes_are_recorded(self):
+        sync_directory(self.src, self.dest)
+        os.remove(os.path.join(self.src, "index.css"))
+        self.write(os.path.join(self.src, "images", "a.png"), "a different png")
+        changes = ChangeSet(self.dest)
+        sync_directory(self.src, self.dest, changes=changes)
+        self.assertEqual(changes.written, {"images/a.png"})
+        self.assertEqual(changes.removed, {"index.css"})
+
+
+if __name__ == "__main__":
+    unittest.main()
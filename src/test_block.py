@@ -1,7 +1,9 @@
+import io
 import unittest
 from src.htmlnode import HTMLNode, LeafNode, ParentNode, text_node_to_html_node, extract_markdown_images, extract_markdown_links, \
                          split_nodes_image, split_nodes_link, text_to_textnodes
-from block import markdown_to_blocks, block_to_block_type, BlockType, markdown_to_html_node, clean_block_text, text_to_children, extract_title
+from block import markdown_to_blocks, block_to_block_type, BlockType, markdown_to_html_node, clean_block_text, text_to_children, extract_title, \
+                  classify_block, iter_blocks, parse_markdown
 from textnode import TextNode, TextType
 import re
 
@@ -32,3 +34,31 @@ class TestHtmlNode(unittest.TestCase):
         md = "# My Title\n\nThis is some content.\n\n## Subtitle\n\nMore content."
         title = extract_title(md)
         self.assertEqual(title, "My Title")
+
+    def test_classify_block_heading_levels(self):
+        self.assertEqual(classify_block("# One"), (BlockType.HEADING, 1))
+        self.assertEqual(classify_block("### Three"), (BlockType.HEADING3, 3))
+        self.assertEqual(classify_block("###### Six"), (BlockType.HEADING6, 6))
+        self.assertEqual(classify_block("####### Seven"), (BlockType.PARAGRAPH, 0))
+        self.assertEqual(classify_block("#NoSpace"), (BlockType.PARAGRAPH, 0))
+        self.assertEqual(classify_block("# Heading\nsecond line"), (BlockType.PARAGRAPH, 0))
+
+    def test_classify_block_multiline(self):
+        self.assertEqual(classify_block("> one\n>\n> three"), (BlockType.QUOTE, 0))
+        self.assertEqual(classify_block("> one\nnot quoted"), (BlockType.PARAGRAPH, 0))
+        self.assertEqual(classify_block("- a\n- b\n-c"), (BlockType.PARAGRAPH, 0))
+        self.assertEqual(classify_block("1. a\n10. b"), (BlockType.ORDERED_LIST, 0))
+        self.assertEqual(classify_block("```"), (BlockType.PARAGRAPH, 0))
+
+    def test_iter_blocks_keeps_fenced_code_together(self):
+        md = io.StringIO("# Title\n\n```\nline one\n\nline three\n```\n\nafter\n")
+        self.assertEqual(
+            list(iter_blocks(md)),
+            ["# Title", "```\nline one\n\nline three\n```", "after"],
+        )
+
+    def test_parse_markdown_returns_title(self):
+        html_node, title = parse_markdown(io.StringIO("Intro\n\n# My Title\n\n## Sub\n"))
+        self.assertEqual(title, "My Title")
+        self.assertEqual(len(html_node.children), 3)
+        self.assertIsNone(parse_markdown(io.StringIO("no heading here"))[1])
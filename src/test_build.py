@@ -0,0 +1,137 @@
+import multiprocessing
+import os
+import unittest
+from unittest import mock
+
+import build
+import fingerprint
+import fragcache
+import images
+import minify
+import parsecache
+import pngcodec
+import search
+from build import collect_pages, generate_pages_recursive, pipeline_pages, render_pages, write_atomically
+from fixtures import TempDirTestCase
+from publish import ChangeSet
+
+
+class TestPipeline(TempDirTestCase):
+    def setUp(self):
+        super().setUp()
+        self.content = os.path.join(self.root, "content")
+        self.template = self.write("template.html", "<title>{{ Title }}</title><article>{{ Content }}</article>")
+        for n in range(40):
+            self.write(f"content/blog/post{n:02}.md",
+                       f"# Post {n}\n\nSome **bold** [link](/blog/post{n + 1:02})\n\n- one\n- two")
+
+    def jobs(self, dest):
+        return [(src, dest_path, None) for src, dest_path in collect_pages(self.content, dest)]
+
+    def read_all(self, jobs):
+        outputs = []
+        for _, dest_path, _ in jobs:
+            with open(dest_path, 'rb') as f:
+                outputs.append(f.read())
+        return outputs
+
+    def test_matches_serial_output(self):
+        serial = self.jobs(os.path.join(self.root, "serial"))
+        list(render_pages(serial, self.template, "/site/"))
+        for workers in (1, 2):
+            piped = self.jobs(os.path.join(self.root, f"piped-{workers}"))
+            results = list(pipeline_pages(piped, self.template, "/site/", workers, depth=4))
+            self.assertEqual([job for job, _, _, _ in results], piped)
+            self.assertEqual(self.read_all(piped), self.read_all(serial))
+
+    def test_errors_keep_their_place(self):
+        with open(os.path.join(self.content, "blog", "post05.md"), 'w') as f:
+            f.write("no title")
+        jobs = self.jobs(os.path.join(self.root, "docs"))
+        jobs.insert(3, (os.path.join(self.content, "missing.md"), os.path.join(self.root, "docs", "m.html"), None))
+        results = list(pipeline_pages(jobs, self.template, "/", depth=2))
+        failed = [n for n, (_, _, _, error) in enumerate(results) if error is not None]
+        self.assertEqual(failed, [3, 6])
+        self.assertIsInstance(results[3][3], FileNotFoundError)
+        self.assertIsInstance(results[6][3], ValueError)
+        self.assertEqual(results[0][1], ["/blog/post01"])
+
+
+class TestSpawnedWorkers(TempDirTestCase):
+    def setUp(self):
+        super().setUp()
+        self.content = os.path.join(self.root, "content")
+        static = os.path.join(self.root, "static")
+        self.template = self.write("template.html",
+                                   '<link href="/index.css" />\n{{ Search }}\n<article>{{ Content }}</article>\n')
+        self.write("static/index.css", "body {}")
+        self.write("static/a.png", pngcodec.encode(600, 1, 1, [bytes(600)]))
+        for n in range(6):
+            self.write(f"content/post{n}.md", f"# Post {n}\n\n![a](/a.png) and [style](/index.css)\n\n- one\n- two")
+        # Every stage a worker has to know about is on
+        images.enable(os.path.join(self.root, "images", "catalog.json")).scan(static)
+        fingerprint.enable(static)
+        minify.enable()
+        for stage in (images, fingerprint, minify, search, parsecache, fragcache):
+            self.addCleanup(stage.disable)
+
+    def build(self, name, render, **kwargs):
+        # Html and search fragments of one build, with caches and fragments of its own
+        search.enable(os.path.join(self.root, name, "fragments"))
+        parsecache.enable(os.path.join(self.root, name, "parse"))
+        fragcache.enable()
+        jobs = [(src, dest, None) for src, dest in collect_pages(self.content, os.path.join(self.root, name, "docs"))]
+        self.assertEqual([error for _, _, _, error in render(jobs, self.template, "/site/", **kwargs)],
+                         [None] * len(jobs))
+        outputs = []
+        for src, dest, _ in jobs:
+            with open(dest) as f:
+                outputs.append((f.read(), search.active.get(src)))
+        return outputs
+
+    def test_matches_serial_output(self):
+        serial = self.build("serial", render_pages)
+        html, fragment = serial[0]
+        self.assertIn(f'href="/site/{fingerprint.active.names["index.css"]}"', html)
+        self.assertIn("srcset=", html)
+        self.assertIn('<script src="/site/search/search.js"', html)
+        self.assertNotIn("</li>\n", html)
+        self.assertIsNotNone(fragment)
+        with mock.patch.object(build, "POOL_CONTEXT", multiprocessing.get_context("spawn")):
+            for render in (render_pages, pipeline_pages):
+                self.assertEqual(self.build(render.__name__, render, workers=2), serial)
+
+
+class TestPublishing(TempDirTestCase):
+    def setUp(self):
+        super().setUp()
+        self.content = os.path.join(self.root, "content")
+        self.dest = os.path.join(self.root, "docs")
+        self.template = os.path.join(self.root, "template.html")
+        os.makedirs(self.content)
+        self.write(self.template, "{{ Content }}")
+        self.write(os.path.join(self.content, "a.md"), "# A")
+        self.write(os.path.join(self.content, "b.md"), "# B")
+
+    def test_identical_output_is_not_rewritten(self):
+        path = os.path.join(self.dest, "page.html")
+        self.assertTrue(write_atomically(path, lambda f: f.write("one")))
+        os.utime(path, ns=(0, 0))
+        self.assertFalse(write_atomically(path, lambda f: f.write("one")))
+        self.assertEqual(os.stat(path).st_mtime_ns, 0)
+        self.assertTrue(write_atomically(path, lambda f: f.write("two")))
+        self.assertEqual(os.listdir(self.dest), ["page.html"])
+
+    def test_changes_list_only_what_differs(self):
+        generate_pages_recursive(self.content, self.template, self.dest, "/")
+        # An edited template forces every page to render, but only b.html comes out different
+        self.write(self.template, "{{Content}}")
+        self.write(os.path.join(self.content, "b.md"), "# B!")
+        changes = ChangeSet(self.dest)
+        self.assertEqual(generate_pages_recursive(self.content, self.template, self.dest, "/", changes=changes),
+                         (2, 0))
+        self.assertEqual(changes.written, {"b.html"})
+
+
+if __name__ == "__main__":
+    unittest.main()
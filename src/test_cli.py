@@ -0,0 +1,79 @@
+import os
+import subprocess
+import sys
+import unittest
+
+from fixtures import TempDirTestCase
+
+SRC = os.path.dirname(os.path.abspath(__file__))
+PARSER_MODULES = ("block", "htmlnode", "textnode", "template", "concurrent.futures.process")
+STAGE_MODULES = ("search", "images", "fingerprint", "compress", "minify", "parsecache", "fragcache")
+# Import time allowed for the modules of this repo that `import main` loads,
+# the best of IMPORT_RUNS runs. The standard library modules they import are
+# left out: their time varies too much from one machine (and run) to the next.
+IMPORT_BUDGET_US = 30_000
+IMPORT_RUNS = 3
+OWN_MODULES = {name[:-3] for name in os.listdir(SRC) if name.endswith(".py")}
+
+
+def run_python(code, cwd=SRC, *args):
+    return subprocess.run([sys.executable, *args, "-c", code], cwd=cwd, capture_output=True, text=True,
+                          env={**os.environ, "PYTHONPATH": SRC}, check=True)
+
+
+def loaded_modules(code, cwd=SRC, modules=PARSER_MODULES):
+    check = code + f"\nimport sys; print(','.join(m for m in {modules!r} if m in sys.modules))"
+    # The check prints last, after anything the code itself printed
+    return run_python(check, cwd).stdout.rstrip("\n").split("\n")[-1]
+
+
+def own_import_time_us(code):
+    # Sum of the self times -X importtime reports for this repo's modules
+    total = 0
+    for line in run_python(code, SRC, "-X", "importtime").stderr.splitlines():
+        self_us, _, name = line.removeprefix("import time:").split("|")
+        if name.strip() in OWN_MODULES:
+            total += int(self_us)
+    return total
+
+
+class TestStartup(unittest.TestCase):
+    def test_main_import_budget(self):
+        # main is what `ssg build` loads before it looks at a single page
+        self.assertLess(min(own_import_time_us("import main") for _ in range(IMPORT_RUNS)), IMPORT_BUDGET_US)
+
+    def test_entry_points_do_not_import_parser(self):
+        self.assertEqual(loaded_modules("import cli"), "")
+        self.assertEqual(loaded_modules("import main"), "")
+
+    def test_main_does_not_import_stages(self):
+        # The stages are imported when they are enabled
+        self.assertEqual(loaded_modules("import main", modules=STAGE_MODULES), "")
+
+
+class TestBuildImports(TempDirTestCase):
+    def test_noop_build_does_not_import_parser(self):
+        os.makedirs(os.path.join(self.root, "static"))
+        self.write(os.path.join("content", "index.md"), "# Home\n\nhello")
+        self.write("template.html", "{{ Content }}")
+        build = "import cli; cli.main(['build', '--log-level', 'error'])"
+        self.assertEqual(loaded_modules(build, self.root), "block,htmlnode,textnode,template")
+        self.assertTrue(os.path.exists(os.path.join(self.root, "docs", "index.html")))
+        self.assertEqual(loaded_modules(build, self.root), "")
+
+    def test_build_without_stages_does_not_import_them(self):
+        self.write(os.path.join("static", "index.css"), "body {}")
+        self.write(os.path.join("static", "images", "a.png"), b"png")
+        self.write(os.path.join("content", "index.md"), "# Home\n\n## Links\n\n![a](/images/a.png) [css](/index.css)")
+        self.write("template.html", '<link href="/index.css" />{{ Search }}{{ Content }}')
+        flags = ["--no-search", "--no-images", "--no-fingerprint", "--no-compress", "--cache-size", "0",
+                 "--parse-cache-size", "0"]
+        for extra in ([], ["--clean", "--jobs", "2"]):
+            build = f"import cli; cli.main(['build', '--log-level', 'error', *{flags + extra!r}])"
+            self.assertEqual(loaded_modules(build, self.root, STAGE_MODULES), "")
+        with open(os.path.join(self.root, "docs", "index.html")) as f:
+            self.assertIn('<img src="/images/a.png">a</img>', f.read())
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,64 @@
+import gzip
+import os
+import unittest
+from unittest import mock
+
+import compress
+from compress import is_compressed, precompress
+from fixtures import TempDirTestCase
+from publish import ChangeSet
+
+
+class TestPrecompress(TempDirTestCase):
+    def setUp(self):
+        super().setUp()
+        self.dest = self.root
+        self.write("index.html", "<p>home</p>" * 50)
+        self.write("blog/post.html", "<p>post</p>" * 50)
+        self.write("index.css", "body { color: red; }")
+        self.write("images/a.png", "png")
+
+    def gunzip(self, name):
+        with gzip.open(os.path.join(self.dest, name), 'rt') as f:
+            return f.read()
+
+    def test_siblings(self):
+        self.assertEqual(precompress(self.dest), (3, 0, 0))
+        self.assertEqual(self.gunzip("blog/post.html.gz"), "<p>post</p>" * 50)
+        self.assertFalse(os.path.exists(os.path.join(self.dest, "images", "a.png.gz")))
+        # Same input, same bytes: gzip's timestamp is left out
+        with open(os.path.join(self.dest, "index.css.gz"), 'rb') as f:
+            self.assertEqual(f.read(), gzip.compress(b"body { color: red; }", compress.GZIP_LEVEL, mtime=0))
+
+    def test_current_siblings_are_kept(self):
+        precompress(self.dest)
+        self.write("index.html", "<p>changed</p>")
+        os.remove(os.path.join(self.dest, "blog", "post.html"))
+        changes = ChangeSet(self.dest)
+        with mock.patch("compress.compress_file", wraps=compress.compress_file) as compress_file:
+            self.assertEqual(precompress(self.dest, workers=1, changes=changes), (1, 1, 1))
+        compress_file.assert_called_once_with(os.path.join(self.dest, "index.html"), [".gz"])
+        self.assertEqual(self.gunzip("index.html.gz"), "<p>changed</p>")
+        self.assertEqual(changes.written, {"index.html.gz"})
+        self.assertEqual(changes.removed, {"blog/post.html.gz"})
+
+    def test_brotli_when_installed(self):
+        precompress(self.dest)
+        fake = mock.Mock()
+        fake.compress.side_effect = lambda data, quality: b"br:" + data
+        with mock.patch.object(compress, "brotli", fake), \
+                mock.patch("compress.compress_file", wraps=compress.compress_file) as compress_file:
+            self.assertEqual(precompress(self.dest, workers=1), (3, 0, 0))
+        # Files that have a current .gz only get the .br added
+        self.assertEqual([call.args[1] for call in compress_file.call_args_list], [[".br"]] * 3)
+        with open(os.path.join(self.dest, "index.css.br"), 'rb') as f:
+            self.assertEqual(f.read(), b"br:body { color: red; }")
+
+    def test_is_compressed(self):
+        self.assertTrue(is_compressed("docs/index.html.gz"))
+        self.assertTrue(is_compressed("docs/search/a.json.br"))
+        self.assertFalse(is_compressed("docs/archive.tar.gz"))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,45 @@
+import os
+import random
+import tempfile
+import unittest
+
+from block import markdown_to_html_node
+from corpus import make_page, make_site, parse_mix
+
+
+class TestCorpus(unittest.TestCase):
+    def test_same_seed_same_page(self):
+        self.assertEqual(make_page(random.Random(3), 30), make_page(random.Random(3), 30))
+        self.assertNotEqual(make_page(random.Random(3), 30), make_page(random.Random(4), 30))
+
+    def test_pages_parse(self):
+        rng = random.Random(0)
+        for _ in range(20):
+            markdown_to_html_node(make_page(rng, 40))
+
+    def test_mix_limits_block_kinds(self):
+        page = make_page(random.Random(0), 20, parse_mix("code=1"))
+        blocks = page.strip().split("\n\n")
+        self.assertTrue(all(block.startswith("```") for block in blocks[1:]))
+
+    def test_unknown_kind(self):
+        with self.assertRaises(ValueError):
+            parse_mix("table=1")
+
+    def test_site_is_reproducible(self):
+        def read_site(seed):
+            with tempfile.TemporaryDirectory() as root:
+                make_site(root, pages=5, blocks=10, seed=seed)
+                files = {}
+                for dir_path, _, file_names in os.walk(root):
+                    for name in file_names:
+                        path = os.path.join(dir_path, name)
+                        with open(path) as f:
+                            files[os.path.relpath(path, root)] = f.read()
+                return files
+
+        self.assertEqual(read_site(1), read_site(1))
+
+
+if __name__ == "__main__":
+    unittest.main()
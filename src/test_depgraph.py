@@ -0,0 +1,66 @@
+import os
+import unittest
+
+from block import generate_pages_recursive
+from depgraph import reference_target
+from fixtures import TempDirTestCase
+from manifest import Manifest
+
+
+class TestReferenceTarget(unittest.TestCase):
+    def test_targets(self):
+        self.assertEqual(reference_target("/images/a.png", "blog/tom/index.html"), "images/a.png")
+        self.assertEqual(reference_target("../a.png", "blog/tom/index.html"), "blog/a.png")
+        self.assertEqual(reference_target("/blog/tom#top", "index.html"), "blog/tom")
+        self.assertEqual(reference_target("/", "blog/tom/index.html"), "")
+
+    def test_external_and_anchors(self):
+        self.assertIsNone(reference_target("https://example.com/a", "index.html"))
+        self.assertIsNone(reference_target("//cdn.example.com/a.js", "index.html"))
+        self.assertIsNone(reference_target("mailto:me@example.com", "index.html"))
+        self.assertIsNone(reference_target("#section", "index.html"))
+
+
+class TestDependencies(TempDirTestCase):
+    def setUp(self):
+        super().setUp()
+        self.content = os.path.join(self.root, "content")
+        self.dest = os.path.join(self.root, "docs")
+        self.template = os.path.join(self.root, "template.html")
+        os.makedirs(os.path.join(self.content, "blog"))
+        os.makedirs(os.path.join(self.dest, "images"))
+        self.manifest = Manifest()
+        self.write(self.template, "{{ Content }}")
+        self.write(os.path.join(self.dest, "images", "a.png"), "png")
+        self.write(os.path.join(self.content, "index.md"), "# Home\n\n![a](/images/a.png) [post](/blog/post)")
+        self.write(os.path.join(self.content, "blog", "post.md"), "# Post\n\n[home](/) [site](https://example.com)")
+
+    def build(self):
+        return generate_pages_recursive(self.content, self.template, self.dest, "/", self.manifest)
+
+    def test_records_refs_and_assets(self):
+        self.build()
+        entry = self.manifest.pages[os.path.join(self.content, "index.md")]
+        self.assertEqual(entry["refs"], ["/images/a.png", "/blog/post"])
+        self.assertEqual(list(entry["assets"]), ["images/a.png"])
+        self.assertNotIn("assets", self.manifest.pages[os.path.join(self.content, "blog", "post.md")])
+
+    def test_asset_change_rebuilds_only_dependents(self):
+        self.build()
+        self.write(os.path.join(self.dest, "images", "a.png"), "bigger png")
+        self.assertEqual(self.build(), (1, 1))
+        self.assertEqual(self.build(), (0, 2))
+
+    def test_broken_references_are_logged(self):
+        self.write(os.path.join(self.content, "blog", "post.md"), "# Post\n\n[gone](/blog/gone) ![x](missing.png)")
+        with self.assertLogs("build", "WARNING") as logs:
+            self.build()
+        post = os.path.join(self.content, "blog", "post.md")
+        self.assertEqual(logs.output, [
+            f"WARNING:build:broken reference src={post} url=/blog/gone",
+            f"WARNING:build:broken reference src={post} url=missing.png",
+        ])
+
+
+if __name__ == "__main__":
+    unittest.main()
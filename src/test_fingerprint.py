@@ -0,0 +1,81 @@
+import os
+import unittest
+
+import fingerprint
+from assets import sync_directory
+from build import generate_pages_recursive
+from fingerprint import AssetMap, is_fingerprinted
+from fixtures import TempDirTestCase
+from htmlnode import resolve_url
+from manifest import Manifest, file_hash
+from publish import ChangeSet
+from template import Template
+
+
+class TestAssetMap(TempDirTestCase):
+    def setUp(self):
+        super().setUp()
+        self.static = os.path.join(self.root, "static")
+        self.dest = os.path.join(self.root, "docs")
+        self.write("static/index.css", "body { color: red; }")
+        self.write("static/js/app.js", "console.log(1);")
+        self.write("static/images/a.png", "png")
+
+    def test_scan(self):
+        assets = AssetMap.scan(self.static)
+        digest = file_hash(os.path.join(self.static, "index.css"))[:fingerprint.HASH_LENGTH]
+        self.assertEqual(assets.names["index.css"], f"index.{digest}.css")
+        self.assertEqual(sorted(assets.names), ["index.css", "js/app.js"])
+        self.assertTrue(all(is_fingerprinted(name) for name in assets.names.values()))
+
+    def test_publish_replaces_stale_copies(self):
+        assets = AssetMap.scan(self.static)
+        self.assertEqual(assets.publish(self.static, self.dest), (2, 0))
+        self.assertEqual(assets.publish(self.static, self.dest), (0, 0))
+        old = assets.names["index.css"]
+        self.write("static/index.css", "body { color: blue; }")
+        changes = ChangeSet(self.dest)
+        assets = AssetMap.scan(self.static)
+        self.assertEqual(assets.publish(self.static, self.dest, changes), (1, 1))
+        self.assertEqual(changes.written, {assets.names["index.css"]})
+        self.assertEqual(changes.removed, {old})
+        with open(os.path.join(self.dest, assets.names["index.css"])) as f:
+            self.assertEqual(f.read(), "body { color: blue; }")
+
+    def test_urls_point_at_fingerprinted_names(self):
+        fingerprint.active = AssetMap({"index.css": "index.0123456789.css"})
+        self.addCleanup(fingerprint.disable)
+        self.assertEqual(resolve_url("/index.css?v=1#top", "/site/"), "/site/index.0123456789.css?v=1#top")
+        self.assertEqual(resolve_url("/images/a.png", "/site/"), "/site/images/a.png")
+        self.assertEqual(resolve_url("index.css", "/site/"), "index.css")
+        template = Template.compile('<link href="/index.css" /><a href="/">home</a><script src="//cdn/index.css">',
+                                    "/site/")
+        self.assertEqual(template.render(),
+                         '<link href="/site/index.0123456789.css" /><a href="/site/">home</a>'
+                         '<script src="/site//cdn/index.css">')
+
+    def test_changed_asset_rebuilds_pages_linking_to_it(self):
+        content = os.path.join(self.root, "content")
+        self.write("content/index.md", "# Home\n\n[script](/js/app.js)")
+        self.write("content/plain.md", "# Plain\n\nno links")
+        template = self.write("template.html", '<link href="/index.css" />{{ Content }}')
+        manifest = Manifest(os.path.join(self.root, "manifest.json"))
+        self.addCleanup(fingerprint.disable)
+
+        def build():
+            sync_directory(self.static, self.dest)
+            fingerprint.enable(self.static).publish(self.static, self.dest)
+            return generate_pages_recursive(content, template, self.dest, "/", manifest)[0]
+
+        self.assertEqual(build(), 2)
+        self.write("static/js/app.js", "console.log(2);")
+        self.assertEqual(build(), 1)
+        with open(os.path.join(self.dest, "index.html")) as f:
+            self.assertIn(fingerprint.active.names["js/app.js"], f.read())
+        # Every page links to the stylesheet through the template
+        self.write("static/index.css", "body { color: blue; }")
+        self.assertEqual(build(), 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
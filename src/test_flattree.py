@@ -0,0 +1,39 @@
+import unittest
+
+from block import markdown_to_html_node
+from flattree import FlatTree
+from htmlnode import LeafNode, ParentNode
+from textnode import TextNode, TextType
+
+
+class TestCompactNodes(unittest.TestCase):
+    def test_nodes_have_no_dict(self):
+        for node in (TextNode("x", TextType.TEXT), LeafNode("b", "x"), ParentNode("p", [])):
+            self.assertFalse(hasattr(node, "__dict__"))
+
+    def test_tags_are_interned(self):
+        tag = "".join(["sp", "an"])
+        self.assertIs(LeafNode(tag, "x").tag, LeafNode("span", "y").tag)
+
+
+class TestFlatTree(unittest.TestCase):
+    def test_matches_object_tree(self):
+        md = "# Title\n\nSome **bold** and [a link](/x)\n\n- one\n- two\n\n> quoted _text_"
+        tree = markdown_to_html_node(md)
+        flat = FlatTree.from_node(tree)
+        self.assertEqual(len(flat), 13)
+        self.assertEqual(flat.to_html(), tree.to_html())
+
+    def test_children_are_contiguous(self):
+        tree = ParentNode("div", [ParentNode("p", [LeafNode(None, "a")]), LeafNode("b", "c")])
+        flat = FlatTree.from_node(tree)
+        self.assertEqual((flat.first_child[0], flat.child_count[0]), (1, 2))
+        self.assertEqual((flat.first_child[1], flat.child_count[1]), (3, 1))
+        self.assertEqual(flat.to_html(), tree.to_html())
+
+    def test_leaf_root(self):
+        self.assertEqual(FlatTree.from_node(LeafNode("i", "x")).to_html(), "<i>x</i>")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,60 @@
+import os
+import tempfile
+import unittest
+
+import fragcache
+from block import markdown_to_html_node
+from fragcache import FragmentCache
+
+
+class TestFragmentCache(unittest.TestCase):
+    def tearDown(self):
+        fragcache.disable()
+
+    def test_hits_and_misses(self):
+        cache = FragmentCache()
+        self.assertIsNone(cache.get(("p", "text", "/")))
+        cache.put(("p", "text", "/"), "<p>text</p>\n")
+        self.assertEqual(cache.get(("p", "text", "/")), "<p>text</p>\n")
+        self.assertEqual((cache.stats()["hits"], cache.stats()["misses"]), (1, 1))
+
+    def test_evicts_least_recently_used(self):
+        cache = FragmentCache(max_bytes=30)
+        cache.put(("p", "aaaa", "/"), "<p>aaaa</p>")
+        cache.put(("p", "bbbb", "/"), "<p>bbbb</p>")
+        cache.get(("p", "aaaa", "/"))
+        cache.put(("p", "cccc", "/"), "<p>cccc</p>")
+        self.assertIn(("p", "aaaa", "/"), cache.entries)
+        self.assertNotIn(("p", "bbbb", "/"), cache.entries)
+        self.assertEqual(cache.evictions, 1)
+        self.assertLessEqual(cache.size, 30)
+
+    def test_cached_output_matches(self):
+        markdown = "# Title\n\nsome **bold** [link](/a)\n\n- one\n- two\n\nsome **bold** [link](/a)"
+        expected = markdown_to_html_node(markdown, "/site/").to_html()
+        cache = fragcache.enable()
+        self.assertEqual(markdown_to_html_node(markdown, "/site/").to_html(), expected)
+        self.assertEqual(markdown_to_html_node(markdown, "/site/").to_html(), expected)
+        self.assertEqual(cache.misses, 3)
+        self.assertEqual(cache.hits, 5)
+
+    def test_base_path_is_part_of_key(self):
+        fragcache.enable()
+        self.assertIn('href="/a"', markdown_to_html_node("[x](/a)", "/").to_html())
+        self.assertIn('href="/site/a"', markdown_to_html_node("[x](/a)", "/site/").to_html())
+
+    def test_persists(self):
+        with tempfile.TemporaryDirectory() as root:
+            path = os.path.join(root, "fragments.pickle")
+            cache = FragmentCache(path=path)
+            cache.put(("p", "text", "/"), "<p>text</p>\n")
+            cache.save()
+            self.assertEqual(FragmentCache.load(path).get(("p", "text", "/")), "<p>text</p>\n")
+
+            with open(path, 'wb') as f:
+                f.write(b"garbage")
+            self.assertEqual(len(FragmentCache.load(path).entries), 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,6 +1,8 @@
+import io
 import unittest
 from src.htmlnode import HTMLNode, LeafNode, ParentNode, text_node_to_html_node, extract_markdown_images, extract_markdown_links, \
-                         split_nodes_image, split_nodes_link, text_to_textnodes
+                         extract_markdown_urls, split_nodes_image, split_nodes_link, text_to_textnodes, \
+                         MARKDOWN_LINK_OR_IMAGE_PATTERN
 from block import markdown_to_blocks, block_to_block_type, BlockType  
 from textnode import TextNode, TextType
 import re
@@ -69,6 +71,27 @@ class TestParentNode(unittest.TestCase):
             "<div><span><b>grandchild</b></span></div>",
         )
 
+    def test_write_html_matches_to_html(self):
+        parent_node = ParentNode("div", [
+            ParentNode("p", [LeafNode(None, "Hello "), LeafNode("b", "world")]),
+            LeafNode("a", "link", props={"href": "/x"}),
+        ])
+        sink = io.StringIO()
+        parent_node.write_html(sink)
+        self.assertEqual(sink.getvalue(), parent_node.to_html())
+
+    def test_to_html_deep_tree(self):
+        node = LeafNode("b", "deep")
+        for _ in range(5000):
+            node = ParentNode("span", [node])
+        html = node.to_html()
+        self.assertTrue(html.startswith("<span><span>"))
+        self.assertIn("<b>deep</b></span>", html)
+
+    def test_to_html_missing_children(self):
+        with self.assertRaises(ValueError):
+            ParentNode("div", [ParentNode("p", None)]).to_html()
+
     def test_text(self):
         node = TextNode("This is a text node", TextType.TEXT)
         html_node = text_node_to_html_node(node)
@@ -257,6 +280,92 @@ class TestParentNode(unittest.TestCase):
             nodes,
         )
 
+    def test_text_to_nodes_code_is_literal(self):
+        nodes = text_to_textnodes("call `my_func(**kwargs)` now")
+        self.assertListEqual(
+            [
+                TextNode("call ", TextType.TEXT),
+                TextNode("my_func(**kwargs)", TextType.CODE),
+                TextNode(" now", TextType.TEXT),
+            ],
+            nodes,
+        )
+
+    def test_text_to_nodes_link_with_underscores(self):
+        nodes = text_to_textnodes("see [snake_case docs](https://example.com/a_b_c) _here_")
+        self.assertListEqual(
+            [
+                TextNode("see ", TextType.TEXT),
+                TextNode("snake_case docs", TextType.LINK, "https://example.com/a_b_c"),
+                TextNode(" ", TextType.TEXT),
+                TextNode("here", TextType.ITALIC),
+            ],
+            nodes,
+        )
+
+    def test_text_to_nodes_spans_do_not_nest(self):
+        # A known limitation: the bold markers stay in the italic text as they are
+        nodes = text_to_textnodes("_very **bold** claim_")
+        self.assertListEqual([TextNode("very **bold** claim", TextType.ITALIC)], nodes)
+        self.assertEqual("<i>very **bold** claim</i>", text_node_to_html_node(nodes[0]).to_html())
+
+    def test_text_to_nodes_stray_bracket(self):
+        nodes = text_to_textnodes("a [ b [link](/x)")
+        self.assertListEqual(
+            [
+                TextNode("a [ b ", TextType.TEXT),
+                TextNode("link", TextType.LINK, "/x"),
+            ],
+            nodes,
+        )
+
+    def test_text_to_nodes_brackets_inside_links(self):
+        nodes = text_to_textnodes("[see [1]](/notes) and ![fig [a]](/a.png) or [see [notes](/n) here](/x)")
+        self.assertListEqual(
+            [
+                TextNode("see [1]", TextType.LINK, "/notes"),
+                TextNode(" and ", TextType.TEXT),
+                TextNode("fig [a]", TextType.IMAGE, "/a.png"),
+                TextNode(" or [see ", TextType.TEXT),
+                TextNode("notes", TextType.LINK, "/n"),
+                TextNode(" here](/x)", TextType.TEXT),
+            ],
+            nodes,
+        )
+
+    def test_split_nodes_keep_the_other_kind(self):
+        node = TextNode("![a [1]](/a.png) [b](/b) ![c](/c.png)", TextType.TEXT)
+        self.assertListEqual(
+            [
+                TextNode("![a [1]](/a.png) ", TextType.TEXT),
+                TextNode("b", TextType.LINK, "/b"),
+                TextNode(" ![c](/c.png)", TextType.TEXT),
+            ],
+            split_nodes_link([node]),
+        )
+        self.assertListEqual(
+            [
+                TextNode("a [1]", TextType.IMAGE, "/a.png"),
+                TextNode(" [b](/b) ", TextType.TEXT),
+                TextNode("c", TextType.IMAGE, "/c.png"),
+            ],
+            split_nodes_image([node]),
+        )
+        self.assertListEqual(["/a.png", "/b", "/c.png"], extract_markdown_urls(node.text))
+        self.assertListEqual([("b", "/b")], extract_markdown_links(node.text))
+
+    def test_extract_urls_matches_link_or_image_pattern(self):
+        text = "[see [notes](/notes)](/x) a [ b ![i [2]](/i.png) [c [3]](/c) ![d](/d"
+        self.assertListEqual(
+            [url for _, _, url in MARKDOWN_LINK_OR_IMAGE_PATTERN.findall(text)],
+            extract_markdown_urls(text),
+        )
+        self.assertListEqual(["/notes", "/i.png", "/c"], extract_markdown_urls(text))
+
+    def test_text_to_nodes_unmatched(self):
+        with self.assertRaises(ValueError):
+            text_to_textnodes("this is **not closed")
+
     def test_markdown_to_blocks(self):
         md = """
 This is **bolded** paragraph
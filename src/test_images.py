@@ -0,0 +1,192 @@
+import os
+import struct
+import tempfile
+import unittest
+from unittest import mock
+
+import fragcache
+import images
+import parsecache
+import pngcodec
+from assets import sync_directory
+from build import generate_pages_recursive
+from fixtures import TempDirTestCase
+from htmlnode import image_props
+from images import ImageCatalog, image_size, variant_path
+from manifest import Manifest
+from publish import ChangeSet
+
+
+def gradient(width, height, channels):
+    return [bytes((x * 7 + y * 3 + c * 50) & 0xff for x in range(width) for c in range(channels))
+            for y in range(height)]
+
+
+def png_bytes(width, height, channels=3):
+    return pngcodec.encode(width, height, channels, gradient(width, height, channels))
+
+
+class TestPngCodec(unittest.TestCase):
+    def test_every_filter_type_decodes(self):
+        # Filters each scanline with a different type, the way an encoder would
+        width, height, bpp = 9, 5, 3
+        rows = gradient(width, height, bpp)
+        stride = width * bpp
+
+        def paeth(a, b, c):
+            p = a + b - c
+            pa, pb, pc = abs(p - a), abs(p - b), abs(p - c)
+            return a if pa <= pb and pa <= pc else b if pb <= pc else c
+
+        data = b""
+        prev = bytes(stride)
+        for kind, row in enumerate(rows):
+            left = lambda i: row[i - bpp] if i >= bpp else 0
+            upper_left = lambda i: prev[i - bpp] if i >= bpp else 0
+            predict = [lambda i: 0, left, lambda i: prev[i], lambda i: (left(i) + prev[i]) >> 1,
+                       lambda i: paeth(left(i), prev[i], upper_left(i))][kind]
+            data += bytes([kind]) + bytes((row[i] - predict(i)) & 0xff for i in range(stride))
+            prev = row
+        self.assertEqual(pngcodec.unfilter(data, stride, height, bpp), rows)
+
+    def test_roundtrip(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "a.png")
+            with open(path, 'wb') as f:
+                f.write(pngcodec.encode(6, 4, 4, gradient(6, 4, 4), [(b"sRGB", b"\x00")]))
+            self.assertEqual(pngcodec.read(path), (6, 4, 4, gradient(6, 4, 4), [(b"sRGB", b"\x00")]))
+
+    def test_resize_averages_boxes(self):
+        rows = [bytes([0, 10, 20, 30]), bytes([40, 50, 60, 70])]
+        self.assertEqual(pngcodec.resize(rows, 4, 2, 1, 2, 1), [bytes([25, 45])])
+        self.assertEqual(pngcodec.resize(rows, 4, 2, 1, 3, 2), [bytes([0, 10, 25]), bytes([40, 50, 65])])
+
+    def test_drop_opaque_alpha(self):
+        opaque = [bytes([1, 2, 3, 255, 4, 5, 6, 255])]
+        self.assertEqual(pngcodec.drop_opaque_alpha(opaque, 4), ([bytes([1, 2, 3, 4, 5, 6])], 3))
+        self.assertEqual(pngcodec.drop_opaque_alpha([bytes([9, 255, 8, 255])], 2), ([bytes([9, 8])], 1))
+        translucent = [bytes([1, 2, 3, 255, 4, 5, 6, 254])]
+        self.assertEqual(pngcodec.drop_opaque_alpha(translucent, 4), (translucent, 4))
+        self.assertEqual(pngcodec.drop_opaque_alpha(opaque, 3), (opaque, 3))
+
+    def test_unsupported(self):
+        header = pngcodec.parse_header(png_bytes(3, 2)[:33])
+        self.assertTrue(pngcodec.is_supported(header))
+        self.assertFalse(pngcodec.is_supported(header[:2] + (16, 2, 0)))
+        self.assertFalse(pngcodec.is_supported(header[:2] + (8, 3, 0)))
+
+
+class TestImageSize(TempDirTestCase):
+    def size_of(self, data):
+        return image_size(self.write("image", data))
+
+    def test_formats(self):
+        self.assertEqual(self.size_of(png_bytes(7, 3)), (7, 3))
+        self.assertEqual(self.size_of(b"GIF89a" + struct.pack("<HH", 300, 200) + bytes(30)), (300, 200))
+        app0 = b"\xff\xe0" + struct.pack(">H", 16) + b"JFIF\x00" + bytes(9)
+        sof = b"\xff\xc2" + struct.pack(">HBHHB", 11, 8, 600, 800, 1) + bytes(3)
+        self.assertEqual(self.size_of(b"\xff\xd8" + app0 + b"\xff" + sof), (800, 600))
+        self.assertIsNone(self.size_of(b"not an image at all, just some text"))
+
+
+class TestImageCatalog(TempDirTestCase):
+    def setUp(self):
+        super().setUp()
+        self.static = os.path.join(self.root, "static")
+        self.dest = os.path.join(self.root, "docs")
+        self.catalog_path = os.path.join(self.root, "cache", "catalog.json")
+        self.write("static/images/wide.png", png_bytes(1000, 10))
+        self.write("static/images/copy.png", png_bytes(1000, 10))
+        self.write("static/images/small.png", png_bytes(300, 100, 4))
+        self.write("static/images/anim.gif", b"GIF89a" + struct.pack("<HH", 500, 50) + bytes(30))
+
+    def publish(self, changes=None):
+        catalog = ImageCatalog.load(self.catalog_path)
+        catalog.scan(self.static)
+        result = catalog.publish(self.static, self.dest, changes=changes)
+        catalog.save()
+        return catalog, result
+
+    def test_variants(self):
+        catalog, (made, copied, removed) = self.publish()
+        self.assertEqual(catalog.images["images/wide.png"]["variants"], [[480, 5], [960, 10]])
+        self.assertEqual(catalog.images["images/small.png"]["variants"], [])
+        self.assertEqual(catalog.images["images/anim.gif"]["variants"], [])
+        # copy.png has the same content as wide.png, so their variants are made once
+        self.assertEqual((made, copied, removed), (2, 4, 0))
+        width, height, channels, rows, _ = pngcodec.read(os.path.join(self.dest, "images", "copy-480w.png"))
+        self.assertEqual((width, height, channels), (480, 5, 3))
+
+    def test_unchanged_images_are_not_reprocessed(self):
+        self.publish()
+        with mock.patch("images.image_size") as measure:
+            catalog, result = self.publish()
+        measure.assert_not_called()
+        self.assertEqual(result, (0, 0, 0))
+
+    def test_changed_image(self):
+        catalog, _ = self.publish()
+        self.assertEqual(catalog.markup_key("images/wide.png"), [1000, 10, [[480, 5], [960, 10]]])
+        self.write("static/images/wide.png", png_bytes(1200, 10))
+        os.remove(os.path.join(self.static, "images", "copy.png"))
+        changes = ChangeSet(self.dest)
+        catalog, result = self.publish(changes)
+        self.assertEqual(catalog.markup_key("images/wide.png"), [1200, 10, [[480, 4], [960, 8]]])
+        self.assertIsNone(catalog.markup_key("images/copy.png"))
+        self.assertEqual(result, (2, 2, 2))
+        self.assertEqual(changes.written, {"images/wide-480w.png", "images/wide-960w.png"})
+        self.assertEqual(changes.removed, {"images/copy-480w.png", "images/copy-960w.png"})
+        # The old variants left the cache too
+        self.assertEqual(len(os.listdir(os.path.dirname(self.catalog_path))), 3)
+
+    def test_markup(self):
+        catalog, _ = self.publish()
+        images.active = catalog
+        self.addCleanup(images.disable)
+        self.assertEqual(image_props("/images/wide.png", "/site/"), {
+            "src": "/site/images/wide.png",
+            "width": "1000",
+            "height": "10",
+            "srcset": "/site/images/wide-480w.png 480w, /site/images/wide-960w.png 960w, /site/images/wide.png 1000w",
+            "loading": "lazy",
+        })
+        self.assertEqual(image_props("/images/small.png"),
+                         {"src": "/images/small.png", "width": "300", "height": "100", "loading": "lazy"})
+        self.assertEqual(image_props("images/wide.png"), {"src": "images/wide.png"})
+        self.assertEqual(image_props("https://example.com/images/wide.png"),
+                         {"src": "https://example.com/images/wide.png"})
+        self.assertEqual(variant_path("a/b.c/x.jpeg", 480), "a/b.c/x-480w.jpeg")
+
+    def test_resized_image_rebuilds_pages(self):
+        content = os.path.join(self.root, "content")
+        self.write("content/index.md", "# Home\n\n![small](/images/small.png)")
+        self.write("content/wide.md", "# Wide\n\n![wide](/images/wide.png)")
+        self.write("content/plain.md", "# Plain\n\nno images")
+        template = self.write("template.html", "{{ Content }}")
+        images.enable(self.catalog_path)
+        self.addCleanup(images.disable)
+        # Neither cache may hand back the old markup
+        fragcache.enable()
+        self.addCleanup(fragcache.disable)
+        parsecache.enable(os.path.join(self.root, "parse"))
+        self.addCleanup(parsecache.disable)
+        manifest = Manifest(os.path.join(self.root, "manifest.json"))
+
+        def build():
+            sync_directory(self.static, self.dest)
+            images.active.scan(self.static)
+            images.active.publish(self.static, self.dest)
+            rebuilt, _ = generate_pages_recursive(content, template, self.dest, "/", manifest)
+            with open(os.path.join(self.dest, "index.html")) as f:
+                return rebuilt, f.read()
+
+        self.assertIn('width="300" height="100"', build()[1])
+        self.write("static/images/small.png", png_bytes(200, 100, 4))
+        # Only the page showing the image is rebuilt
+        rebuilt, html = build()
+        self.assertEqual(rebuilt, 1)
+        self.assertIn('width="200" height="100"', html)
+
+
+if __name__ == "__main__":
+    unittest.main()
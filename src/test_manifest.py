@@ -0,0 +1,68 @@
+import os
+import unittest
+
+from block import generate_pages_recursive
+from fixtures import TempDirTestCase
+from manifest import Manifest
+
+
+class TestIncrementalBuild(TempDirTestCase):
+    def setUp(self):
+        super().setUp()
+        self.content = os.path.join(self.root, "content")
+        self.dest = os.path.join(self.root, "docs")
+        self.template = os.path.join(self.root, "template.html")
+        self.manifest_path = os.path.join(self.root, ".ssg", "manifest.json")
+        os.makedirs(os.path.join(self.content, "blog"))
+        self.write(self.template, "<title>{{ Title }}</title><article>{{ Content }}</article>")
+        self.write(os.path.join(self.content, "index.md"), "# Home\n\nWelcome")
+        self.write(os.path.join(self.content, "blog", "post.md"), "# Post\n\nSome **bold** text")
+
+    def build(self):
+        manifest = Manifest.load(self.manifest_path)
+        return generate_pages_recursive(self.content, self.template, self.dest, "/", manifest)
+
+    def test_second_build_skips_everything(self):
+        self.assertEqual(self.build(), (2, 0))
+        self.assertEqual(self.build(), (0, 2))
+
+    def test_changed_source_is_rebuilt(self):
+        self.build()
+        self.write(os.path.join(self.content, "index.md"), "# Home\n\nWelcome back")
+        self.assertEqual(self.build(), (1, 1))
+        with open(os.path.join(self.dest, "index.html")) as f:
+            self.assertIn("Welcome back", f.read())
+
+    def test_template_change_rebuilds_everything(self):
+        self.build()
+        self.write(self.template, "<h1>{{ Title }}</h1>{{ Content }}")
+        self.assertEqual(self.build(), (2, 0))
+
+    def test_removed_source_deletes_output(self):
+        self.build()
+        os.remove(os.path.join(self.content, "blog", "post.md"))
+        self.assertEqual(self.build(), (0, 1))
+        self.assertFalse(os.path.exists(os.path.join(self.dest, "blog", "post.html")))
+
+    def test_missing_output_is_rebuilt(self):
+        self.build()
+        os.remove(os.path.join(self.dest, "index.html"))
+        self.assertEqual(self.build(), (1, 1))
+
+    def test_parallel_build_matches_serial(self):
+        generate_pages_recursive(self.content, self.template, self.dest, "/")
+        parallel_dest = os.path.join(self.root, "docs-parallel")
+        generate_pages_recursive(self.content, self.template, parallel_dest, "/", jobs=2)
+        for page in ("index.html", os.path.join("blog", "post.html")):
+            with open(os.path.join(self.dest, page)) as f, open(os.path.join(parallel_dest, page)) as g:
+                self.assertEqual(f.read(), g.read())
+
+    def test_failed_page_is_named(self):
+        self.write(os.path.join(self.content, "blog", "post.md"), "No title here")
+        with self.assertRaises(RuntimeError) as ctx:
+            generate_pages_recursive(self.content, self.template, self.dest, "/", jobs=2)
+        self.assertIn(os.path.join(self.content, "blog", "post.md"), str(ctx.exception))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,98 @@
+import os
+import random
+import unittest
+from unittest import mock
+
+import mapped
+from block import iter_blocks
+from build import collect_pages, pipeline_pages, render_page, render_pages, stream_page
+from corpus import make_page
+from fixtures import TempDirTestCase
+from mapped import MappedSource
+from template import Template
+
+EDGE_CASES = [
+    "# Title\n\nplain paragraph\nsecond line  \n\n- a\n- b\n",
+    "# Title\n\n```\ncode\n\n\n  indented```\n\nafter",
+    "# Title\n\n```python\nnever closed\n\n  \n",
+    "  # Title  \n\n``````\n\n```x```\n\ntext",
+    "# Title\n \t \n　\n trailing \n\n\x1c\n\nlast\x1d",
+    "\n\n\n# Title",
+    "",
+]
+
+
+class TestMappedSource(TempDirTestCase):
+    def assert_same_blocks(self, path):
+        with open(path) as f:
+            expected = list(iter_blocks(f))
+        with MappedSource(path) as source:
+            self.assertEqual(list(source.blocks()), expected)
+
+    def test_blocks_match_iter_blocks(self):
+        for i, text in enumerate(EDGE_CASES):
+            with self.subTest(text=text):
+                self.assert_same_blocks(self.write(f"{i}.md", text))
+        rng = random.Random(0)
+        self.assert_same_blocks(self.write("corpus.md", "\n\n".join(make_page(rng, 50) for _ in range(5))))
+
+    def test_spans_point_into_the_file(self):
+        path = self.write("page.md", "# Title\n\nfirst  \nparagraph\n\n\n  - item\n")
+        with MappedSource(path) as source:
+            spans = list(source.spans())
+        with open(path, 'rb') as f:
+            data = f.read()
+        self.assertEqual([data[offset:offset + length] for offset, length in spans],
+                         [b"# Title", b"first  \nparagraph", b"- item"])
+
+    def test_carriage_returns_are_translated(self):
+        self.assert_same_blocks(self.write("crlf.md", "# Title\r\n\r\none\r\ntwo\r\rthree"))
+
+    def test_title(self):
+        with MappedSource(self.write("page.md", "intro\n\n#  Spaced title \n\n# Second")) as source:
+            self.assertEqual(source.title(), "Spaced title")
+        with MappedSource(self.write("none.md", "no title here")) as source:
+            self.assertIsNone(source.title())
+
+
+class TestStreamPage(TempDirTestCase):
+    def setUp(self):
+        super().setUp()
+        self.content = os.path.join(self.root, "content")
+        self.template = self.write("template.html", "<title>{{ Title }}</title><article>{{ Content }}</article>")
+        rng = random.Random(1)
+        for n in range(6):
+            self.write(f"content/page{n}.md", f"# Page {n}\n\n[next](/page{n + 1})\n\n" + make_page(rng, 30))
+
+    def read(self, path):
+        with open(path, 'rb') as f:
+            return f.read()
+
+    def test_matches_render_page(self):
+        template = Template.load(self.template, "/site/")
+        src = os.path.join(self.content, "page0.md")
+        parsed, streamed = os.path.join(self.root, "parsed.html"), os.path.join(self.root, "streamed.html")
+        refs, _, _ = render_page(src, self.template, parsed, "/site/", template)
+        self.assertEqual(stream_page(src, template, streamed, "/site/"), (refs, True, None))
+        self.assertEqual(self.read(parsed), self.read(streamed))
+        # Unchanged output is left alone, as for every other page
+        self.assertEqual(stream_page(src, template, streamed, "/site/"), (refs, False, None))
+
+    def test_pipeline_streams_large_pages_in_order(self):
+        serial = [(src, dest, None) for src, dest in collect_pages(self.content, os.path.join(self.root, "a"))]
+        list(render_pages(serial, self.template, "/"))
+        piped = [(src, dest, None) for src, dest in collect_pages(self.content, os.path.join(self.root, "b"))]
+        sizes = {src: os.path.getsize(src) for src, _, _ in piped}
+        # Every other page counts as large
+        threshold = sorted(sizes.values())[len(sizes) // 2]
+        with mock.patch.object(mapped, "MMAP_THRESHOLD", threshold), \
+                mock.patch("build.stream_page", wraps=stream_page) as streamed:
+            results = list(pipeline_pages(piped, self.template, "/", 2, depth=2))
+        self.assertEqual([job for job, _, _, _ in results], piped)
+        self.assertTrue(all(error is None for _, _, _, error in results))
+        self.assertEqual(streamed.call_count, sum(size >= threshold for size in sizes.values()))
+        self.assertEqual([self.read(dest) for _, dest, _ in serial], [self.read(dest) for _, dest, _ in piped])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,95 @@
+import os
+import unittest
+
+import fragcache
+import minify
+from block import markdown_to_html_node
+from build import generate_pages_recursive
+from fixtures import TempDirTestCase
+from flattree import FlatTree
+from htmlnode import LeafNode, ParentNode
+from manifest import Manifest
+from minify import minify_markup
+from template import Template
+
+PAGE = "# Title\n\nSome _text_\non two lines\n\n- one\n- two\n\n```\ndef f():\n    return 1\n```"
+
+
+class TestMinifyMarkup(unittest.TestCase):
+    def test_line_breaks(self):
+        self.assertEqual(minify_markup("<ul>\n  <li>a</li>\n  <li>b\n    c</li>\n</ul>\n"),
+                         "<ul><li>a</li><li>b c</li></ul>")
+        # Whitespace within a line separates inline elements and stays
+        self.assertEqual(minify_markup("<b>a</b> <i>b</i>"), "<b>a</b> <i>b</i>")
+
+    def test_comments(self):
+        self.assertEqual(minify_markup("<p>a</p>\n<!-- note -->\n<p>b</p>"), "<p>a</p><p>b</p>")
+        self.assertEqual(minify_markup("<!--[if IE]><p>old</p><![endif]-->"), "<!--[if IE]><p>old</p><![endif]-->")
+
+    def test_verbatim_elements(self):
+        pre = "<pre>\n  indented\n\n  <!-- shown -->\n</pre>"
+        script = "<script>\nif (a >\n  b) {}\n</script>"
+        self.assertEqual(minify_markup(f"<div>\n  {pre}\n  {script}\n</div>"), f"<div>{pre}{script}</div>")
+
+
+class TestMinifiedHtml(unittest.TestCase):
+    def setUp(self):
+        minify.enable()
+        self.addCleanup(minify.disable)
+
+    def test_closing_tags(self):
+        node = ParentNode("div", [ParentNode("p", [LeafNode(None, "a")]), ParentNode("p", [LeafNode("b", "c")])])
+        self.assertEqual(node.to_html(), "<div><p>a</p><p><b>c</b></p></div>")
+        self.assertEqual(FlatTree.from_node(node).to_html(), node.to_html())
+
+    def test_preformatted_content_is_kept(self):
+        node = ParentNode("div", [
+            ParentNode("pre", [ParentNode("code", [ParentNode("span", [LeafNode(None, "x")])]), LeafNode(None, "y")]),
+            ParentNode("p", [LeafNode(None, "z")]),
+        ])
+        self.assertEqual(node.to_html(), "<div><pre><code><span>x</span>\n</code>\ny</pre><p>z</p></div>")
+        self.assertEqual(FlatTree.from_node(node).to_html(), node.to_html())
+
+    def test_page(self):
+        html = markdown_to_html_node(PAGE).to_html()
+        self.assertEqual(html, '<div><h1 id="title">Title</h1><p>Some <i>text</i>\non two lines</p>'
+                               '<ul><li>one</li><li>two</li></ul><code>\ndef f():\n    return 1\n</code></div>')
+        minify.disable()
+        readable = markdown_to_html_node(PAGE).to_html()
+        self.assertEqual(readable.replace("\n", "").replace("  ", ""), html.replace("\n", "").replace("  ", ""))
+        self.assertGreater(len(readable), len(html))
+
+    def test_template(self):
+        template = Template.compile("<html>\n  <body>\n    {{ Content }}\n  </body>\n</html>\n")
+        self.assertEqual(template.render(Content="<p>x</p>"), "<html><body> <p>x</p> </body></html>")
+
+
+class TestMinifiedBuild(TempDirTestCase):
+    def test_switching_rebuilds_pages(self):
+        content = os.path.join(self.root, "content")
+        dest = os.path.join(self.root, "docs")
+        self.write(os.path.join(content, "index.md"), PAGE)
+        template = self.write("template.html", "<article>\n{{ Content }}\n</article>\n")
+        manifest = Manifest(os.path.join(self.root, "manifest.json"))
+        # Rendered blocks are cached per mode too
+        fragcache.enable()
+        self.addCleanup(fragcache.disable)
+        self.addCleanup(minify.disable)
+
+        def build():
+            generate_pages_recursive(content, template, dest, "/", manifest)
+            with open(os.path.join(dest, "index.html")) as f:
+                return f.read()
+
+        readable = build()
+        minify.enable()
+        minified = build()
+        self.assertTrue(minified.startswith("<article> <div><h1"))
+        self.assertNotIn("</li>\n", minified)
+        self.assertLess(len(minified), len(readable))
+        minify.disable()
+        self.assertEqual(build(), readable)
+
+
+if __name__ == "__main__":
+    unittest.main()
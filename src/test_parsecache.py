@@ -0,0 +1,74 @@
+import os
+import unittest
+from unittest import mock
+
+import parsecache
+from block import generate_page
+from fixtures import TempDirTestCase
+from parsecache import ParseCache, source_key
+
+
+class TestParseCache(TempDirTestCase):
+    def setUp(self):
+        super().setUp()
+        self.cache = ParseCache(os.path.join(self.root, "parse"))
+        self.source = os.path.join(self.root, "index.md")
+        self.template = os.path.join(self.root, "template.html")
+        self.dest = os.path.join(self.root, "docs", "index.html")
+        self.write(self.source, "# Home\n\nSome **bold** [text](/a)\n")
+        self.write(self.template, "<title>{{ Title }}</title>{{ Content }}")
+
+    def tearDown(self):
+        parsecache.disable()
+
+    def read_dest(self):
+        with open(self.dest) as f:
+            return f.read()
+
+    def test_roundtrip(self):
+        key = source_key(b"# Home", "/")
+        self.assertIsNone(self.cache.get(key))
+        self.cache.put(key, "Home", "<div></div>")
+        self.assertEqual(self.cache.get(key), ("Home", "<div></div>", [], None, ""))
+        self.assertEqual((self.cache.hits, self.cache.misses), (1, 1))
+
+    def test_key_depends_on_base_path(self):
+        self.assertNotEqual(source_key(b"# Home", "/"), source_key(b"# Home", "/site/"))
+
+    def test_template_change_skips_parsing(self):
+        generate_page(self.source, self.template, self.dest, "/site/")
+        expected = self.read_dest()
+        parsecache.active = self.cache
+        generate_page(self.source, self.template, self.dest, "/site/")
+        self.assertEqual(self.read_dest(), expected)
+
+        self.write(self.template, "<h1>{{ Title }}</h1>{{ Content }}")
+        with mock.patch("block.parse_markdown", side_effect=AssertionError("parsed")):
+            generate_page(self.source, self.template, self.dest, "/site/")
+        self.assertTrue(self.read_dest().startswith("<h1>Home</h1><div>"))
+        self.assertEqual(self.cache.hits, 1)
+
+    def test_corrupt_entry_is_a_miss(self):
+        key = source_key(b"# Home", "/")
+        self.cache.put(key, "Home", "<div></div>")
+        with open(self.cache._path(key), 'wb') as f:
+            f.write(b"not zlib")
+        with self.assertLogs("parsecache", "WARNING"):
+            self.assertIsNone(self.cache.get(key))
+        self.assertFalse(os.path.exists(self.cache._path(key)))
+
+    def test_gc_removes_oldest_first(self):
+        keys = [source_key(str(n).encode(), "/") for n in range(3)]
+        for n, key in enumerate(keys):
+            self.cache.put(key, "t", "x" * 1000)
+            os.utime(self.cache._path(key), ns=(n * 10**9, n * 10**9))
+        entry_size = os.path.getsize(self.cache._path(keys[0]))
+        removed, remaining = self.cache.gc(entry_size * 2)
+        self.assertEqual(removed, 1)
+        self.assertLessEqual(remaining, entry_size * 2)
+        self.assertFalse(os.path.exists(self.cache._path(keys[0])))
+        self.assertTrue(os.path.exists(self.cache._path(keys[2])))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,73 @@
+import json
+import os
+import unittest
+
+import profiler
+from block import generate_pages_recursive
+from fixtures import TempDirTestCase
+
+
+class TestProfiler(TempDirTestCase):
+    def setUp(self):
+        super().setUp()
+        self.content = os.path.join(self.root, "content")
+        self.template = self.write("template.html", "<title>{{ Title }}</title>{{ Content }}")
+        self.dest = os.path.join(self.root, "docs")
+        for name in ("a", "b"):
+            self.write(f"content/{name}.md", f"# Page {name}\n\nSome **bold** [link](/x)\n\n- one\n- two")
+
+    def tearDown(self):
+        profiler.disable()
+
+    def test_disabled_by_default(self):
+        self.assertFalse(profiler.active.enabled)
+        generate_pages_recursive(self.content, self.template, self.dest, "/")
+        self.assertIsNone(profiler.active.page_report(os.path.join(self.content, "a.md")))
+
+    def test_records_every_stage_per_page(self):
+        prof = profiler.enable()
+        generate_pages_recursive(self.content, self.template, self.dest, "/")
+        self.assertEqual(len(prof.pages), 2)
+        record = prof.pages[os.path.join(self.content, "a.md")]
+        self.assertEqual(set(record["stages"]), set(profiler.STAGES))
+        self.assertGreater(record["total"]["seconds"], 0)
+        self.assertEqual(prof.totals()[profiler.INLINE_TOKENIZING]["calls"], 6)
+        # Rendering a page allocates, however much of it is freed again
+        self.assertGreater(record["total"]["peak_bytes"], 0)
+        self.assertGreaterEqual(record["total"]["peak_bytes"],
+                                max(stats["peak_bytes"] for stats in record["stages"].values()))
+
+    def test_peak_of_nested_stages(self):
+        prof = profiler.enable()
+        with prof.stage(profiler.IO):
+            data = bytearray(1 << 20)
+            del data
+            with prof.stage(profiler.TEMPLATING):
+                pass
+        io, templating = prof.build[profiler.IO], prof.build[profiler.TEMPLATING]
+        # The inner stage resets tracemalloc's peak, but the outer one still sees its megabyte
+        self.assertGreater(io["peak_bytes"], 1 << 19)
+        self.assertLess(templating["peak_bytes"], 1 << 19)
+        self.assertLess(io["net_bytes"], 1 << 19)
+
+    def test_profiled_output_matches(self):
+        generate_pages_recursive(self.content, self.template, self.dest, "/")
+        profiler.enable()
+        profiled_dest = os.path.join(self.root, "profiled")
+        generate_pages_recursive(self.content, self.template, profiled_dest, "/")
+        with open(os.path.join(self.dest, "a.html")) as f, open(os.path.join(profiled_dest, "a.html")) as g:
+            self.assertEqual(f.read(), g.read())
+
+    def test_report_json_and_table(self):
+        prof = profiler.enable()
+        generate_pages_recursive(self.content, self.template, self.dest, "/", jobs=2)
+        path = os.path.join(self.root, "profile.json")
+        prof.write_json(path)
+        with open(path) as f:
+            report = json.load(f)
+        self.assertEqual(report["page_count"], 2)
+        self.assertIn("slowest pages", prof.format_table(1))
+
+
+if __name__ == "__main__":
+    unittest.main()
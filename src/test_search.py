@@ -0,0 +1,193 @@
+import json
+import os
+import shutil
+import subprocess
+import unittest
+from unittest import mock
+
+import parsecache
+import search
+from block import parse_markdown
+from build import generate_pages_recursive
+from fixtures import TempDirTestCase
+from manifest import Manifest
+from publish import ChangeSet
+from search import PageIndex, build_index, heading_anchor, plain_text, shard_name, terms
+
+
+def decode(postings):
+    # The inverse of build_index's delta encoding: [(document, section, count)]
+    triples = []
+    doc = 0
+    for i in range(0, len(postings), 3):
+        doc += postings[i]
+        triples.append((doc, postings[i + 1], postings[i + 2]))
+    return triples
+
+
+class TestTokenizing(unittest.TestCase):
+    def test_terms(self):
+        self.assertEqual(terms("Tom's **Bombadil**, a_b x 42 Éowyn"), ["tom", "bombadil", "42", "éowyn"])
+
+    def test_plain_text_keeps_link_text(self):
+        self.assertEqual(plain_text("see [the _docs_](/docs) and ![a map](/map.png) `code`"),
+                         "see the docs and a map code")
+
+    def test_heading_anchor(self):
+        self.assertEqual(heading_anchor("Why [Tom](/tom) **Bombadil** was a mistake!"), "why-tom-bombadil-was-a-mistake")
+        self.assertEqual(heading_anchor("???"), "")
+
+    def test_shard_name(self):
+        self.assertEqual(shard_name("tolkien", 2), "to")
+        self.assertEqual(shard_name("éowyn", 1), "ue9")
+        self.assertEqual(shard_name("tö", 2), "u74-f6")
+
+    def test_headings_get_ids(self):
+        html_node, _ = parse_markdown(["# The Title", "", "## Part one", "", "text"])
+        self.assertEqual(html_node.to_html(),
+                         '<div><h1 id="the-title">The Title</h1>\n<h2 id="part-one">Part one</h2>\n<p>text</p>\n</div>\n')
+
+
+class TestIndex(unittest.TestCase):
+    def test_page_index_sections(self):
+        index = PageIndex()
+        parse_markdown(["intro words", "", "# Title", "", "Tom met Tom", "", "## More", "", "- tom"], index=index)
+        self.assertEqual(index.fragment("Title"), {"title": "Title", "sections": [
+            ["", None, {"intro": 1, "words": 1}],
+            ["title", "Title", {"title": 1, "tom": 2, "met": 1}],
+            ["more", "More", {"more": 1, "tom": 1}],
+        ]})
+
+    def test_postings_are_delta_encoded(self):
+        pages = [(f"p{n}/", {"title": f"P{n}", "sections": [["", None, {"common": n + 1}], ["h", "H", {"rare": 1}]]})
+                 for n in range(4)]
+        pages[2][1]["sections"][1][2] = {}
+        meta, shards = build_index(pages)
+        self.assertEqual(meta["docs"][1], ["p1/", "P1", [["", None], ["h", "H"]]])
+        self.assertEqual(meta["prefix_length"], 1)
+        self.assertEqual(shards["c"]["common"], [0, 0, 1, 1, 0, 2, 1, 0, 3, 1, 0, 4])
+        self.assertEqual(decode(shards["r"]["rare"]), [(0, 1, 1), (1, 1, 1), (3, 1, 1)])
+
+    def test_large_indexes_shard_by_two_characters(self):
+        sections = [["", None, {f"t{n:05}": 1 for n in range(20000)}]]
+        meta, shards = build_index([("", {"title": "T", "sections": sections})])
+        self.assertEqual(meta["prefix_length"], 2)
+        self.assertEqual(meta["shards"], ["t0", "t1"])
+
+
+class TestSiteIndex(TempDirTestCase):
+    def setUp(self):
+        super().setUp()
+        self.content = os.path.join(self.root, "content")
+        self.dest = os.path.join(self.root, "docs")
+        self.template = os.path.join(self.root, "template.html")
+        self.write(self.template, "<title>{{ Title }}</title>{{ Content }}")
+        self.write(os.path.join(self.content, "index.md"), "# Home\n\nWelcome to the shire")
+        self.write(os.path.join(self.content, "tom", "index.md"), "# Tom\n\n## Songs\n\nHey dol merry dol")
+        self.write(os.path.join(self.content, "moria.md"), "# Moria\n\nDark and deep")
+        self.store = search.enable(os.path.join(self.root, "fragments"))
+        self.addCleanup(search.disable)
+
+    def build(self, **kwargs):
+        manifest = Manifest.load(os.path.join(self.root, "manifest.json"))
+        changes = ChangeSet(self.dest)
+        generate_pages_recursive(self.content, self.template, self.dest, "/site/", manifest, changes=changes, **kwargs)
+        return changes
+
+    def load(self, name):
+        with open(os.path.join(self.dest, "search", name)) as f:
+            return json.load(f)
+
+    def lookup(self, term):
+        meta = self.load("index.json")
+        shard = self.load(shard_name(term, meta["prefix_length"]) + ".json")
+        return [(meta["docs"][doc][0], meta["docs"][doc][2][section][0], count)
+                for doc, section, count in decode(shard.get(term, []))]
+
+    def test_index_is_written(self):
+        self.build()
+        self.assertEqual(self.lookup("dol"), [("tom/", "songs", 2)])
+        self.assertEqual(self.lookup("shire"), [("", "home", 1)])
+        self.assertEqual([doc[0] for doc in self.load("index.json")["docs"]], ["", "moria.html", "tom/"])
+        self.assertTrue(os.path.exists(os.path.join(self.dest, "search", "search.js")))
+
+    def test_search_box_only_with_an_index(self):
+        self.write(self.template, "{{ Search }}<article>{{ Content }}</article>")
+        self.build()
+        with open(os.path.join(self.dest, "moria.html")) as f:
+            self.assertIn('<script src="/site/search/search.js" defer></script>', f.read())
+        search.disable()
+        self.build()
+        with open(os.path.join(self.dest, "moria.html")) as f:
+            self.assertTrue(f.read().startswith("<article>"))
+
+    def test_one_page_change_reindexes_one_page(self):
+        self.build()
+        self.write(os.path.join(self.content, "moria.md"), "# Moria\n\nDark and deep, a dwarf")
+        with mock.patch.object(search.PageIndex, "add", autospec=True, side_effect=search.PageIndex.add) as add:
+            changes = self.build()
+        # Only moria.md's two blocks were indexed; the rest came from stored fragments
+        self.assertEqual(add.call_count, 2)
+        self.assertEqual(self.lookup("dwarf"), [("moria.html", "moria", 1)])
+        self.assertEqual(self.lookup("dol"), [("tom/", "songs", 2)])
+        self.assertEqual(changes.written, {"moria.html", "search/d.json"})
+
+    def test_removed_page_leaves_the_index(self):
+        self.build()
+        os.remove(os.path.join(self.content, "moria.md"))
+        changes = self.build()
+        self.assertEqual(self.lookup("dark"), [])
+        # "and" was the only term starting with "a"
+        self.assertEqual(changes.removed, {"moria.html", "search/a.json"})
+        self.assertEqual(len(os.listdir(self.store.directory)), 2)
+
+    def test_missing_fragments_are_rebuilt(self):
+        self.build()
+        shutil.rmtree(self.store.directory)
+        self.build()
+        self.assertEqual(self.lookup("deep"), [("moria.html", "moria", 1)])
+
+    def test_pool_and_parse_cache(self):
+        # Fragments come back from worker processes and out of the parse cache
+        cache = parsecache.enable(os.path.join(self.root, "parse"))
+        self.addCleanup(parsecache.disable)
+        search.disable()
+        self.build(jobs=2)
+        self.assertFalse(os.path.exists(os.path.join(self.dest, "search")))
+        search.enable(self.store.directory)
+        self.build(jobs=2)
+        self.assertEqual(self.lookup("merry"), [("tom/", "songs", 1)])
+        self.write(self.template, "<h1>{{ Title }}</h1>{{ Content }}")
+        shutil.rmtree(self.store.directory)
+        misses = cache.misses
+        self.build(jobs=2)
+        self.assertEqual(cache.misses, misses)
+        self.assertEqual(self.lookup("merry"), [("tom/", "songs", 1)])
+
+    @unittest.skipUnless(shutil.which("node"), "node is not installed")
+    def test_client(self):
+        self.build()
+        script = """
+            const fs = require("fs"), path = require("path");
+            const dir = process.argv[1];
+            global.window = {};
+            global.document = {currentScript: {src: "https://example.com/site/search/search.js"},
+                               readyState: "complete", getElementById: () => null};
+            global.fetch = async (url) => {
+              const file = path.join(dir, path.basename(new URL(url).pathname));
+              if (!fs.existsSync(file)) return {ok: false, status: 404};
+              return {ok: true, json: async () => JSON.parse(fs.readFileSync(file, "utf8"))};
+            };
+            eval(fs.readFileSync(path.join(dir, "search.js"), "utf8"));
+            window.ssgSearch(process.argv[2]).then((results) => console.log(JSON.stringify(results)));
+        """
+        run = lambda query: json.loads(subprocess.run(["node", "-e", script, os.path.join(self.dest, "search"), query],
+                                                      capture_output=True, text=True, check=True).stdout)
+        self.assertEqual(run("merry DOL"), [{"url": "https://example.com/site/tom/#songs", "title": "Tom",
+                                             "heading": "Songs", "score": 3}])
+        self.assertEqual([result["url"] for result in run("de")], ["https://example.com/site/moria.html#moria"])
+        self.assertEqual(run("shire moria"), [])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,132 @@
+import os
+import unittest
+
+import compress
+import fingerprint
+import images
+import pngcodec
+from fixtures import TempDirTestCase
+from serve import DevBuild, SiteStore, Watcher
+
+
+class TestWatcher(TempDirTestCase):
+    def test_poll_reports_changes(self):
+        path = self.write("a.md", "one")
+        watcher = Watcher([self.root], use_inotify=False)
+        self.assertEqual(watcher.poll(), set())
+
+        self.write("a.md", "changed")
+        new_path = self.write("b.md", "new")
+        self.assertEqual(watcher.poll(), {path, new_path})
+
+        os.remove(path)
+        self.assertEqual(watcher.poll(), {path})
+
+
+class TestDevBuild(TempDirTestCase):
+    def setUp(self):
+        super().setUp()
+        self.content = os.path.join(self.root, "content")
+        self.static = os.path.join(self.root, "static")
+        self.dest = os.path.join(self.root, "docs")
+        self.template = os.path.join(self.root, "template.html")
+        os.makedirs(self.content)
+        os.makedirs(self.static)
+        self.write(self.template, "<body>{{ Content }}</body>")
+        self.write(os.path.join(self.content, "index.md"), "# Home")
+        self.write(os.path.join(self.content, "about.md"), "# About")
+        self.store = SiteStore(self.dest)
+        # A manifest of its own: the one in .ssg/ belongs to the real site, whose pages it would remove
+        self.builder = DevBuild(self.content, self.static, self.template, self.dest, self.store,
+                                manifest_path=os.path.join(self.root, "manifest.json"))
+        self.builder.full_build()
+
+    def test_store_serves_pages(self):
+        url, body = self.store.lookup("/about.html")
+        self.assertEqual(url, "/about.html")
+        self.assertIn(b'<h1 id="about">About</h1>', body)
+        self.assertEqual(self.store.lookup("/missing"), (None, None))
+
+    def test_markdown_change_rerenders_one_page(self):
+        about = os.path.join(self.dest, "about.html")
+        index_mtime = os.stat(os.path.join(self.dest, "index.html")).st_mtime_ns
+        path = os.path.join(self.content, "about.md")
+        self.write(path, "# About us")
+        self.builder.apply({path})
+        with open(about) as f:
+            self.assertIn("About us", f.read())
+        self.assertIn(b"About us", self.store.lookup("/about.html")[1])
+        self.assertEqual(os.stat(os.path.join(self.dest, "index.html")).st_mtime_ns, index_mtime)
+        self.assertEqual(self.store.version, 1)
+
+    def test_template_change_rerenders_everything(self):
+        self.write(self.template, "<main>{{ Content }}</main>")
+        self.builder.apply({self.template})
+        for url in ("/index.html", "/about.html"):
+            self.assertTrue(self.store.lookup(url)[1].startswith(b"<main>"))
+
+    def test_asset_change_rerenders_pages_using_it(self):
+        image = os.path.join(self.static, "a.png")
+        self.write(image, "png")
+        path = os.path.join(self.content, "about.md")
+        self.write(path, "# About\n\n![a](/a.png)")
+        self.builder.apply({path, image})
+        rendered = []
+        render = self.builder.render
+        self.builder.render = lambda pages, *args: (rendered.extend(pages), render(pages, *args))
+
+        self.write(image, "new png")
+        self.builder.apply({image})
+        self.assertEqual(rendered, [(path, os.path.join(self.dest, "about.html"))])
+        self.assertEqual(self.builder.manifest.pages[path]["assets"]["a.png"][0], len("new png"))
+
+    def test_resized_image_rerenders_pages(self):
+        images.enable(os.path.join(self.root, "images", "catalog.json"))
+        self.addCleanup(images.disable)
+        image = os.path.join(self.static, "a.png")
+        with open(image, 'wb') as f:
+            f.write(pngcodec.encode(600, 1, 1, [bytes(600)]))
+        path = os.path.join(self.content, "about.md")
+        self.write(path, "# About\n\n![a](/a.png)")
+        self.builder.apply({path, image})
+        self.assertIn(b'width="600"', self.store.lookup("/about.html")[1])
+        self.assertEqual(self.store.lookup("/a-480w.png")[0], "/a-480w.png")
+
+        with open(image, 'wb') as f:
+            f.write(pngcodec.encode(400, 1, 1, [bytes(400)]))
+        self.builder.apply({image})
+        self.assertIn(b'width="400"', self.store.lookup("/about.html")[1])
+        self.assertEqual(self.store.lookup("/a-480w.png"), (None, None))
+
+    def test_fingerprinted_asset_change_rerenders_pages(self):
+        css = os.path.join(self.static, "index.css")
+        self.write(css, "body {}")
+        self.write(self.template, '<link href="/index.css" />{{ Content }}')
+        fingerprint.enable(self.static)
+        self.addCleanup(fingerprint.disable)
+        self.builder.full_build()
+        old_name = fingerprint.active.names["index.css"]
+        self.assertIn(f'href="/{old_name}"'.encode(), self.store.lookup("/about.html")[1])
+
+        self.write(css, "body { color: red; }")
+        self.builder.apply({css})
+        new_name = fingerprint.active.names["index.css"]
+        self.assertNotEqual(new_name, old_name)
+        for url in ("/index.html", "/about.html"):
+            self.assertIn(f'href="/{new_name}"'.encode(), self.store.lookup(url)[1])
+        self.assertEqual(self.store.lookup("/" + old_name), (None, None))
+
+    def test_compressed_siblings_follow_rebuilds(self):
+        self.builder.compress = True
+        path = os.path.join(self.content, "about.md")
+        self.write(path, "# About us")
+        self.builder.apply({path})
+        about = os.path.join(self.dest, "about.html")
+        self.assertTrue(compress.is_current(about, about + ".gz"))
+        os.remove(path)
+        self.builder.apply({path})
+        self.assertFalse(os.path.exists(about + ".gz"))
+
+
+if __name__ == "__main__":
+    unittest.main()
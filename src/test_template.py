@@ -0,0 +1,52 @@
+import io
+import unittest
+
+from block import markdown_to_html_node
+from htmlnode import LeafNode, ParentNode, resolve_url
+from template import Template
+
+
+class TestTemplate(unittest.TestCase):
+    def test_compile_splits_slots(self):
+        template = Template.compile("<title>{{ Title }}</title><article>{{ Content }}</article>")
+        self.assertEqual(template.chunks, ["<title>", "</title><article>", "</article>"])
+        self.assertEqual([name for name, _ in template.slots], ["Title", "Content"])
+
+    def test_render_with_node(self):
+        template = Template.compile("<h1>{{ Title }}</h1>{{ Content }}")
+        node = ParentNode("p", [LeafNode("b", "hi")])
+        self.assertEqual(template.render(Title="Home", Content=node), "<h1>Home</h1><p><b>hi</b></p>\n")
+
+    def test_unknown_slot_is_kept(self):
+        template = Template.compile("{{ Title }} {{ Footer }}")
+        self.assertEqual(template.render(Title="x"), "x {{ Footer }}")
+
+    def test_base_path_rewritten_once(self):
+        template = Template.compile('<link href="/index.css" /><img src="/a.png" />{{ Content }}', "/site/")
+        sink = io.StringIO()
+        template.write(sink, Content="")
+        self.assertEqual(sink.getvalue(), '<link href="/site/index.css" /><img src="/site/a.png" />')
+
+    def test_compile_time_values(self):
+        template = Template.compile('{{ Search }}<p>{{ Content }}</p>', "/site/",
+                                    {"Search": '<script src="/search/search.js"></script>'})
+        self.assertEqual([name for name, _ in template.slots], ["Content"])
+        self.assertEqual(template.render(Content="x"), '<script src="/site/search/search.js"></script><p>x</p>')
+
+    def test_base_path_applied_to_nodes(self):
+        node = markdown_to_html_node("[home](/) and ![pic](/images/a.png) and [ext](https://example.com)", "/site/")
+        self.assertEqual(
+            node.to_html(),
+            '<div><p><a href="/site/">home</a> and <img src="/site/images/a.png">pic</img> and '
+            '<a href="https://example.com">ext</a></p>\n</div>\n',
+        )
+
+    def test_resolve_url(self):
+        self.assertEqual(resolve_url("/blog/tom", "/site/"), "/site/blog/tom")
+        self.assertEqual(resolve_url("/blog/tom", "/"), "/blog/tom")
+        self.assertEqual(resolve_url("//cdn.example.com/x.js", "/site/"), "//cdn.example.com/x.js")
+        self.assertEqual(resolve_url("blog/tom", "/site/"), "blog/tom")
+
+
+if __name__ == "__main__":
+    unittest.main()